@@ -1,17 +1,6 @@
 #!/usr/bin/env python
 
-from paranoia import base
-from paranoia import fundamentals
-from paranoia import meta
-from paranoia import types
+from paranoia.lazy import lazy_module
 
-from paranoia.base import *
-from paranoia.fundamentals import *
-from paranoia.meta import *
-from paranoia.types import *
-
-__all__ = ['base', 'fundamentals', 'meta', 'types'] + \
-          base.__all__ + \
-          fundamentals.__all__ + \
-          meta.__all__ + \
-          types.__all__
+# nothing below is imported until something in it is used, see paranoia.lazy
+lazy_module(__name__, ['base', 'fundamentals', 'meta', 'parallel', 'types'])
@@ -1,27 +1,5 @@
 #!/usr/bin/env python
 
-from paranoia.base import address
-from paranoia.base import allocator
-from paranoia.base import block
-from paranoia.base import disk
-from paranoia.base import event
-from paranoia.base import paranoia_agent
-from paranoia.base import size
-
-from paranoia.base.address import *
-from paranoia.base.allocator import *
-from paranoia.base.block import *
-from paranoia.base.disk import *
-from paranoia.base.event import *
-from paranoia.base.paranoia_agent import *
-from paranoia.base.size import *
-
-__all__ = ['address', 'allocator', 'block', 'disk', 'event', 'paranoia_agent', 'size'] + \
-           address.__all__ + \
-           allocator.__all__ + \
-           block.__all__ + \
-           disk.__all__ + \
-           event.__all__ + \
-           paranoia_agent.__all__ + \
-           size.__all__
+from paranoia.lazy import lazy_module
 
+lazy_module(__name__, ['address', 'allocator', 'bit_view', 'block', 'copy_on_write', 'disk', 'event', 'paranoia_agent', 'process_memory', 'size', 'transaction'])
@@ -13,6 +13,8 @@ class AddressError(ParanoiaError):
     pass
 
 class Address(ParanoiaAgent):
+    __slots__ = ('allocation', 'offset', '__weakref__')
+
     ALLOCATION = None
     OFFSET = 0
 
@@ -77,6 +79,9 @@ class Address(ParanoiaAgent):
     def get_block(self, offset=0, force=False):
         return self.allocation.get_block(int(self)+offset, force)
 
+    def get_block_value(self, offset=0, force=False):
+        return self.allocation.get_block_value(int(self)+offset, force)
+
     def set_block(self, block, offset=0, force=False):
         return self.allocation.set_block(int(self)+offset, block, force)
 
@@ -95,6 +100,12 @@ class Address(ParanoiaAgent):
     def read_bytes(self, offset=0, size=None, force=False, direct=False):
         return self.allocation.read_bytes(int(self)+offset, size, force, direct)
 
+    def find_terminator(self, offset=0, stride=1, maximum=None):
+        return self.allocation.find_terminator(int(self)+offset, stride, maximum)
+
+    def read_buffered(self, offset=0, size=None):
+        return self.allocation.read_buffered(int(self)+offset, size)
+
     def read_bits(self, bit_offset=0, size=None, force=False, direct=False):
         return self.allocation.read_bits(int(self)+bit_offset/8, bit_offset % 8, size, force, direct)
 
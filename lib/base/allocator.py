@@ -2,6 +2,7 @@
 
 import platform
 import ctypes
+import weakref
 import os
 import random
 import sys
@@ -15,9 +16,9 @@ except ImportError: # python3
 from yggdrasil import AVLTree
 
 from paranoia.fundamentals import align, string_address, malloc, realloc, free, hexdump
-from paranoia.fundamentals import memset, memmove
+from paranoia.fundamentals import memset, memmove, find_terminator, terminator_index
 from paranoia.base.address import Address, AddressError
-from paranoia.base.block import Block, BlockChain
+from paranoia.base.block import Block
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
 from paranoia.base.size import Size
 
@@ -36,10 +37,17 @@ class AllocationError(ParanoiaError):
     pass
 
 class Allocation(ParanoiaAgent):
+    __slots__ = ('id', 'size', 'allocator', 'buffer', 'addresses', 'blocks', 'version', 'open_transaction', '__weakref__')
+
     ID = None
     SIZE = None
     ALLOCATOR = None
     BUFFER = True
+
+    # whether every write to the allocation's memory goes through it. version
+    # counts those writes, so anything copied out of an unversioned allocation
+    # can't be trusted to still match it.
+    VERSIONED = True
     
     def __init__(self, **kwargs):
         long = getattr(__builtin__, 'long', None)
@@ -66,8 +74,12 @@ class Allocation(ParanoiaAgent):
         if not isinstance(self.allocator, Allocator):
             raise AllocationError('allocator must be an Allocator instance')
 
-        self.addresses = dict()
+        # addresses are handed out on demand and only live as long as
+        # something holds onto them
+        self.addresses = weakref.WeakValueDictionary()
         self.blocks = dict()
+        self.version = 0
+        self.open_transaction = None
 
     def hexdump(self, label=None):
         self.check_id()
@@ -104,10 +116,13 @@ class Allocation(ParanoiaAgent):
         if offset > self.size:
             raise AllocationError('address out of range')
         
-        if not offset in self.addresses:
-            self.addresses[offset] = Address(offset=offset, allocation=self)
+        address = self.addresses.get(offset)
+
+        if address is None:
+            address = Address(offset=offset, allocation=self)
+            self.addresses[offset] = address
             
-        return self.addresses[offset]
+        return address
 
     def reallocate(self, size):
         self.check_id()
@@ -120,6 +135,11 @@ class Allocation(ParanoiaAgent):
         self.allocator.free(self.id)
         self.id = 0
 
+    def transaction(self):
+        from paranoia.base.transaction import Transaction
+
+        return Transaction(allocation=self)
+
     def get_block(self, id_val, force=False):
         self.check_id()
         self.check_id_range(id_val)
@@ -131,6 +151,19 @@ class Allocation(ParanoiaAgent):
 
         return self.blocks[delta]
 
+    def get_block_value(self, id_val, force=False):
+        delta = id_val - self.id
+        block = self.blocks.get(delta)
+
+        if block is None:
+            # nothing buffered here, read the byte instead of creating a block for it
+            return self.read_byte(id_val)
+
+        self.check_id()
+        self.check_id_range(id_val)
+
+        return block.get_value(force)
+
     def set_block(self, id_val, block, force=False):
         self.check_id()
         self.check_id_range(id_val)
@@ -154,9 +187,12 @@ class Allocation(ParanoiaAgent):
         self.check_id()
         self.check_id_range(id_val)
 
-        byte = ctypes.string_at(id_val, 1)
+        byte = ord(ctypes.string_at(id_val, 1))
 
-        return ord(byte)
+        if not self.open_transaction is None:
+            byte = self.open_transaction.overlay(id_val, bytearray([byte]))[0]
+
+        return byte
 
     def write_byte(self, id_val, byte_val):
         self.check_id()
@@ -165,9 +201,14 @@ class Allocation(ParanoiaAgent):
         if not 0 <= byte_val < 256:
             raise AllocationError('byte_val must be 0 <= byte_val < 256')
 
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, bytearray([byte_val]))
+            return
+
         str_val = chr(byte_val)
         str_addr = string_address(str_val)
         memmove(id_val, str_addr, 1)
+        self.version += 1
 
     def read_bytestring(self, id_val, size=None, force=False, direct=False):
         self.check_id()
@@ -186,6 +227,9 @@ class Allocation(ParanoiaAgent):
 
         data_read = bytes(ctypes.string_at(self.id+offset, size))
 
+        if not self.open_transaction is None:
+            data_read = bytes(self.open_transaction.overlay(id_val, data_read))
+
         if self.buffer and not direct:
             affected_blocks = filter(lambda x: offset <= x < size+offset, self.blocks.keys())
             
@@ -203,6 +247,29 @@ class Allocation(ParanoiaAgent):
     def read_string(self, id_val, size=None, encoding='ascii', force=False, direct=False):
         return self.read_bytestring(id_val, size, force, direct).decode(encoding)
 
+    def read_buffered(self, id_val, size=None):
+        # memory as the blocks see it: one read, with whatever buffered block
+        # values haven't been flushed yet laid over the top
+        data = bytearray(self.read_bytestring(id_val, size, direct=True))
+
+        if not self.buffer or len(self.blocks) == 0:
+            return data
+
+        offset = id_val - self.id
+
+        if len(self.blocks) < len(data):
+            deltas = filter(lambda x: offset <= x < offset+len(data), self.blocks.keys())
+        else:
+            deltas = filter(lambda x: x in self.blocks, range(offset, offset+len(data)))
+
+        for delta in deltas:
+            block = self.blocks[delta]
+
+            if block.buffer and not block.value is None:
+                data[delta-offset] = block.value
+
+        return data
+
     def read_bytes(self, id_val, size=None, force=False, direct=False):
         bytelist = list(self.read_bytestring(id_val, size, force, direct))
 
@@ -214,6 +281,21 @@ class Allocation(ParanoiaAgent):
 
         return bytelist
 
+    def find_terminator(self, id_val, stride=1, maximum=None):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        # never scan past the end of the allocation
+        remaining = int((self.size - (id_val - self.id)) / stride)
+
+        if maximum is None or maximum > remaining:
+            maximum = remaining
+
+        if not self.open_transaction is None:
+            return self.open_transaction.find_terminator(id_val, stride, maximum)
+
+        return find_terminator(id_val, stride, maximum)
+
     def read_bits(self, id_val, bit_offset=0, size=None, force=False, direct=False):
         if size is None:
             size = self.size * 8 - bit_offset
@@ -239,15 +321,10 @@ class Allocation(ParanoiaAgent):
         if not isinstance(string, (bytes, bytearray)):
             raise AllocationError('byte array not given')
 
-        long = getattr(__builtin__, 'long', None)
-
-        if not long is None: # python 2
-            string_buffer = ctypes.create_string_buffer(str(string))
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, string)
         else:
-            string_buffer = ctypes.create_string_buffer(string)
-            
-        string_address = ctypes.addressof(string_buffer)
-        memmove(id_val, string_address, len(string))
+            self.flush_run(offset, string)
 
         if self.buffer and not direct:
             affected_blocks = filter(lambda x: offset <= x < len(string)+offset, self.blocks.keys())
@@ -297,7 +374,11 @@ class Allocation(ParanoiaAgent):
         if not self.buffer:
             # everything is technically flushed, skip
             return
-        
+
+        if len(self.blocks) == 0:
+            # nothing has been buffered, don't walk the range looking for it
+            return
+
         if size is None:
             size = self.size
 
@@ -316,47 +397,58 @@ class Allocation(ParanoiaAgent):
         else:
             end_delta = start_delta + size
 
-        block_range = list()
-
         if size == 1:
-            block = self.get_block(id_val)
+            block = self.blocks.get(start_delta)
 
-            if not block.value is None:
+            if not block is None and not block.value is None:
                 block.flush()
                 
             return
 
-        for i in range(start_delta, end_delta+1):
-            if not i == end_delta and i in self.blocks and not self.blocks[i].value is None and len(block_range) == 0:
-                block_range.append(i)
-            elif i == end_delta or (not i in self.blocks or self.blocks[i].value is None) and len(block_range) == 1:
-                if len(block_range) == 0: # end of data
-                    break
-                
-                block_range.append(i)
+        self.flush_blocks(start_delta, end_delta)
 
-                block_start, block_end = block_range
-                byte_array = bytearray(map(lambda x: self.blocks[x].value, range(*block_range)))
-                
-                long = getattr(__builtin__, 'long', None)
+    def flush_blocks(self, start_delta, end_delta):
+        # write each run of dirty blocks in the range back in one go. walk
+        # whichever is shorter, the range or the blocks buffered so far
+        if end_delta - start_delta < len(self.blocks):
+            dirty = [x for x in xrange(start_delta, end_delta) if x in self.blocks and not self.blocks[x].value is None]
+        else:
+            dirty = sorted(filter(lambda x: start_delta <= x < end_delta and not self.blocks[x].value is None
+                                  ,self.blocks.keys()))
+
+        run = list()
 
-                if not long is None: # python 2
-                    string_buffer = ctypes.create_string_buffer(str(byte_array))
+        for delta in dirty + [None]:
+            if len(run) > 0 and (delta is None or not delta == run[-1]+1):
+                data = bytearray([self.blocks[x].value for x in run])
+
+                if not self.open_transaction is None:
+                    self.open_transaction.write(self.id+run[0], data)
                 else:
-                    string_buffer = ctypes.create_string_buffer(byte_array)
+                    self.flush_run(run[0], data)
+
+                for x in run:
+                    self.blocks[x].value = None
+
+                run = list()
 
-                string_address = ctypes.addressof(string_buffer)
+            if not delta is None:
+                run.append(delta)
 
-                memmove(self.id+block_start, string_address, len(byte_array))
+    def flush_run(self, offset, data):
+        long = getattr(__builtin__, 'long', None)
 
-                for i in range(*block_range):
-                    self.blocks[i].value = None
+        if not long is None: # python 2
+            string_buffer = ctypes.create_string_buffer(str(data))
+        else:
+            string_buffer = ctypes.create_string_buffer(data)
 
-                block_range = list()
+        memmove(self.id+offset, ctypes.addressof(string_buffer), len(data))
+        self.version += 1
 
     def invalidate(self):
-        for address_index in self.addresses:
-            self.addresses[address_index].allocation = None
+        for address in self.addresses.values():
+            address.allocation = None
 
     def __len__(self):
         return self.size
@@ -443,6 +535,111 @@ class Allocator(ParanoiaAgent):
             elif branch > 0:
                 node = node.right
 
+    def find_range(self, start, end):
+        # start addresses in [start, end) in order. subtrees entirely outside
+        # the range are never entered, so this costs the depth of the tree plus
+        # the number of addresses found.
+        found = list()
+        stack = list()
+        node = self.allocations.root
+
+        while not node is None or len(stack) > 0:
+            if not node is None:
+                if node.label < start:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+
+                continue
+
+            node = stack.pop()
+
+            if node.label >= end:
+                break
+
+            found.append(node.label)
+            node = node.right
+
+        return found
+
+    def find_before(self, address):
+        # the allocation starting closest below address, if any
+        found = None
+        node = self.allocations.root
+
+        while not node is None:
+            if node.label < address:
+                found = node.value
+                node = node.right
+            else:
+                node = node.left
+
+        return found
+
+    def consume_address(self, consumed_address, start_address, end_address):
+        # fold the allocation at consumed_address into the one at start_address,
+        # which now reaches end_address. whatever sticks out past the end stays
+        # behind as an allocation starting at end_address.
+        if not consumed_address in self.allocations:
+            raise AllocationError('consumed address not in allocations')
+
+        if not start_address in self.allocations:
+            raise AllocationError('start address not in allocations')
+
+        if not consumed_address >= start_address or not consumed_address < end_address:
+            raise AllocationError('consumed address not in the range of start and end')
+        
+        allocation = self.allocations[start_address].value
+        size = end_address - start_address
+        consumed_offset = consumed_address - start_address
+        consumed_alloc = self.allocations[consumed_address].value
+        consumed_size = consumed_alloc.size
+        consumed_end = consumed_address + consumed_size
+        consumed_addresses = filter(lambda x: x[0]+consumed_offset < size, consumed_alloc.addresses.items())
+            
+        # shift and save the overlapped address objects
+        for address_offset, address_obj in consumed_addresses:
+            address_obj.allocation = allocation
+            address_obj.offset += consumed_offset
+            allocation.addresses[consumed_offset+address_offset] = address_obj
+            del consumed_alloc.addresses[address_offset]
+                
+        consumed_blocks = filter(lambda x: x+consumed_offset < size, consumed_alloc.blocks.keys())
+            
+        # save the overlapped blocks into our allocation
+        for block_offset in consumed_blocks:
+            block = consumed_alloc.blocks[block_offset]
+            allocation.set_block(int(block.address), block, True)
+            del consumed_alloc.blocks[block_offset]
+
+        if consumed_end <= end_address:
+            consumed_alloc.id = 0
+            consumed_alloc.size = 0
+            del self.allocations[consumed_address]
+            return
+            
+        # this region only overlaps partially, move the beginning of the consumed region
+        # to the end of the new allocation
+        unconsumed_delta = size - consumed_offset
+        unconsumed_addresses = filter(lambda x: x[0] >= unconsumed_delta, consumed_alloc.addresses.items())
+        unconsumed_blocks = filter(lambda x: x >= unconsumed_delta, consumed_alloc.blocks.keys())
+
+        # blocks hold onto addresses from the table, shifting the table shifts them too
+        for unconsumed_offset, unconsumed_address in sorted(unconsumed_addresses):
+            del consumed_alloc.addresses[unconsumed_offset]
+            consumed_alloc.addresses[unconsumed_offset - unconsumed_delta] = unconsumed_address
+            unconsumed_address.offset -= unconsumed_delta
+
+        for unconsumed_offset in sorted(unconsumed_blocks):
+            consumed_alloc.blocks[unconsumed_offset - unconsumed_delta] = consumed_alloc.blocks.pop(unconsumed_offset)
+
+        consumed_alloc.id = end_address
+        consumed_alloc.size = consumed_end - end_address
+
+        del self.allocations[consumed_address]
+        self.allocations[end_address] = consumed_alloc
+
     def __del__(self):
         global allocators
 
@@ -463,6 +660,19 @@ class Allocator(ParanoiaAgent):
                 return allocation
 
 class MemoryAllocation(Allocation):
+    # raw memory gets reverse-allocated as it's touched, often a byte at a
+    # time. reserved is how far past id the allocator has already made sure
+    # no other allocation starts, growing within it skips the overlap check.
+    __slots__ = ('reserved',)
+
+    # anything else in the process can write to raw memory
+    VERSIONED = False
+
+    def __init__(self, **kwargs):
+        super(MemoryAllocation, self).__init__(**kwargs)
+
+        self.reserved = self.size
+
     def check_id_range(self, id_val):
         if id_val < self.id:
             raise AllocationError('id not in range')
@@ -490,6 +700,16 @@ class MemoryAllocation(Allocation):
 
         return super(MemoryAllocation, self).read_bytestring(id_val, size, force, direct)
 
+    def find_terminator(self, id_val, stride=1, maximum=None):
+        if id_val < self.id:
+            raise AllocationError('bad id value')
+
+        if not self.open_transaction is None:
+            return self.open_transaction.find_terminator(id_val, stride, maximum)
+
+        # arbitrary memory grows to fit whatever gets read, so only maximum bounds the scan
+        return find_terminator(id_val, stride, maximum)
+
     def write_bytestring(self, id_val, string, force=False, direct=False):
         if id_val < self.id:
             raise AllocationError('bad id value')
@@ -499,12 +719,13 @@ class MemoryAllocation(Allocation):
         new_size = delta+size
 
         if new_size > self.size:
-            self.rellocate(new_size)
+            self.reallocate(new_size)
 
         return super(MemoryAllocation, self).write_bytestring(id_val, string, force, direct)
 
 class MemoryAllocator(Allocator):
     ALLOCATION_CLASS = MemoryAllocation
+    MINIMUM_RESERVE = 64
     
     def allocate(self, address):
         current = self.find(address)
@@ -514,77 +735,54 @@ class MemoryAllocator(Allocator):
 
         self.allocations[address] = self.allocation_class(id=address, size=1, allocator=self, buffer=self.buffer)
 
+        # the allocation below may have reserved the space we just took
+        previous = self.find_before(address)
+
+        if not previous is None and previous.id + previous.reserved > address:
+            previous.reserved = address - previous.id
+
         return self.allocations[address].value
 
     def reallocate(self, address, size):
         if not address in self.allocations:
             raise AllocatorError('address was not allocated by allocator')
 
+        start_address = address
         end_address = address+size
         allocation = self.allocations[address].value
         allocation.size = size
 
-        consumed_allocations = filter(lambda x: not x == start_address and start_address <= x < end_address, self.allocations.keys())
-        consumed_allocations.sort()
+        if size <= allocation.reserved:
+            return allocation
 
-        for consumed_addr in consumed_allocations:
-            self.consume_address(consumed_addr, start_address, end_address)
+        # reserve at least double what's needed so growing a byte at a time only
+        # looks for neighbours a logarithmic number of times
+        reserve = max(size, allocation.reserved * 2, self.MINIMUM_RESERVE)
+        overlapped = self.find_range(start_address+1, start_address+reserve)
+        allocation.reserved = reserve
 
-        return allocation
-    
-    def consume_address(self, consumed_address, start_address, end_address):
-        if not consumed_address in self.allocations:
-            raise AllocationError('consumed address not in allocations')
+        for overlapped_addr in overlapped:
+            if overlapped_addr >= end_address:
+                # stop reserving where the next allocation begins
+                allocation.reserved = overlapped_addr - start_address
+                break
 
-        if not consumed_address >= start_address or not consumed_address < end_address:
-            raise AllocationError('consumed address not in the range of start and end')
-        
-        consumed_offset = consumed_address - start_address
-        consumed_alloc = self.allocations[consumed_address].value
-        consumed_size = consumed_alloc.size
-        consumed_end = consumed_address + consumed_size
-        consumed_offset_end = consumed_offset + consumed_size
-        consumed_addresses = filter(lambda x: x+consumed_offset < size, consumed_alloc.addresses.keys())
-            
-        # shift and save the overlapped address objects
-        for address_offset in consumed_addresses:
-            address_obj = consumed_alloc.addresses[address_offset]
-            address_obj.allocation = allocation
-            address_obj.offset += consumed_offset
-            allocation.addresses[consumed_offset+address_offset] = address_obj
-            del consumed_alloc.addresses[address_offset]
-                
-        consumed_blocks = filter(lambda x: x+consumed_offset < size, consumed_alloc.blocks.keys())
-            
-        # save the overlapped blocks into our allocation
-        for block_offset in consumed_blocks:
-            block = consumed_alloc.blocks[block_offset]
-            allocation.set_block(int(block.address), block, True)
-            del consumed_alloc.blocks[block_offset]
+            self.consume_address(overlapped_addr, start_address, end_address)
 
-        if consumed_end <= end_address:
-            del self.allocations[consumed_addr]
-            return
-            
-        # this region only overlaps partially, move the beginning of the consumed region
-        # to the end of the new allocation
-        unconsumed_addresses = filter(lambda x: x+consumed_offset >= size, consumed_alloc.addresses.keys())
-        unconsumed_blocks = filter(lambda x: x+consumed_offset >= size, consumed_alloc.blocks.keys())
-        unconsumed_delta = size - consumed_offset
+            if end_address in self.allocations:
+                # the rest of a partially consumed allocation now starts at our end
+                allocation.reserved = size
+                break
 
-        for unconsumed_offset in unconsumed_blocks:
-            new_offset = unconsumed_offset - unconsumed_delta
-            unconsumed_block = consumed_alloc.blocks[unconsumed_offset]
-            consumed_alloc.blocks[new_offset] = unconsumed_block
-            del consumed_alloc.blocks[unconsumed_offset]
-                    
-            unconsumed_block.address.allocation = consumed_alloc
-            unconsumed_block.address.offset -= unconsumed_delta
+        return allocation
 
-        consumed_alloc.id = end_address
+    def consume_address(self, consumed_address, start_address, end_address):
+        consumed_alloc = self.allocations[consumed_address].value
 
-        del self.allocations[consumed_address]
-        self.allocations[end_address] = consumed_alloc
+        super(MemoryAllocator, self).consume_address(consumed_address, start_address, end_address)
+
+        if consumed_alloc.id == end_address:
+            consumed_alloc.reserved = max(0, consumed_alloc.reserved - (end_address - consumed_address))
 
 memory = MemoryAllocator()
 
@@ -658,6 +856,7 @@ class HeapAllocator(Allocator):
         new_address = realloc(address, size)
 
         allocation.id = new_address
+        allocation.version += 1
 
         if size - allocation.size > 0 and self.zero_memory:
             delta = size - allocation.size
@@ -678,18 +877,19 @@ class HeapAllocator(Allocator):
 
         memset(address, 0, allocation.size)
         free(address)
-        allocation.address = 0
+        allocation.id = 0
         allocation.size = 0
 
         del self.allocations[address]
 
 heap = HeapAllocator()
-BlockChain.ALLOCATOR = heap
 
 class VirtualAddressError(AddressError):
     pass
 
 class VirtualAddress(Address):
+    __slots__ = ('allocator',)
+
     ALLOCATOR = None
     
     def __init__(self, **kwargs):
@@ -717,7 +917,7 @@ class VirtualAddress(Address):
             raise VirtualAddressError('allocator cannot be None for reverse allocation')
         
         if not self.allocation is None:
-            del self.allocation.addresses[self.offset]
+            self.allocation.addresses.pop(self.offset, None)
 
         self.allocation = self.allocator.allocate(self.offset, size)
         self.offset = 0
@@ -785,6 +985,10 @@ class VirtualAddress(Address):
         self.ensure_allocation(offset, 1)
         return super(VirtualAddress, self).get_block(offset, force)
 
+    def get_block_value(self, offset=0, force=False):
+        self.ensure_allocation(offset, 1)
+        return super(VirtualAddress, self).get_block_value(offset, force)
+
     def set_block(self, block, offset=0, force=False):
         self.ensure_allocation(offset, 1)
         return super(VirtualAddress, self).set_block(block, offset, force)
@@ -809,6 +1013,43 @@ class VirtualAddress(Address):
         self.ensure_allocation(offset, size)
         return super(VirtualAddress, self).read_bytes(offset, size, force, direct)
 
+    def find_terminator(self, offset=0, stride=1, maximum=None):
+        # the allocation only covers what's been read so far, so grow it a page
+        # at a time until the terminator turns up or the allocator runs out
+        allocator = self.allocator
+
+        if allocator is None:
+            allocator = self.allocation.allocator
+
+        scanned = 0
+
+        while maximum is None or scanned < maximum:
+            current = int(self) + offset + scanned * stride
+            count = int(align(align(current+1, allocator.page_size) - current, stride) / stride)
+
+            if not maximum is None:
+                count = min(count, maximum - scanned)
+
+            if not allocator.maximum_offset is None:
+                count = min(count, int((allocator.maximum_offset - (current - allocator.base_address)) / stride))
+
+                if count <= 0:
+                    return None
+
+            self.ensure_allocation(offset + scanned * stride, count * stride)
+            index = super(VirtualAddress, self).find_terminator(offset + scanned * stride, stride, count)
+
+            if not index is None:
+                return scanned + index
+
+            scanned += count
+
+        return None
+
+    def read_buffered(self, offset=0, size=None):
+        self.ensure_allocation(offset, size)
+        return super(VirtualAddress, self).read_buffered(offset, size)
+
     def read_bits(self, bit_offset=0, size=None, force=False, direct=False):
         self.ensure_allocation(bit_offset/8, size)
         return super(VirtualAddress, self).read_bits(bit_offset, size, force, direct)
@@ -839,109 +1080,174 @@ class VirtualAllocationError(AllocationError):
     pass
 
 class VirtualAllocation(Allocation):
-    def check_id_range(self, id_val):
-        result = super(VirtualAllocation, self).in_range(id_val)
+    # a range of a VirtualAllocator's address space. the bytes live in the
+    # allocator's page table, so the allocation itself only holds its bounds,
+    # its addresses and its blocks.
+    __slots__ = tuple()
 
-        if not result:
-            result = self.allocator.in_range(id_val)
+    def check_id_range(self, id_val):
+        if super(VirtualAllocation, self).in_range(id_val):
+            return
 
-            if not result and not self.allocator.handle.writable():
-                raise VirtualAllocationError('id out of range')
+        if not self.allocator.in_range(id_val) and not self.allocator.writable():
+            raise VirtualAllocationError('id out of range')
 
-            size_at = id_val - self.allocator.base_address + 1
+        size_at = id_val - self.id + 1
 
-            if size_at > self.size:
-                self.reallocate(size_at)
+        if size_at > self.size:
+            self.reallocate(size_at)
             
     def address(self, offset=0):
         if offset >= self.size:
             return self.allocator.address(offset)
 
-        if not offset in self.addresses:
-            self.addresses[offset] = VirtualAddress(offset=offset
-                                                    ,allocation=self
-                                                    ,allocator=self.allocator)
+        address = self.addresses.get(offset)
 
-        return self.addresses[offset]
+        if address is None:
+            address = VirtualAddress(offset=offset
+                                     ,allocation=self
+                                     ,allocator=self.allocator)
+            self.addresses[offset] = address
+
+        return address
     
     def hexdump(self, label=None):
         self.check_id()
-        
-        backing_alloc = self.allocator.backing_allocations[self.id]
 
         if not label:
             label = '<Virtual:%X>' % self.id
 
-        backing_alloc.hexdump(label)
-
-    def get_block(self, id_val, force=False):
-        self.check_id()
-        self.check_id_range(id_val)
+        data = self.allocator.read_pages(self.id, self.size)
+        data_buffer = ctypes.create_string_buffer(bytes(data), self.size)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.get_block(mem_addr)
+        hexdump(ctypes.addressof(data_buffer), self.size, label)
 
-    def set_block(self, id_val, block, force=False):
-        self.check_id()
-        self.check_id_range(id_val)
-
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.set_block(mem_addr, block, force)
-        
     def read_byte(self, id_val):
         self.check_id()
         self.check_id_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.read_byte(mem_addr)
+        if not self.open_transaction is None:
+            return self.open_transaction.overlay(id_val, self.allocator.read_pages(id_val, 1))[0]
+
+        return self.allocator.read_pages(id_val, 1)[0]
     
     def write_byte(self, id_val, byte_val):
         self.check_id()
         self.check_id_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.write_byte(mem_addr, byte_val)
+        if not 0 <= byte_val < 256:
+            raise AllocationError('byte_val must be 0 <= byte_val < 256')
+
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, bytearray([byte_val]))
+            return
+
+        self.allocator.write_pages(id_val, bytearray([byte_val]))
+        self.version += 1
 
     def read_bytestring(self, id_val, size=None, force=False, direct=False):
         self.check_id()
         self.check_id_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.read_bytestring(mem_addr, size=size, force=force, direct=direct)
+        offset = id_val - self.id
+
+        if size is None:
+            size = self.size - offset
+
+        if size < 0:
+            raise AllocationError('size is negative')
+
+        if size+offset > self.size:
+            raise AllocationError('size exceeds allocation size')
+
+        data_read = self.allocator.read_pages(id_val, size)
+
+        if not self.open_transaction is None:
+            data_read = self.open_transaction.overlay(id_val, data_read)
+
+        data_read = bytes(data_read)
+
+        if self.buffer and not direct:
+            affected_blocks = filter(lambda x: offset <= x < size+offset, self.blocks.keys())
+            data = bytearray(data_read)
+
+            for block_id in affected_blocks:
+                self.blocks[block_id].value = data[block_id-offset]
+
+        return data_read
+
+    def find_terminator(self, id_val, stride=1, maximum=None):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        # never scan past the end of the allocation
+        remaining = int((self.size - (id_val - self.id)) / stride)
+
+        if maximum is None or maximum > remaining:
+            maximum = remaining
+
+        if not self.open_transaction is None:
+            return self.open_transaction.find_terminator(id_val, stride, maximum)
+
+        return self.allocator.find_terminator(id_val, stride, maximum)
 
     def write_bytestring(self, id_val, string, force=False, direct=False):
         self.check_id()
         self.check_id_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.write_bytestring(mem_addr, string, force=force, direct=direct)
+        offset = id_val - self.id
 
-    def flush(self, id_val=None, size=None):
-        if not id_val is None:
-            self.check_id()
-            self.check_id_range(id_val)
+        if len(string)+offset > self.size:
+            raise AllocationError('write exceeds allocation size')
 
-            mem_addr = self.allocation.memory_address(id_val)
+        if not isinstance(string, (bytes, bytearray)):
+            raise AllocationError('byte array not given')
+
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, string)
         else:
-            mem_addr = id_val
+            self.allocator.write_pages(id_val, string)
+            self.version += 1
+
+        if self.buffer and not direct:
+            affected_blocks = filter(lambda x: offset <= x < len(string)+offset, self.blocks.keys())
+
+            for block_id in affected_blocks:
+                self.blocks[block_id].value = None
+
+    def flush(self, id_val=None, size=None):
+        if not self.buffer:
+            # everything is technically flushed, skip
+            return
+
+        if id_val is None:
+            id_val = self.id
+
+        start_delta = id_val - self.id
 
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.flush(mem_addr, size)
+        if size is None:
+            size = self.size - start_delta
+
+        self.flush_blocks(start_delta, start_delta+size)
+
+    def flush_run(self, offset, data):
+        self.allocator.write_pages(self.id+offset, data)
+        self.version += 1
 
 class VirtualAllocatorError(AllocatorError):
     pass
 
 class VirtualAllocator(Allocator):
+    # an address space of its own, backed by a sparse page table. a page of heap
+    # memory is only allocated the first time something is written to it, and
+    # pages nobody has written to read as zeros. allocations are just ranges
+    # over the table, so growing, merging and overlapping them never copies
+    # any data.
     ALLOCATION_CLASS = VirtualAllocation
     ZERO_MEMORY = True
     BASE_ADDRESS = None
     MAXIMUM_OFFSET = None
+    PAGE_SIZE = 4096
                                        
     def __init__(self, **kwargs):
         global allocators
@@ -951,6 +1257,7 @@ class VirtualAllocator(Allocator):
         self.zero_memory = kwargs.setdefault('zero_memory', self.ZERO_MEMORY)
         self.base_address = kwargs.setdefault('base_address', self.BASE_ADDRESS)
         self.maximum_offset = kwargs.setdefault('maximum_offset', self.MAXIMUM_OFFSET)
+        self.page_size = kwargs.setdefault('page_size', self.PAGE_SIZE)
         
         virtual_allocators = filter(lambda x: not x == self and isinstance(x, VirtualAllocator), allocators)
         base_addrs = dict(map(lambda x: (x.base_address, None), virtual_allocators))
@@ -966,10 +1273,15 @@ class VirtualAllocator(Allocator):
         if self.base_address in base_addrs:
             raise VirtualAllocatorError('base address already taken')
 
-        self.backing_allocations = dict()
+        # virtual page number -> heap allocation holding that page
+        self.pages = dict()
 
     def in_range(self, other_id, inclusive=False):
         allocator_addr = self.base_address
+
+        if self.maximum_offset is None:
+            return allocator_addr <= other_id
+
         allocator_end = allocator_addr+self.maximum_offset
 
         if inclusive:
@@ -979,24 +1291,128 @@ class VirtualAllocator(Allocator):
 
     def check_range(self, other_id, inclusive=False):
         if not self.in_range(other_id, inclusive):
-            raise DiskError('address out of range')
+            raise VirtualAllocatorError('address out of range')
+
+    def writable(self):
+        return True
 
     def offset_address(self, offset):
         return self.base_address + offset
 
-    def memory_address(self, virtual_address):
-        allocation = self.find(virtual_address)
+    def read_pages(self, address, size):
+        data = bytearray(size)
+        position = 0
+
+        while position < size:
+            page, page_offset = divmod(address+position, self.page_size)
+            count = min(self.page_size - page_offset, size - position)
+            backing_page = self.pages.get(page)
+
+            if not backing_page is None:
+                data[position:position+count] = backing_page.read_bytestring(backing_page.id+page_offset, count, direct=True)
+            else:
+                page_data = self.missing_page(page)
+
+                if not page_data is None:
+                    data[position:position+count] = page_data[page_offset:page_offset+count]
+
+            position += count
 
-        if allocation is None:
-            return None
+        return data
 
-        backing_alloc = self.backing_allocations[allocation.id]
-        delta = virtual_address - allocation.id
+    def missing_page(self, page):
+        # what a page with no heap memory behind it reads as, None for zeros
+        return None
 
-        return backing_alloc.id+delta
+    def new_page(self, page):
+        global heap
+
+        backing_page = heap.allocate(self.page_size)
+        self.pages[page] = backing_page
+
+        return backing_page
+
+    def page_in_use(self, page):
+        page_start = page * self.page_size
+
+        return not self.find(page_start) is None or len(self.find_range(page_start, page_start + self.page_size)) > 0
+
+    def write_pages(self, address, data):
+        size = len(data)
+        position = 0
+
+        while position < size:
+            page, page_offset = divmod(address+position, self.page_size)
+            count = min(self.page_size - page_offset, size - position)
+            backing_page = self.pages.get(page)
+
+            if backing_page is None:
+                backing_page = self.new_page(page)
+
+            backing_page.write_bytestring(backing_page.id+page_offset, bytearray(data[position:position+count]), direct=True)
+            position += count
+
+    def clear_pages(self, start, end):
+        # a range nothing uses anymore: pages no allocation touches go back to
+        # the heap, the rest get the range zeroed around any allocation still on it
+        if end <= start:
+            return
+
+        for page in xrange(int(start / self.page_size), int((end - 1) / self.page_size) + 1):
+            backing_page = self.pages.get(page)
+
+            if backing_page is None:
+                continue
+
+            page_start = page * self.page_size
+            page_end = page_start + self.page_size
+
+            if not self.page_in_use(page):
+                del self.pages[page]
+                backing_page.free()
+                continue
+
+            if not self.zero_memory:
+                continue
+
+            position = max(start, page_start)
+            stop = min(end, page_end)
+
+            while position < stop:
+                other = self.find(position)
+
+                if not other is None:
+                    position = other.id + other.size
+                    continue
+
+                following = self.find_range(position+1, stop)
+                zero_end = stop if len(following) == 0 else following[0]
+                memset(backing_page.id + position - page_start, 0, zero_end - position)
+                position = zero_end
+
+    def find_terminator(self, address, stride=1, maximum=None):
+        # scan a page at a time. unwritten pages are all zeros, so an unbounded
+        # scan always ends at the first of them.
+        scanned = 0
+
+        while maximum is None or scanned < maximum:
+            current = address + scanned * stride
+            count = int(align(align(current+1, self.page_size) - current, stride) / stride)
+
+            if not maximum is None:
+                count = min(count, maximum - scanned)
+
+            index = terminator_index(bytes(self.read_pages(current, count * stride)), stride)
+
+            if not index is None:
+                return scanned + index
+
+            scanned += count
+
+        return None
 
     def address(self, offset=0):
-        if offset > self.maximum_offset:
+        if not self.maximum_offset is None and offset > self.maximum_offset:
             raise VirtualAllocatorError('offset %d greater than maximum offset %d' % (offset, self.maximum_offset))
         
         offset_addr = self.offset_address(offset)
@@ -1013,8 +1429,6 @@ class VirtualAllocator(Allocator):
         return VirtualAddress(offset=offset, allocator=self)
 
     def allocate(self, offset, size):
-        global heap
-        
         long = getattr(__builtin__, 'long', None)
 
         if long is None: # python3
@@ -1032,10 +1446,7 @@ class VirtualAllocator(Allocator):
             raise AllocationError('offset exceeds maximum offset')
 
         size = long(size)
-
-        backing_allocation = heap.allocate(size)
         base_address = self.offset_address(offset)
-        self.backing_allocations[base_address] = backing_allocation
 
         allocation = self.allocation_class(id=base_address
                                            ,size=size
@@ -1044,10 +1455,8 @@ class VirtualAllocator(Allocator):
         self.allocations[base_address] = allocation
 
         base_end = base_address+size
-        consumed_allocations = filter(lambda x: not x == base_address and base_address <= x < base_end, self.allocations.keys())
-        consumed_allocations.sort()
 
-        for consumed_addr in consumed_allocations:
+        for consumed_addr in self.find_range(base_address+1, base_end):
             self.consume_address(consumed_addr, base_address, base_end) 
 
         return allocation
@@ -1056,143 +1465,29 @@ class VirtualAllocator(Allocator):
         if not address in self.allocations:
             raise AllocatorError('address was not allocated by allocator')
             
-        end_address = address+size
-        backing_alloc = self.backing_allocations[address]
-        backing_alloc.reallocate(size)
-
         allocation = self.allocations[address].value
-        allocation.size = size
+        old_end = address+allocation.size
         end_address = address+size
+        allocation.size = size
 
-        consumed_allocations = filter(lambda x: not x == address and address <= x < end_address, self.allocations.keys())
-        consumed_allocations.sort()
+        if end_address < old_end:
+            self.clear_pages(end_address, old_end)
 
-        for consumed_addr in consumed_allocations:
+        for consumed_addr in self.find_range(address+1, end_address):
             self.consume_address(consumed_addr, address, end_address)
 
         return allocation
-    
-    def consume_address(self, consumed_address, start_address, end_address):
-        if not consumed_address in self.allocations:
-            raise AllocationError('consumed address not in allocations')
-
-        if not start_address in self.allocations:
-            raise AllocationError('start address not in allocations')
-
-        if not consumed_address >= start_address or not consumed_address < end_address:
-            raise AllocationError('consumed address not in the range of start and end')
-
-        allocation = self.allocations[start_address].value
-        backing = self.backing_allocations[start_address]
-        size = end_address - start_address
-        
-        consumed_offset = consumed_address - start_address
-        consumed_alloc = self.allocations[consumed_address].value
-        consumed_backer = self.backing_allocations[consumed_address]
-        consumed_size = consumed_alloc.size
-        consumed_end = consumed_address + consumed_size
-        consumed_offset_end = consumed_offset + consumed_size
-        consumed_addresses = filter(lambda x: x+consumed_offset < size, consumed_alloc.addresses.keys())
-            
-        # shift and save the overlapped address objects
-        for address_offset in consumed_addresses:
-            address_obj = consumed_alloc.addresses[address_offset]
-            address_obj.allocation = allocation
-            address_obj.offset += consumed_offset
-            allocation.addresses[consumed_offset+address_offset] = address_obj
-            del consumed_alloc.addresses[address_offset]
-
-        # do the same to the backing allocation
-        consumed_addresses = filter(lambda x: x+consumed_offset < size, consumed_backer.addresses.keys())
-            
-        # shift and save the overlapped address objects
-        for address_offset in consumed_addresses:
-            address_obj = consumed_backer.addresses[address_offset]
-            address_obj.allocation = backing
-            address_obj.offset += consumed_offset
-            backing.addresses[consumed_offset+address_offset] = address_obj
-            del consumed_backer.addresses[address_offset]
-                
-        consumed_blocks = filter(lambda x: x+consumed_offset < size, consumed_backer.blocks.keys())
-            
-        # save the overlapped blocks into our allocation
-        for block_offset in consumed_blocks:
-            block = consumed_backer.blocks[block_offset]
-
-            # this might look like it shouldn't work, but it does, because its underlying
-            # address has been shifted to the new allocation!
-            backing.set_block(int(block.address), block, True)
-            
-            del consumed_backer.blocks[block_offset]
-        
-        if consumed_end <= end_address:
-            consumed_data = consumed_backer.read_bytestring(consumed_backer.id, force=True)
-            backing.write_bytestring(backing.id+consumed_offset, consumed_data, force=True)
-            consumed_alloc.free()
-            return
-        
-        consumed_delta = size - consumed_offset
-        consumed_data = consumed_backer.read_bytestring(consumed_backer.id, size=consumed_delta, force=True)
-        backing.write_bytestring(backing.id+consumed_offset, consumed_data, force=True)
-            
-        # this region only overlaps partially, move the beginning of the consumed region
-        # to the end of the new allocation
-        unconsumed_addresses = filter(lambda x: x+consumed_offset >= size, consumed_alloc.addresses.keys())
-
-        for unconsumed_offset in unconsumed_addresses:
-            new_offset = unconsumed_offset - consumed_delta
-            unconsumed_address = consumed_alloc.addresses[unconsumed_offset]
-            consumed_alloc.addresses[new_offset] = unconsumed_address
-            del consumed_alloc.addresses[unconsumed_offset]
-
-            unconsumed_address.allocation = consumed_alloc
-            unconsumed_address.offset -= consumed_delta
-
-        # do it again for the backing allocation
-        unconsumed_addresses = filter(lambda x: x+consumed_offset >= size, consumed_backer.addresses.keys())
-
-        for unconsumed_offset in unconsumed_addresses:
-            new_offset = unconsumed_offset - consumed_delta
-            unconsumed_address = consumed_backer.addresses[unconsumed_offset]
-            consumed_backer.addresses[new_offset] = unconsumed_address
-            del consumed_backer.addresses[unconsumed_offset]
-
-            unconsumed_address.allocation = consumed_backer
-            unconsumed_address.offset -= consumed_delta
-            
-        unconsumed_blocks = filter(lambda x: x+consumed_offset >= size, consumed_backer.blocks.keys())
-
-        for unconsumed_offset in unconsumed_blocks:
-            new_offset = unconsumed_offset - consumed_delta
-            unconsumed_block = consumed_backer.blocks[unconsumed_offset]
-            consumed_alloc.blocks[new_offset] = unconsumed_block
-            del consumed_backer.blocks[unconsumed_offset]
-                    
-            unconsumed_block.address.allocation = consumed_alloc
-            unconsumed_block.address.offset -= consumed_delta
-
-        unconsumed_address = consumed_backer.id + consumed_delta
-        unconsumed_size = consumed_backer.size - consumed_delta
-        memmove(consumed_backer.id, unconsumed_address, unconsumed_size)
-        consumed_backer.reallocate(unconsumed_size)
-
-        del self.allocations[consumed_address]
-        self.allocations[end_address] = consumed_alloc
-
-        del self.backing_allocations[consumed_address]
-        self.backing_allocations[end_address] = consumed_backer
 
     def free(self, address):
         if address not in self.allocations:
             raise AllocatorError('no such address allocated: 0x%x' % address)
 
         allocation = self.allocations[address].value
-        backing_alloc = self.backing_allocations[address]
-        backing_alloc.invalidate()
-        backing_alloc.free()
-        del self.backing_allocations[address]
+        end_address = address+allocation.size
 
         allocation.invalidate()
-        allocation.address = 0
+        allocation.id = 0
         allocation.size = 0
         del self.allocations[address]
+
+        self.clear_pages(address, end_address)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.fundamentals import align, bitlist_to_numeric
+
+__all__ = ['BitViewError', 'BitView', 'bit_view']
+
+class BitViewError(ParanoiaError):
+    pass
+
+class BitView(ParanoiaAgent):
+    # a window of bits over a list of byte values. slicing a view makes a new
+    # view over the same buffer, so handing the rest of the data down to a
+    # parser never copies it. bits are read most significant first, the same
+    # order bytelist_to_bitlist produces.
+    __slots__ = ('buffer', 'offset', 'length')
+
+    BUFFER = None
+    OFFSET = 0
+    LENGTH = None
+
+    def __init__(self, **kwargs):
+        self.buffer = kwargs.setdefault('buffer', self.BUFFER)
+
+        if self.buffer is None:
+            raise BitViewError('buffer cannot be None')
+
+        if isinstance(self.buffer, str):
+            self.buffer = bytearray(self.buffer)
+
+        self.offset = kwargs.setdefault('offset', self.OFFSET)
+
+        if self.offset < 0:
+            raise BitViewError('offset cannot be negative')
+
+        self.length = kwargs.setdefault('length', self.LENGTH)
+
+        if self.length is None:
+            self.length = max(0, len(self.buffer) * 8 - self.offset)
+
+    @classmethod
+    def from_bits(cls, bit_list):
+        bits = list(bit_list)
+        bits += [0] * (align(len(bits), 8) - len(bits))
+        buffer = [bitlist_to_numeric(bits[i:i+8]) for i in xrange(0, len(bits), 8)]
+
+        return cls(buffer=buffer, length=len(bit_list))
+
+    def get_bit(self, index):
+        bit = self.offset + index
+
+        return (self.buffer[bit >> 3] >> (7 - (bit & 7))) & 1
+
+    def byte_list(self):
+        # the viewed bits packed into bytes, the last byte padded with zeros
+        if self.length == 0:
+            return list()
+
+        count = align(self.length, 8) >> 3
+        start = self.offset >> 3
+        shift = self.offset & 7
+
+        if shift == 0:
+            bytelist = list(self.buffer[start:start+count])
+        else:
+            bytelist = list()
+
+            for i in xrange(start, start+count):
+                value = (self.buffer[i] << shift) & 0xFF
+
+                if i+1 < len(self.buffer):
+                    value |= self.buffer[i+1] >> (8 - shift)
+
+                bytelist.append(value)
+
+        padding = align(self.length, 8) - self.length
+
+        if not padding == 0:
+            bytelist[-1] &= (0xFF << padding) & 0xFF
+
+        return bytelist
+
+    def bit_list(self):
+        return [self.get_bit(i) for i in xrange(self.length)]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+
+            if not step == 1:
+                return self.bit_list()[index]
+
+            return self.__class__(buffer=self.buffer
+                                  ,offset=self.offset+start
+                                  ,length=max(0, stop-start))
+
+        if index < 0:
+            index += self.length
+
+        if index < 0 or index >= self.length:
+            raise IndexError(index)
+
+        return self.get_bit(index)
+
+    def __iter__(self):
+        for i in xrange(self.length):
+            yield self.get_bit(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (BitView, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    def __repr__(self):
+        return '<BitView:%d+%d>' % (self.offset, self.length)
+
+def bit_view(data):
+    if isinstance(data, BitView):
+        return data
+
+    return BitView.from_bits(data)
@@ -10,6 +10,8 @@ class BlockError(ParanoiaError):
     pass
 
 class Block(ParanoiaAgent):
+    __slots__ = ('address', 'buffer', 'static', 'value', 'init_finished')
+
     ADDRESS = None
     VALUE = None
     STATIC = False
@@ -145,6 +147,8 @@ class Block(ParanoiaAgent):
             return '<Block:0x%X/%d>' % (int(self.address), self.get_value())
 
 class BlockLink(Block):
+    __slots__ = ('shift',)
+
     SHIFT = 0
 
     def __init__(self, **kwargs):
@@ -153,25 +157,38 @@ class BlockLink(Block):
         self.shift = kwargs.setdefault('shift', self.SHIFT)
 
     def get_value(self, force=False):
+        # reads go through get_block_value so untouched bytes never grow a Block
         if self.shift == 0:
-            return self.address.get_block().get_value(force)
+            return self.address.get_block_value(0, force)
 
-        lb = self.address.get_block(0)
-        rb = self.address.get_block(1)
-        value = 0
+        value = self.address.get_block_value(0, force) << 8
+        value |= self.address.get_block_value(1, force)
 
-        for i in xrange(8):
-            offset = self.shift + i
+        return (value >> (8 - self.shift)) & 0xFF
 
-            if offset >= 8:
-                cb = rb
-            else:
-                cb = lb
+    def get_bit(self, bit_offset, force=False):
+        if not 0 <= bit_offset < 8:
+            raise BlockError('bit offset must be 0 <= offset < 8')
+
+        # a link never holds a value of its own, bits come from the blocks under it
+        return (self.get_value(force) >> (7 - bit_offset)) & 1
+
+    def set_bit(self, bit_offset, bit_value, force=False):
+        if not 0 <= bit_offset < 8:
+            raise BlockError('bit offset must be 0 <= offset < 8')
+
+        if not 0 <= bit_value <= 1:
+            raise BlockError('bit must be between 0 and 1')
 
-            value <<= 1
-            value |= cb.get_bit(offset % 8, force)
+        value = self.get_value(force)
+        mask = 1 << (7 - bit_offset)
+
+        if bit_value == 1:
+            value |= mask
+        else:
+            value &= ~mask
 
-        return value
+        self.set_value(value, force)
 
     def set_value(self, value, force=False):
         if self.is_static():
@@ -215,7 +232,7 @@ class BlockLink(Block):
 
 class BlockChain(ParanoiaAgent):
     ADDRESS = None
-    ALLOCATOR = None # default allocator gets set to heap in allocator.py
+    ALLOCATOR = None # None means the heap allocator
     AUTO_ALLOCATE = True
     SHIFT = 0
     BUFFER = True
@@ -227,7 +244,7 @@ class BlockChain(ParanoiaAgent):
 
     def __init__(self, **kwargs):
         from paranoia.base.address import Address
-        from paranoia.base.allocator import Allocator
+        from paranoia.base.allocator import Allocator, heap
 
         self.init_finished = False
         
@@ -235,6 +252,9 @@ class BlockChain(ParanoiaAgent):
 
         self.allocator = kwargs.setdefault('allocator', self.ALLOCATOR)
 
+        if self.allocator is None:
+            self.allocator = kwargs['allocator'] = heap
+
         if not isinstance(self.allocator, Allocator):
             raise BlockError('allocator must be an Allocator instance')
 
@@ -302,7 +322,7 @@ class BlockChain(ParanoiaAgent):
         if max_size is None:
             self.maximum_size = None
         elif isinstance(max_size, Size):
-            self.maximum_size = Size(bits=max_size.bits)
+            self.maximum_size = max_size
         else:
             raise BlockError('size must be a Size object')
 
@@ -316,7 +336,7 @@ class BlockChain(ParanoiaAgent):
         self.flush()
         
         if isinstance(chain_length, Size):
-            self.size = Size(bits=chain_length.bits)
+            self.size = chain_length
         else:
             raise BlockError('size must be a Size object')
 
@@ -386,6 +406,9 @@ class BlockChain(ParanoiaAgent):
         return bits
 
     def read_bytes(self, offset=0, size=None, force=False):
+        return list(self.read_bytestring(offset, size, force))
+
+    def read_bytestring(self, offset=0, size=None, force=False):
         if not size is None and not isinstance(size, (int, Size)):
             raise BlockError('size must be an int or a Size object')
 
@@ -400,16 +423,23 @@ class BlockChain(ParanoiaAgent):
         if stop > self.size.byte_length():
             raise BlockError('size exceeds chain length')
 
-        byte_vals = list()
+        if stop <= offset:
+            return bytearray()
+
+        if self.shift == 0:
+            # one read for the whole span rather than a link at a time
+            if force:
+                return bytearray(self.address.read_bytestring(offset, stop-offset, force=True))
+
+            return self.address.read_buffered(offset, stop-offset)
+
+        byte_vals = bytearray()
 
         for i in range(offset, stop):
             byte_vals.append(self.get_link(i).get_value(force))
 
         return byte_vals
 
-    def read_bytestring(self, offset=0, size=None, force=False):
-        return bytearray(self.read_bytes(offset, size, force))
-
     def read_string(self, offset=0, size=None, encoding='ascii', force=False):
         return self.read_bytestring(offset, size, force).decode(encoding)
 
@@ -431,7 +461,7 @@ class BlockChain(ParanoiaAgent):
         block_vals = list()
 
         for i in range(offset, stop):
-            block_vals.append(self.address.get_block(i).get_value(force))
+            block_vals.append(self.address.get_block_value(i, force))
 
         return block_vals
 
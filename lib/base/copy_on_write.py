@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+import collections
+import weakref
+
+from paranoia.fundamentals import align
+from paranoia.base.allocator import VirtualAllocator
+from paranoia.base.paranoia_agent import ParanoiaError
+
+__all__ = ['CopyOnWriteError', 'CopyOnWriteAllocator', 'clones']
+
+class CopyOnWriteError(ParanoiaError):
+    pass
+
+class CopyOnWriteAllocator(VirtualAllocator):
+    # hands out copies of other memory that share the original bytes until
+    # they're written to. a clone's pages start out pointing at a snapshot of
+    # the source, and the first write to a page gives the clone its own copy
+    # of just that page.
+    #
+    # the snapshot of a source is taken once and reused for every clone made
+    # while the source's allocation is unchanged, so stamping out copies of a
+    # template costs nothing per clone but the pages that get modified.
+    MAXIMUM_SNAPSHOTS = 64
+
+    def __init__(self, **kwargs):
+        super(CopyOnWriteAllocator, self).__init__(**kwargs)
+
+        self.maximum_snapshots = kwargs.setdefault('maximum_snapshots', self.MAXIMUM_SNAPSHOTS)
+
+        # virtual page number -> page sized string of snapshot data
+        self.shared = dict()
+        self.snapshots = collections.OrderedDict()
+        self.next_offset = 0
+
+    def split(self, data):
+        data += b'\x00' * (align(len(data), self.page_size) - len(data))
+
+        return [data[i:i+self.page_size] for i in xrange(0, len(data), self.page_size)]
+
+    def snapshot(self, address, size):
+        allocation = address.allocation
+
+        if allocation is None or not allocation.VERSIONED:
+            return self.split(bytes(address.read_buffered(size=size)))
+
+        # the entry only has a weak reference to the allocation and goes away
+        # with it, before its id can be reused
+        key = (id(allocation), int(address), size)
+        entry = self.snapshots.pop(key, None)
+
+        if entry is None or not entry[0]() is allocation or not entry[1] == allocation.version:
+            source = weakref.ref(allocation, lambda ref: self.forget_snapshot(key, ref))
+            entry = (source, allocation.version, self.split(bytes(address.read_buffered(size=size))))
+
+        self.snapshots[key] = entry
+
+        while len(self.snapshots) > self.maximum_snapshots:
+            self.snapshots.popitem(False)
+
+        return entry[2]
+
+    def forget_snapshot(self, key, source):
+        entry = self.snapshots.get(key)
+
+        if not entry is None and entry[0] is source:
+            del self.snapshots[key]
+
+    def clone(self, address, size):
+        if size < 0:
+            raise CopyOnWriteError('size cannot be negative')
+
+        pages = self.snapshot(address, size)
+
+        # every clone starts on a page of its own so its pages line up with the snapshot's
+        offset = self.next_offset
+        self.next_offset += max(1, len(pages)) * self.page_size
+
+        allocation = self.allocate(offset, size)
+        first_page = int(allocation.id / self.page_size)
+
+        for i in xrange(len(pages)):
+            self.shared[first_page+i] = pages[i]
+
+        return allocation
+
+    def missing_page(self, page):
+        return self.shared.get(page)
+
+    def new_page(self, page):
+        backing_page = super(CopyOnWriteAllocator, self).new_page(page)
+        page_data = self.shared.pop(page, None)
+
+        if not page_data is None:
+            backing_page.write_bytestring(backing_page.id, page_data, direct=True)
+
+        return backing_page
+
+    def clear_pages(self, start, end):
+        if end <= start:
+            return
+
+        for page in xrange(int(start / self.page_size), int((end - 1) / self.page_size) + 1):
+            if not page in self.shared:
+                continue
+
+            if self.page_in_use(page):
+                # the zeroing has to land on a page of our own
+                self.new_page(page)
+            else:
+                del self.shared[page]
+
+        super(CopyOnWriteAllocator, self).clear_pages(start, end)
+
+clones = CopyOnWriteAllocator()
@@ -1,25 +1,105 @@
 #!/usr/bin/env python
 
-import ctypes
 import os
+import time
 
-from paranoia.fundamentals import memmove
 from paranoia.base.allocator import allocators, VirtualAllocator, VirtualAllocation, VirtualAddress
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
 from paranoia.base.size import Size
+from paranoia.base.transaction import RunLog
 
-__all__ = ['DiskError', 'DiskAddress', 'DiskAllocation', 'DiskAllocator', 'DiskManager'
-           ,'DiskHandle', 'manager', 'disk_handle']
+__all__ = ['DiskError', 'WriteBackQueue', 'DiskAddress', 'DiskAllocation', 'DiskAllocator'
+           ,'DiskManager', 'DiskHandle', 'AsyncDiskHandle', 'manager', 'disk_executor'
+           ,'disk_handle', 'async_disk_handle']
 
-try:
-    import __builtin__
-except ImportError: #python3
-    import builtins as __builtin__
-           
 class DiskError(ParanoiaError):
     pass
 
+# marks a setting that wasn't passed, None is a real value for some of them
+unchanged = object()
+
+class WriteBackQueue(RunLog):
+    HANDLE = None
+    THRESHOLD = None
+    INTERVAL = None
+
+    def __init__(self, **kwargs):
+        super(WriteBackQueue, self).__init__(**kwargs)
+
+        self.handle = kwargs.setdefault('handle', self.HANDLE)
+
+        if self.handle is None:
+            raise DiskError('handle cannot be None')
+
+        # flush automatically once this many bytes are queued
+        self.threshold = kwargs.setdefault('threshold', self.THRESHOLD)
+
+        # flush automatically once this many seconds have passed since the last flush
+        self.interval = kwargs.setdefault('interval', self.INTERVAL)
+
+        self.last_flush = time.time()
+
+    def queue(self, offset, data):
+        self.add(offset, data)
+
+        if not self.threshold is None and self.total >= self.threshold:
+            self.flush()
+        elif not self.interval is None and time.time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+
+        if len(self.offsets) == 0:
+            return
+
+        handle = self.handle
+
+        if handle.closed() or not handle.writable():
+            raise DiskError('cannot flush write-back queue to a closed or unwritable file')
+
+        file_object = handle.manager.files[handle.fileno]
+
+        # anything sitting in the file object's buffer has to land before we
+        # write around it
+        file_object.flush()
+
+        fileno = file_object.fileno()
+        pwritev = getattr(os, 'pwritev', None)
+        pwrite = getattr(os, 'pwrite', None)
+        curr = file_object.tell()
+
+        for offset in self.offsets:
+            run = self.runs[offset]
+
+            if not pwritev is None:
+                written = pwritev(fileno, [run], offset)
+            elif not pwrite is None:
+                written = pwrite(fileno, run, offset)
+            else:
+                file_object.seek(offset, os.SEEK_SET)
+                file_object.write(run)
+                written = len(run)
+
+            if not written == len(run):
+                raise DiskError('short write while flushing write-back queue')
+
+        if pwritev is None and pwrite is None:
+            file_object.flush()
+        else:
+            # seeking to the end drops whatever the file object has buffered,
+            # which may now be stale
+            file_object.seek(0, os.SEEK_END)
+
+        file_object.seek(curr, os.SEEK_SET)
+
+        self.discard()
+
 class DiskAddress(VirtualAddress):
+    # every class up to ParanoiaAgent declares __slots__, so the empty tuple
+    # is what keeps disk addresses from growing a __dict__
+    __slots__ = tuple()
+
     def ensure_allocation(self, offset=None, size=None):
         if offset is None:
             target_offset = self.offset
@@ -74,12 +154,12 @@ class DiskAddress(VirtualAddress):
     def mirror(self, offset, data):
         if self.allocator.handle.closed() or not self.allocator.handle.writable():
             return
-        
-        ref = self.allocator.handle
-        curr = ref.tell()
-        ref.seek(offset)
-        ref.write(data)
-        ref.seek(curr)
+
+        # an open transaction mirrors its writes when it commits
+        if not self.allocation is None and not self.allocation.open_transaction is None:
+            return
+
+        self.allocator.write(offset, data)
 
     def fork(self, offset):
         alloc_offset = int(self)+offset - self.allocator.base_address
@@ -113,23 +193,29 @@ class DiskAddress(VirtualAddress):
         self.mirror(int(self) - self.allocator.base_address + int(bit_offset/8), bytearray(block_data))
 
 class DiskAllocation(VirtualAllocation):
+    # slotted all the way down like DiskAddress
+    __slots__ = tuple()
+
     def address(self, offset=0):
         if offset >= self.size:
             return self.allocator.address(offset)
 
-        if not offset in self.addresses:
-            self.addresses[offset] = DiskAddress(offset=offset
-                                                 ,allocation=self
-                                                 ,allocator=self.allocator)
+        address = self.addresses.get(offset)
+
+        if address is None:
+            address = DiskAddress(offset=offset
+                                  ,allocation=self
+                                  ,allocator=self.allocator)
+            self.addresses[offset] = address
         
-        return self.addresses[offset]
+        return address
         
     def read_byte(self, id_val):
         self.check_id()
 
         offset = id_val - self.allocator.base_address
 
-        if offset > self.size: # data unread
+        if id_val - self.id + 1 > self.size: # data unread
             handle = self.allocator.handle
 
             if handle.closed():
@@ -137,12 +223,12 @@ class DiskAllocation(VirtualAllocation):
             
             curr = handle.tell()
             handle.seek(offset, os.SEEK_SET)
-            pos = self.dataref.tell()
+            pos = handle.tell()
 
             if not pos == offset:
                 raise DiskError('offset exceeds backing file')
             
-            data = self.dataref.read_address(1)
+            data = handle.read_address(1)
             handle.seek(curr, os.SEEK_SET)
 
             if data is None:
@@ -154,13 +240,11 @@ class DiskAllocation(VirtualAllocation):
                 raise EOFError
 
             if not address.allocation == self:
-                return ord(address.read_byte())
+                return address.read_byte()
 
         self.allocator.check_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.read_byte(mem_addr)
+        return super(DiskAllocation, self).read_byte(id_val)
     
     def write_byte(self, id_val, byte_val):
         self.check_id()
@@ -181,20 +265,18 @@ class DiskAllocation(VirtualAllocation):
             if handle.writable():
                 curr = handle.tell()
                 handle.seek(file_offset, os.SEEK_SET)
-                pos = self.dataref.tell()
+                pos = handle.tell()
 
                 if not pos == file_offset:
                     zero_delta = file_offset - pos
-                    self.handle.write('\x00' * zero_delta, False)
+                    handle.write('\x00' * zero_delta, False)
                 
                 handle.write(chr(byte_val), False)
                 handle.seek(curr, os.SEEK_SET)
 
         self.allocator.check_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.write_byte(mem_addr, byte_val)
+        return super(DiskAllocation, self).write_byte(id_val, byte_val)
 
     def read_bytestring(self, id_val, size=None, force=False, direct=False):
         self.check_id()
@@ -204,7 +286,7 @@ class DiskAllocation(VirtualAllocation):
         if size is None:
             size = self.allocator.maximum_offset - offset
 
-        if offset+size > self.size: # data unread
+        if id_val - self.id + size > self.size: # data unread
             handle = self.allocator.handle
 
             if handle.closed():
@@ -229,13 +311,11 @@ class DiskAllocation(VirtualAllocation):
                 raise EOFError
 
             if not address.allocation == self:
-                return ord(address.read_bytestring(size=size))
+                return address.read_bytestring(size=size)
 
         self.allocator.check_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.read_bytestring(mem_addr, size=size, force=force, direct=direct)
+        return super(DiskAllocation, self).read_bytestring(id_val, size, force, direct)
 
     def write_bytestring(self, id_val, string, force=False, direct=False):
         self.check_id()
@@ -268,86 +348,22 @@ class DiskAllocation(VirtualAllocation):
 
         self.allocator.check_range(id_val)
 
-        mem_addr = self.allocator.memory_address(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        return backing_alloc.write_bytestring(mem_addr, string, force=force, direct=direct)
-
-    def flush(self, id_val=None, size=None):
-        if not self.buffer:
-            # everything is technically flushed, skip
-            return
-
-        if id_val is None:
-            id_val = self.id
+        return super(DiskAllocation, self).write_bytestring(id_val, string, force, direct)
 
-        self.check_id_range(id_val)
-        backing_alloc = self.allocator.backing_allocations[self.id]
-        
-        if size is None:
-            size = backing_alloc.size
-
-        if size == 0:
-            return
-
-        start_delta = id_val - self.id
-
-        if size == self.size and not start_delta == 0:
-            end_delta = size - start_delta
-        else:
-            end_delta = start_delta + size
-
-        backing_address = backing_alloc.id + start_delta
-        file_delta = id_val - self.allocator.base_address
-        block_range = list()
-
-        if size == 1:
-            block = backing_alloc.get_block(backing_address)
-
-            if not block.value is None:
-                block.flush()
-                
-            return
+    def flush_run(self, offset, data):
+        super(DiskAllocation, self).flush_run(offset, data)
 
         handle = self.allocator.handle
-        curr = handle.tell()
-
-        for i in range(start_delta, end_delta+1):
-            if not i == end_delta and i in backing_alloc.blocks and not backing_alloc.blocks[i].value is None and len(block_range) == 0:
-                block_range.append(i)
-            elif i == end_delta or (not i in backing_alloc.blocks or backing_alloc.blocks[i].value is None) and len(block_range) == 1:
-                if len(block_range) == 0: # end of data
-                    break
-                
-                block_range.append(i)
 
-                block_start, block_end = block_range
-                byte_array = bytearray(map(lambda x: backing_alloc.blocks[x].value, range(*block_range)))
-                
-                long = getattr(__builtin__, 'long', None)
-
-                if not long is None: # python 2
-                    string_buffer = ctypes.create_string_buffer(str(byte_array))
-                else:
-                    string_buffer = ctypes.create_string_buffer(byte_array)
-
-                string_address = ctypes.addressof(string_buffer)
-
-                memmove(backing_address+block_start, string_address, len(byte_array))
-
-                if not handle.closed() and handle.writable():
-                    handle.seek(file_delta + block_start, os.SEEK_SET)
-                    handle.write(byte_array, False)
-
-                for i in range(*block_range):
-                    backing_alloc.blocks[i].value = None
-
-                block_range = list()
-
-        handle.seek(curr, os.SEEK_SET)
+        if not handle.closed() and handle.writable():
+            self.allocator.write(self.id + offset - self.allocator.base_address, data)
 
 class DiskAllocator(VirtualAllocator):
     ALLOCATION_CLASS = DiskAllocation
     HANDLE = None
+    WRITE_BACK = False
+    WRITE_BACK_THRESHOLD = 1024 * 1024
+    WRITE_BACK_INTERVAL = None
 
     def __init__(self, **kwargs):
         super(DiskAllocator, self).__init__(**kwargs)
@@ -360,6 +376,44 @@ class DiskAllocator(VirtualAllocator):
         if not isinstance(self.handle, DiskHandle):
             raise DiskError('handle must be a DiskHandle object')
 
+        self.write_back = kwargs.setdefault('write_back', self.WRITE_BACK)
+        self.write_queue = WriteBackQueue(handle=self.handle
+                                          ,threshold=kwargs.setdefault('write_back_threshold', self.WRITE_BACK_THRESHOLD)
+                                          ,interval=kwargs.setdefault('write_back_interval', self.WRITE_BACK_INTERVAL))
+
+    def set_write_back(self, write_back, threshold=unchanged, interval=unchanged):
+        if not write_back:
+            self.sync()
+
+        self.write_back = write_back
+
+        # leave whatever wasn't given as it was
+        if not threshold is unchanged:
+            self.write_queue.threshold = threshold
+
+        if not interval is unchanged:
+            self.write_queue.interval = interval
+
+    def write(self, offset, data):
+        if self.write_back:
+            self.write_queue.queue(offset, data)
+            return
+
+        handle = self.handle
+        curr = handle.tell()
+        handle.seek(offset, os.SEEK_SET)
+        handle.write(data, False)
+        handle.seek(curr, os.SEEK_SET)
+
+    def writable(self):
+        return self.handle.writable()
+
+    def sync(self):
+        if len(self.write_queue.offsets) == 0:
+            return
+
+        self.write_queue.flush()
+
     def address(self, offset=0):
         if offset > self.maximum_offset and not self.handle.writable():
             raise DiskError('offset %d greater than maximum offset %d' % (offset, self.maximum_offset))
@@ -383,16 +437,16 @@ class DiskManager(ParanoiaAgent):
         self.allocators = dict()
         self.last_eof = dict()
 
-    def open(self, filename, mode, buffer=False):
+    def open(self, filename, mode, buffer=False, write_back=False):
         if 'r' in mode and 'w' in mode or '+' in mode:
             if not os.path.exists(filename):
                 fp = open(filename, 'w')
                 fp.close()
                 
         fp = open(filename, mode)
-        return self.manage(fp)
+        return self.manage(fp, write_back)
 
-    def manage(self, file_object):
+    def manage(self, file_object, write_back=False):
         self.files[file_object.fileno()] = file_object
 
         file_object.seek(0, os.SEEK_END)
@@ -402,7 +456,8 @@ class DiskManager(ParanoiaAgent):
         handle = DiskHandle(fileno=file_object.fileno(), manager=self)
         self.allocators[file_object.fileno()] = DiskAllocator(buffer=buffer
                                                               ,maximum_offset=maximum
-                                                              ,handle=handle)
+                                                              ,handle=handle
+                                                              ,write_back=write_back)
 
         return handle
 
@@ -435,8 +490,14 @@ class DiskManager(ParanoiaAgent):
             allocation = allocator.allocations[allocation_id].value
             allocation.flush()
 
+        allocator.sync()
         self.files[fileno].flush()
 
+    def sync(self, fileno):
+        # land queued write-back data before touching the file directly
+        if fileno in self.allocators:
+            self.allocators[fileno].sync()
+
     def next(self, fileno):
         if not fileno in self.files:
             raise DiskError('fileno not being managed')
@@ -452,6 +513,8 @@ class DiskManager(ParanoiaAgent):
         if not fileno in self.files:
             raise DiskError('fileno not being managed')
 
+        self.sync(fileno)
+
         offset = self.tell(fileno)
         allocator = self.allocators[fileno]
         address = allocator.offset_address(offset)
@@ -484,6 +547,8 @@ class DiskManager(ParanoiaAgent):
     def readline(self, fileno, size=None):
         if not fileno in self.files:
             raise DiskError('fileno not being managed')
+
+        self.sync(fileno)
         
         current_position = self.tell(fileno)
         eof = self.eof(fileno)
@@ -560,6 +625,7 @@ class DiskManager(ParanoiaAgent):
         if not fileno in self.files:
             raise DiskError('fileno not being managed')
 
+        self.sync(fileno)
         self.files[fileno].write(data)
 
     def writelines(self, fileno, lines):
@@ -584,6 +650,8 @@ class DiskManager(ParanoiaAgent):
     def eof(self, fileno):
         if not fileno in self.files:
             raise DiskError('fileno not being managed')
+
+        self.sync(fileno)
         
         current = self.tell(fileno)
         self.seek(fileno, 0, os.SEEK_END)
@@ -778,6 +846,99 @@ class DiskHandle(ParanoiaAgent):
         if not self.closed():
             return self
 
+executor = None
+
+def disk_executor():
+    global executor
+
+    # allocators and their trees are not thread safe, so the shared executor
+    # serializes all disk work on one thread. callers never block on it either way.
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    return executor
+
+class AsyncDiskHandle(ParanoiaAgent):
+    # a DiskHandle whose blocking calls run on an executor. every call returns
+    # a concurrent.futures Future, asyncio code can await one by wrapping it
+    # with asyncio.wrap_future.
+    HANDLE = None
+    EXECUTOR = None
+
+    def __init__(self, **kwargs):
+        self.handle = kwargs.setdefault('handle', self.HANDLE)
+
+        if self.handle is None:
+            raise DiskError('handle cannot be None')
+
+        if not isinstance(self.handle, DiskHandle):
+            raise DiskError('handle must be a DiskHandle object')
+
+        self.executor = kwargs.setdefault('executor', self.EXECUTOR)
+
+        if self.executor is None:
+            self.executor = disk_executor()
+
+    def run(self, function, *args, **kwargs):
+        return self.executor.submit(function, *args, **kwargs)
+
+    def close(self, destroy=True):
+        return self.run(self.handle.close, destroy)
+
+    def flush(self):
+        return self.run(self.handle.flush)
+
+    def read(self, size=None):
+        return self.run(self.handle.read, size)
+
+    def read_address(self, size=None):
+        return self.run(self.handle.read_address, size)
+
+    def readline(self, size=None):
+        return self.run(self.handle.readline, size)
+
+    def seek(self, offset, whence=None):
+        return self.run(self.handle.seek, offset, whence)
+
+    def tell(self):
+        return self.run(self.handle.tell)
+
+    def write(self, data, mirror=True):
+        return self.run(self.handle.write, data, mirror)
+
+    def eof(self):
+        return self.run(self.handle.eof)
+
+    def allocate(self, offset=0, size=None):
+        return self.run(self.handle.allocate, offset, size)
+
+    def address(self, offset=None):
+        # addresses are lazy, handing one out doesn't touch the file
+        return self.handle.address(offset)
+
+    def read_bytestring(self, offset=0, size=None):
+        return self.run(self.read_bytestring_sync, offset, size)
+
+    def read_bytestring_sync(self, offset, size):
+        if size is None:
+            size = self.handle.eof() - offset
+
+        return self.handle.address(offset).read_bytestring(size=size)
+
+    def closed(self):
+        return self.handle.closed()
+
+    def writable(self):
+        return self.handle.writable()
+
+    def readable(self):
+        return self.handle.readable()
+
 def disk_handle(filename, mode):
     global manager
     return manager.open(filename, mode)
+
+def async_disk_handle(filename, mode, executor=None):
+    return AsyncDiskHandle(handle=disk_handle(filename, mode)
+                           ,executor=executor)
@@ -6,4 +6,4 @@ class ParanoiaError(Exception):
     pass
 
 class ParanoiaAgent(object):
-    pass
+    __slots__ = tuple()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+import collections
+import ctypes
+import errno
+import mmap
+import os
+
+from paranoia.fundamentals import align, crt_module, system, terminator_index
+from paranoia.base.allocator import allocators, Allocator, Allocation, AllocationError, AllocatorError
+from paranoia.base.paranoia_agent import ParanoiaError
+
+__all__ = ['ProcessMemoryError', 'ProcessMemoryAllocation', 'ProcessMemoryAllocator'
+           ,'iovec', 'process_vm_readv', 'process_vm_writev']
+
+class ProcessMemoryError(ParanoiaError):
+    pass
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p)
+                ,('iov_len', ctypes.c_size_t)]
+
+process_vm_readv = None
+process_vm_writev = None
+
+if system == 'Linux':
+    # a second handle on libc so the syscalls can report errno
+    errno_module = ctypes.CDLL(crt_module._name, use_errno=True)
+
+    process_vm_readv = getattr(errno_module, 'process_vm_readv', None)
+    process_vm_writev = getattr(errno_module, 'process_vm_writev', None)
+
+    for function in (process_vm_readv, process_vm_writev):
+        if function is None:
+            continue
+
+        function.restype = ctypes.c_ssize_t
+        function.argtypes = (ctypes.c_int
+                             ,ctypes.POINTER(iovec), ctypes.c_ulong
+                             ,ctypes.POINTER(iovec), ctypes.c_ulong
+                             ,ctypes.c_ulong)
+
+class ProcessMemoryAllocation(Allocation):
+    # a window onto another process's memory. like a MemoryAllocation it grows
+    # to fit whatever gets read through it, but every byte comes through the
+    # allocator's page cache, so a bad pointer raises instead of faulting.
+    __slots__ = tuple()
+
+    # the process writes to its own memory whenever it likes
+    VERSIONED = False
+
+    def check_id_range(self, id_val, inclusive=False):
+        if id_val < self.id:
+            raise AllocationError('id not in range')
+
+        size_at = id_val - self.id + 1
+
+        if size_at > self.size:
+            self.reallocate(size_at)
+
+        return super(ProcessMemoryAllocation, self).check_id_range(id_val, inclusive)
+
+    def hexdump(self, label=None):
+        from paranoia.fundamentals import hexdump
+
+        self.check_id()
+
+        data = ctypes.create_string_buffer(bytes(self.allocator.read(self.id, self.size)), self.size)
+
+        if label is None:
+            label = '%X in process %d' % (self.id, self.allocator.pid)
+
+        hexdump(ctypes.addressof(data), self.size, label)
+
+    def read_byte(self, id_val):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        if not self.open_transaction is None:
+            return self.open_transaction.overlay(id_val, self.allocator.read(id_val, 1))[0]
+
+        return self.allocator.read(id_val, 1)[0]
+
+    def write_byte(self, id_val, byte_val):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        if not 0 <= byte_val < 256:
+            raise AllocationError('byte_val must be 0 <= byte_val < 256')
+
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, bytearray([byte_val]))
+            return
+
+        self.allocator.write(id_val, bytearray([byte_val]))
+
+    def read_bytestring(self, id_val, size=None, force=False, direct=False):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        offset = id_val - self.id
+
+        if size is None:
+            size = self.size - offset
+
+        if size < 0:
+            raise AllocationError('size is negative')
+
+        if offset+size > self.size:
+            self.reallocate(offset+size)
+
+        data_read = self.allocator.read(id_val, size)
+
+        if not self.open_transaction is None:
+            data_read = self.open_transaction.overlay(id_val, data_read)
+
+        data_read = bytes(data_read)
+
+        if self.buffer and not direct:
+            affected_blocks = filter(lambda x: offset <= x < size+offset, self.blocks.keys())
+            data = bytearray(data_read)
+
+            for block_id in affected_blocks:
+                self.blocks[block_id].value = data[block_id-offset]
+
+        return data_read
+
+    def find_terminator(self, id_val, stride=1, maximum=None):
+        self.check_id()
+
+        if id_val < self.id:
+            raise AllocationError('bad id value')
+
+        if not self.open_transaction is None:
+            return self.open_transaction.find_terminator(id_val, stride, maximum)
+
+        # scan a page at a time, a string ending just short of an unmapped page
+        # shouldn't fault on the page after it
+        page_size = self.allocator.page_size
+        scanned = 0
+
+        while maximum is None or scanned < maximum:
+            address = id_val + scanned * stride
+            count = int(align(align(address+1, page_size) - address, stride) / stride)
+
+            if not maximum is None:
+                count = min(count, maximum - scanned)
+
+            index = terminator_index(bytes(self.allocator.read(address, count * stride)), stride)
+
+            if not index is None:
+                return scanned + index
+
+            scanned += count
+
+        return None
+
+    def write_bytestring(self, id_val, string, force=False, direct=False):
+        self.check_id()
+        self.check_id_range(id_val)
+
+        if not isinstance(string, (bytes, bytearray)):
+            raise AllocationError('byte array not given')
+
+        offset = id_val - self.id
+
+        if offset+len(string) > self.size:
+            self.reallocate(offset+len(string))
+
+        if not self.open_transaction is None:
+            self.open_transaction.write(id_val, string)
+        else:
+            self.allocator.write(id_val, string)
+
+        if self.buffer and not direct:
+            affected_blocks = filter(lambda x: offset <= x < len(string)+offset, self.blocks.keys())
+
+            for block_id in affected_blocks:
+                self.blocks[block_id].value = None
+
+    def flush(self, id_val=None, size=None):
+        if not self.buffer:
+            return
+
+        if id_val is None:
+            id_val = self.id
+
+        start_delta = id_val - self.id
+
+        if size is None:
+            size = self.size - start_delta
+
+        self.flush_blocks(start_delta, start_delta+size)
+
+    def flush_run(self, offset, data):
+        self.allocator.write(self.id+offset, data)
+
+class ProcessMemoryAllocator(Allocator):
+    # reads the memory of a process through process_vm_readv. memory is read a
+    # page at a time into a cache, and the pages missing from a read are
+    # fetched together in one scatter-gather call. the kernel checks every
+    # page, so an unmapped or protected address comes back as an error
+    # rather than a segfault.
+    #
+    # the cache doesn't know when the process writes to its own memory, call
+    # invalidate_cache to pick up changes. writes made through the allocator
+    # keep it up to date.
+    ALLOCATION_CLASS = ProcessMemoryAllocation
+    PID = None
+    PAGE_SIZE = mmap.PAGESIZE
+    CACHE = True
+    MAXIMUM_PAGES = 1024
+    MAXIMUM_IOVECS = 1024
+
+    def __init__(self, **kwargs):
+        global allocators
+
+        if process_vm_readv is None:
+            raise ProcessMemoryError('process_vm_readv not available on %s' % system)
+
+        super(ProcessMemoryAllocator, self).__init__(**kwargs)
+
+        # addresses here belong to another process, so Address(offset=...) must
+        # never go looking for them in this allocator
+        allocators.discard(self)
+
+        self.pid = kwargs.setdefault('pid', self.PID)
+
+        if self.pid is None:
+            self.pid = os.getpid()
+
+        self.page_size = kwargs.setdefault('page_size', self.PAGE_SIZE)
+        self.cache = kwargs.setdefault('cache', self.CACHE)
+        self.maximum_pages = kwargs.setdefault('maximum_pages', self.MAXIMUM_PAGES)
+        self.maximum_iovecs = kwargs.setdefault('maximum_iovecs', self.MAXIMUM_IOVECS)
+        self.pages = collections.OrderedDict()
+
+    def allocate(self, address, size=1):
+        current = self.find(address)
+
+        if not current is None:
+            raise AllocatorError('address already has allocation')
+
+        self.allocations[address] = self.allocation_class(id=address, size=size, allocator=self, buffer=self.buffer)
+
+        return self.allocations[address].value
+
+    def reallocate(self, address, size):
+        if not address in self.allocations:
+            raise AllocatorError('address was not allocated by allocator')
+
+        # nothing is held locally, the allocation just covers more of the process
+        allocation = self.allocations[address].value
+        allocation.size = size
+
+        return allocation
+
+    def address(self, offset=0):
+        allocation = self.find(offset)
+
+        if allocation is None:
+            allocation = self.allocate(offset)
+
+        return allocation.address(offset - allocation.id)
+
+    def fetch_pages(self, page_numbers):
+        # read the given pages with as few syscalls as possible. pages before a
+        # bad one still land in the cache, the bad one raises.
+        fetched = dict()
+
+        for i in xrange(0, len(page_numbers), self.maximum_iovecs):
+            batch = page_numbers[i:i+self.maximum_iovecs]
+            buffer_size = len(batch) * self.page_size
+            local_buffer = ctypes.create_string_buffer(buffer_size)
+            local_iov = iovec(ctypes.addressof(local_buffer), buffer_size)
+            remote_iov = (iovec * len(batch))()
+
+            for j, page in enumerate(batch):
+                remote_iov[j].iov_base = page * self.page_size
+                remote_iov[j].iov_len = self.page_size
+
+            result = process_vm_readv(self.pid, ctypes.byref(local_iov), 1, remote_iov, len(batch), 0)
+
+            if result < 0:
+                error = ctypes.get_errno()
+
+                if error == errno.EFAULT:
+                    result = 0
+                else:
+                    raise ProcessMemoryError('cannot read memory of process %d: %s' % (self.pid, os.strerror(error)))
+
+            data = local_buffer.raw
+
+            for j in xrange(int(result / self.page_size)):
+                fetched[batch[j]] = data[j*self.page_size:(j+1)*self.page_size]
+
+            if result < buffer_size:
+                bad_page = batch[int(result / self.page_size)]
+                self.cache_pages(fetched)
+
+                raise ProcessMemoryError('address %X in process %d cannot be read' % (bad_page * self.page_size, self.pid))
+
+        self.cache_pages(fetched)
+
+        return fetched
+
+    def cache_pages(self, fetched):
+        if not self.cache:
+            return
+
+        for page in sorted(fetched.keys()):
+            self.pages.pop(page, None)
+            self.pages[page] = fetched[page]
+
+        while len(self.pages) > self.maximum_pages:
+            self.pages.popitem(False)
+
+    def read(self, address, size):
+        if size == 0:
+            return bytearray()
+
+        if address < 0 or size < 0:
+            raise ProcessMemoryError('address and size cannot be negative')
+
+        first_page = int(address / self.page_size)
+        last_page = int((address + size - 1) / self.page_size)
+        page_data = dict()
+        missing = list()
+
+        for page in xrange(first_page, last_page+1):
+            data = self.pages.get(page)
+
+            if data is None:
+                missing.append(page)
+            else:
+                page_data[page] = data
+
+        if len(missing) > 0:
+            page_data.update(self.fetch_pages(missing))
+
+        data = bytearray(b''.join([page_data[page] for page in xrange(first_page, last_page+1)]))
+        start = address - first_page * self.page_size
+
+        return data[start:start+size]
+
+    def write(self, address, data):
+        if process_vm_writev is None:
+            raise ProcessMemoryError('process_vm_writev not available on %s' % system)
+
+        data = bytearray(data)
+
+        if len(data) == 0:
+            return
+
+        local_buffer = ctypes.create_string_buffer(bytes(data), len(data))
+        local_iov = iovec(ctypes.addressof(local_buffer), len(data))
+        remote_iov = iovec(address, len(data))
+
+        result = process_vm_writev(self.pid, ctypes.byref(local_iov), 1, ctypes.byref(remote_iov), 1, 0)
+        self.invalidate_cache(address, len(data))
+
+        if result < 0:
+            error = ctypes.get_errno()
+            raise ProcessMemoryError('cannot write memory of process %d: %s' % (self.pid, os.strerror(error)))
+
+        if result < len(data):
+            raise ProcessMemoryError('address %X in process %d cannot be written' % (address + result, self.pid))
+
+    def invalidate_cache(self, address=None, size=None):
+        if address is None:
+            self.pages.clear()
+            return
+
+        if size is None:
+            size = 1
+
+        first_page = int(address / self.page_size)
+        last_page = int((address + max(size, 1) - 1) / self.page_size)
+
+        for page in xrange(first_page, last_page+1):
+            self.pages.pop(page, None)
+
+    def __del__(self):
+        # never registered in allocators, see __init__
+        for address in list(self.allocations):
+            self.free(address)
@@ -3,53 +3,101 @@
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
 from paranoia.fundamentals import align
 
+try:
+    import __builtin__
+except ImportError: #python3
+    import builtins as __builtin__
+
 __all__ = ['SizeError', 'Size']
 
+integer_types = (int, getattr(__builtin__, 'long', int))
+
 class SizeError(ParanoiaError):
     pass
 
 class Size(ParanoiaAgent):
+    __slots__ = ('bits',)
+
     BITS = None
     BYTES = None
-    
-    def __init__(self, **kwargs):
-        bits = kwargs.setdefault('bits', self.BITS)
-        byte_count = kwargs.setdefault('bytes', self.BYTES)
+    INTERN_LIMIT = 4096
 
-        if bits is None and byte_count is None:
-            raise SizeError('size must be given either a bitcount or a bytecount')
+    # sizes are immutable, so the common ones are shared instead of rebuilt
+    interned = dict()
 
-        if not byte_count is None:
-            self.set_bytes(byte_count)
-        else:
-            self.set_bits(bits)
+    def __new__(cls, bits=None, bytes=None):
+        if bits is None:
+            bits = cls.BITS
 
-    def set_bytes(self, byte_count):
-        if not isinstance(byte_count, int):
-            raise SizeError('size must be an int')
+        if bytes is None:
+            bytes = cls.BYTES
 
-        self.set_bits(byte_count * 8)
+        if bits is None and bytes is None:
+            raise SizeError('size must be given either a bitcount or a bytecount')
 
-    def set_bits(self, bit_count):
-        if not isinstance(bit_count, int):
+        if not bytes is None:
+            if not isinstance(bytes, integer_types):
+                raise SizeError('size must be an int')
+
+            bits = bytes * 8
+        elif not isinstance(bits, integer_types):
             raise SizeError('size must be an int')
 
-        if bit_count < 0:
+        if bits < 0:
             raise SizeError('size cannot be negative')
 
-        self.bits = bit_count
+        bits = int(bits)
+        interned = cls is Size and bits <= cls.INTERN_LIMIT
+
+        if interned and bits in cls.interned:
+            return cls.interned[bits]
+
+        size = super(Size, cls).__new__(cls)
+        object.__setattr__(size, 'bits', bits)
+
+        if interned:
+            cls.interned[bits] = size
+
+        return size
+
+    def __setattr__(self, attr, value):
+        raise SizeError('size objects are immutable')
+
+    def __delattr__(self, attr):
+        raise SizeError('size objects are immutable')
+
+    def __reduce__(self):
+        return (self.__class__, (self.bits,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def byte_offset(self):
         return int(self.bits/8)
-    
+
     def byte_length(self):
         return int(align(self.bits, 8)/8)
 
     def __int__(self):
         return self.bits
 
+    def __long__(self):
+        return self.bits
+
+    def __index__(self):
+        return self.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return '<Size:%d>' % self.bits
+
     def __add__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('addend must be an int or a Size object')
 
         return self.__class__(bits=self.bits + int(other))
@@ -57,26 +105,20 @@ class Size(ParanoiaAgent):
     def __radd__(self, other):
         return self + other
 
-    def __iadd__(self, other):
-        self.set_bits(int(self + other))
-
     def __sub__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('subtractor must be an int or a Size object')
 
         return self.__class__(bits=self.bits - int(other))
 
     def __rsub__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('subtractor must be an int or a Size object')
-        
-        return self.__class__(bits=int(other) - self.bits)
 
-    def __isub__(self, other):
-        self.set_bits(int(self - other))
+        return self.__class__(bits=int(other) - self.bits)
 
     def __mul__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('multiplicant must be an int or a Size object')
 
         return self.__class__(bits=self.bits * int(other))
@@ -84,50 +126,85 @@ class Size(ParanoiaAgent):
     def __rmul__(self, other):
         return self * other
 
-    def __imul__(self, other):
-        self.set_bits(int(self * other))
-
     def __div__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('divisor must be an int or a Size object')
 
         if int(other) == 0:
             raise SizeError('divisor cannot be 0')
-        
+
         return self.__class__(bits=int(self.bits / int(other)))
 
     def __rdiv__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('subtractor must be an int or a Size object')
 
         if self.bits == 0:
             raise SizeError('divisor cannot be 0')
-        
+
         return self.__class__(bits=int(int(other) / self.bits))
 
-    def __idiv__(self, other):
-        self.set_bits(int(self / other))
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+    __floordiv__ = __div__
+    __rfloordiv__ = __rdiv__
 
     def __mod__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('divisor must be an int or a Size object')
 
         if int(other) == 0:
             raise SizeError('divisor cannot be 0')
-        
+
         return self.__class__(bits=int(self.bits % int(other)))
 
     def __rmod__(self, other):
-        if not isinstance(other, (int, Size)):
+        if not isinstance(other, size_operands):
             raise SizeError('subtractor must be an int or a Size object')
 
         if self.bits == 0:
             raise SizeError('divisor cannot be 0')
-        
+
         return self.__class__(bits=int(int(other) % self.bits))
 
-    def __imod__(self, other):
-        self.set_bits(int(self % other))
+    def __eq__(self, other):
+        if isinstance(other, Size):
+            return self.bits == other.bits
+        elif isinstance(other, integer_types):
+            return self.bits == other
+
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    def __lt__(self, other):
+        if not isinstance(other, size_operands):
+            return NotImplemented
+
+        return self.bits < int(other)
+
+    def __le__(self, other):
+        if not isinstance(other, size_operands):
+            return NotImplemented
+
+        return self.bits <= int(other)
+
+    def __gt__(self, other):
+        if not isinstance(other, size_operands):
+            return NotImplemented
+
+        return self.bits > int(other)
+
+    def __ge__(self, other):
+        if not isinstance(other, size_operands):
+            return NotImplemented
+
+        return self.bits >= int(other)
 
-    def __cmp__(self, other):
-        return cmp(self.bits, int(other))
+size_operands = integer_types + (Size,)
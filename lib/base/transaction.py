@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+import bisect
+import mmap
+
+from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.fundamentals import align, terminator_index
+
+__all__ = ['TransactionError', 'RunLog', 'Transaction']
+
+class TransactionError(ParanoiaError):
+    pass
+
+class RunLog(ParanoiaAgent):
+    # byte runs keyed by offset. runs never overlap or touch, they get merged
+    # on insertion, so the log always holds the fewest runs covering its data.
+    def __init__(self, **kwargs):
+        # sorted list of run offsets and their data
+        self.offsets = list()
+        self.runs = dict()
+        self.total = 0
+
+    def add(self, offset, data):
+        if not isinstance(data, (bytes, bytearray)):
+            data = data.encode('ascii')
+
+        data = bytearray(data)
+
+        if len(data) == 0:
+            return
+
+        start = offset
+        end = offset+len(data)
+        index = bisect.bisect_left(self.offsets, start)
+
+        if index > 0:
+            prev_offset = self.offsets[index-1]
+
+            if prev_offset+len(self.runs[prev_offset]) >= start:
+                index -= 1
+
+        merged = list()
+
+        while index < len(self.offsets) and self.offsets[index] <= end:
+            run_offset = self.offsets.pop(index)
+            run = self.runs.pop(run_offset)
+            self.total -= len(run)
+            merged.append((run_offset, run))
+
+        if len(merged) == 0:
+            run = data
+        elif len(merged) == 1 and merged[0][0] <= start and start+len(data) <= merged[0][0]+len(merged[0][1]):
+            # fully contained in the existing run, patch it in place
+            run_offset, run = merged[0]
+            run[start-run_offset:end-run_offset] = data
+            start = run_offset
+        else:
+            run_start = min(start, merged[0][0])
+            run_end = max(end, merged[-1][0]+len(merged[-1][1]))
+            run = bytearray(run_end - run_start)
+
+            for run_offset, run_data in merged:
+                run[run_offset-run_start:run_offset-run_start+len(run_data)] = run_data
+
+            run[start-run_start:end-run_start] = data
+            start = run_start
+
+        self.offsets.insert(index, start)
+        self.runs[start] = run
+        self.total += len(run)
+
+    def overlay(self, offset, data):
+        # lay whatever the log holds for the given range over data
+        data = bytearray(data)
+        end = offset+len(data)
+        index = bisect.bisect_right(self.offsets, offset)
+
+        if index > 0:
+            index -= 1
+
+        while index < len(self.offsets) and self.offsets[index] < end:
+            run_offset = self.offsets[index]
+            run = self.runs[run_offset]
+            start = max(offset, run_offset)
+            stop = min(end, run_offset+len(run))
+
+            if start < stop:
+                data[start-offset:stop-offset] = run[start-run_offset:stop-run_offset]
+
+            index += 1
+
+        return data
+
+    def discard(self):
+        self.offsets = list()
+        self.runs = dict()
+        self.total = 0
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield offset, self.runs[offset]
+
+    def __len__(self):
+        return self.total
+
+class Transaction(ParanoiaAgent):
+    # a batch of writes to one allocation that lands all at once or not at all.
+    # while the transaction is open, writes go to a shadow log instead of
+    # memory and reads see them laid over the allocation's data. committing
+    # writes each coalesced run of the log in one go, saving what it
+    # overwrote first, so a failed commit puts back the runs it already wrote
+    # and undo() can take back the whole batch later on.
+    #
+    # opening a transaction on an allocation that already has one nests it,
+    # the inner commit lands in the outer transaction's log.
+    ALLOCATION = None
+    PAGE_SIZE = mmap.PAGESIZE
+
+    OPEN = 0
+    COMMITTED = 1
+    ROLLED_BACK = 2
+
+    def __init__(self, **kwargs):
+        from paranoia.base.allocator import Allocation
+
+        self.allocation = kwargs.setdefault('allocation', self.ALLOCATION)
+
+        if not isinstance(self.allocation, Allocation):
+            raise TransactionError('allocation must be an Allocation object')
+
+        self.allocation.check_id()
+
+        self.page_size = kwargs.setdefault('page_size', self.PAGE_SIZE)
+
+        # anything buffered from before the transaction isn't part of it
+        self.allocation.flush()
+
+        self.parent = self.allocation.open_transaction
+        self.log = RunLog()
+        self.undo_log = RunLog()
+        self.state = self.OPEN
+
+        self.allocation.open_transaction = self
+
+    def check_open(self):
+        if not self.state == self.OPEN:
+            raise TransactionError('transaction is not open')
+
+        if not self.allocation.open_transaction is self:
+            raise TransactionError('a nested transaction is still open')
+
+    def write(self, id_val, data):
+        self.log.add(id_val - self.allocation.id, data)
+
+    def overlay(self, id_val, data):
+        if not self.parent is None:
+            data = self.parent.overlay(id_val, data)
+
+        return self.log.overlay(id_val - self.allocation.id, data)
+
+    def find_terminator(self, id_val, stride=1, maximum=None):
+        # the long way around, reading through the allocation so the scan sees
+        # the log. reads stop at page boundaries like the scans over raw memory.
+        scanned = 0
+
+        while maximum is None or scanned < maximum:
+            address = id_val + scanned * stride
+            count = int(align(align(address+1, self.page_size) - address, stride) / stride)
+
+            if not maximum is None:
+                count = min(count, maximum - scanned)
+
+            data = self.allocation.read_bytestring(address, count * stride, direct=True)
+            index = terminator_index(bytes(data), stride)
+
+            if not index is None:
+                return scanned + index
+
+            scanned += count
+
+        return None
+
+    def forget_blocks(self):
+        # buffered blocks may hold bytes that never landed, make them read again
+        for block in self.allocation.blocks.values():
+            block.value = None
+
+    def commit(self):
+        self.check_open()
+
+        allocation = self.allocation
+
+        # buffered writes made during the transaction are part of it
+        allocation.flush()
+
+        allocation.open_transaction = self.parent
+        self.state = self.COMMITTED
+
+        if not self.parent is None:
+            for offset, run in self.log:
+                self.parent.write(allocation.id+offset, run)
+
+            self.log.discard()
+            return
+
+        try:
+            for offset, run in self.log:
+                if offset >= allocation.size:
+                    continue
+
+                run = run[:allocation.size-offset]
+                self.undo_log.add(offset, allocation.read_bytestring(allocation.id+offset, len(run), direct=True))
+                allocation.flush_run(offset, run)
+        except:
+            # put back what made it in, then let the error through
+            for offset, run in self.undo_log:
+                allocation.flush_run(offset, run)
+
+            self.forget_blocks()
+            self.state = self.ROLLED_BACK
+            raise
+        finally:
+            self.log.discard()
+
+    def rollback(self):
+        self.check_open()
+
+        self.allocation.open_transaction = self.parent
+        self.forget_blocks()
+        self.log.discard()
+        self.state = self.ROLLED_BACK
+
+    def undo(self):
+        # take back a committed transaction's writes
+        if not self.state == self.COMMITTED:
+            raise TransactionError('only a committed transaction can be undone')
+
+        if not self.parent is None:
+            raise TransactionError('a nested transaction is undone with its outer transaction')
+
+        if not self.allocation.open_transaction is None:
+            raise TransactionError('cannot undo while a transaction is open on the allocation')
+
+        for offset, run in self.undo_log:
+            self.allocation.flush_run(offset, run)
+
+        self.forget_blocks()
+        self.undo_log.discard()
+        self.state = self.ROLLED_BACK
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # a transaction committed or rolled back inside the block is left alone
+        if not self.state == self.OPEN:
+            return False
+
+        if exc_type is None:
+            self.commit()
+            return False
+
+        # the error may have skipped past nested transactions, take them down
+        # on the way out so the rollback doesn't trip over them and hide it
+        transaction = self.allocation.open_transaction
+
+        while not transaction is None and not transaction is self:
+            transaction.rollback()
+            transaction = self.allocation.open_transaction
+
+        if transaction is self:
+            self.rollback()
+
+        return False
+
+    def __len__(self):
+        return len(self.log)
@@ -2,12 +2,14 @@
 
 import ctypes
 import math
+import mmap
 import platform
 import sys
 
 __all__ = ['aligned', 'alignment_delta', 'align', 'bitlist_to_bytelist', 'bytelist_to_bitlist'
            ,'bitlist_to_numeric', 'numeric_to_bitlist', 'dict_merge', 'string_address', 'string_offset'
-           ,'malloc', 'realloc', 'free', 'memset', 'memmove', 'hexdump', 'bitdump'
+           ,'malloc', 'realloc', 'free', 'memset', 'memmove', 'memchr', 'strlen'
+           ,'terminator_index', 'find_terminator', 'hexdump', 'bitdump'
            ,'crt_module', 'system', 'arch']
     
 # /!\ WARNING INCOMING HACK /!\
@@ -44,6 +46,63 @@ free.argtypes = (ctypes.c_void_p,)
 memset = ctypes.memset
 memmove = ctypes.memmove
 
+memchr = crt_module.memchr
+memchr.restype = ctypes.c_void_p
+memchr.argtypes = (ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t)
+
+strlen = crt_module.strlen
+strlen.restype = ctypes.c_size_t
+strlen.argtypes = (ctypes.c_void_p,)
+
+def terminator_index(data, stride=1):
+    # character index of the first all-zero character in a string of bytes,
+    # skipping zeros that straddle two characters
+    terminator = b'\x00' * stride
+    index = data.find(terminator)
+
+    while not index == -1:
+        if index % stride == 0:
+            return int(index / stride)
+
+        index = data.find(terminator, align(index, stride))
+
+    return None
+
+def find_terminator(address, stride=1, maximum=None, page_size=mmap.PAGESIZE):
+    # index of the first all-zero character of the given byte width, or None if
+    # there isn't one within maximum characters. an unbounded search runs until
+    # it finds one, same as strlen would.
+    if stride == 1:
+        if maximum is None:
+            return strlen(address)
+
+        found = memchr(address, 0, maximum)
+
+        if found is None:
+            return None
+
+        return found - address
+
+    # scan a page at a time, a string ending just short of an unmapped page
+    # shouldn't fault on the page after it
+    scanned = 0
+
+    while maximum is None or scanned < maximum:
+        current = address + scanned * stride
+        count = int(align(align(current+1, page_size) - current, stride) / stride)
+
+        if not maximum is None:
+            count = min(count, maximum - scanned)
+
+        index = terminator_index(ctypes.string_at(current, count * stride), stride)
+
+        if not index is None:
+            return scanned + index
+
+        scanned += count
+
+    return None
+
 def hexdump(address, size, label=None):
     data = ctypes.string_at(address, size)
     dump_size = align(size, 16)
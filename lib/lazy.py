@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import importlib
+import sys
+
+__all__ = ['LazyModule', 'lazy_module']
+
+# python 2 would resolve "import types" to paranoia.types from in here
+ModuleType = type(sys)
+
+class LazyModule(ModuleType):
+    # stands in for a package in sys.modules and only imports a submodule the
+    # first time it, or a name it exports, is asked for. python 2 has no module
+    # level __getattr__, so the package module gets swapped out for this instead.
+    def __init__(self, module, submodules):
+        super(LazyModule, self).__init__(module.__name__, module.__doc__)
+
+        self.__dict__.update(module.__dict__)
+
+        # python 2 wipes a module's globals once the module object dies
+        self.__dict__['__module_object__'] = module
+        self.__dict__['__submodules__'] = submodules
+
+    def load(self, submodule):
+        module = importlib.import_module('%s.%s' % (self.__name__, submodule))
+        self.__dict__[submodule] = module
+
+        return module
+
+    def export(self, module, name):
+        if isinstance(module, LazyModule):
+            return getattr(module, name)
+
+        if not name in getattr(module, '__all__', list()):
+            raise AttributeError(name)
+
+        return getattr(module, name)
+
+    def __getattr__(self, name):
+        submodules = self.__dict__['__submodules__']
+
+        if name in submodules:
+            return self.load(name)
+
+        if name == '__all__':
+            exported = list(submodules)
+
+            # everything is loaded at this point anyway, so fill in every
+            # name the way the old star imports did
+            for submodule in submodules:
+                module = self.load(submodule)
+
+                for name in module.__all__:
+                    self.__dict__[name] = getattr(module, name)
+
+                exported += module.__all__
+
+            self.__dict__['__all__'] = exported
+
+            return exported
+
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        for submodule in submodules:
+            try:
+                value = self.export(self.load(submodule), name)
+            except AttributeError:
+                continue
+
+            self.__dict__[name] = value
+
+            return value
+
+        raise AttributeError("'%s' has no attribute '%s'" % (self.__name__, name))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys()) | set(self.__all__))
+
+def lazy_module(name, submodules):
+    lazy = LazyModule(sys.modules[name], submodules)
+    sys.modules[name] = lazy
+
+    return lazy
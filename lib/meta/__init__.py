@@ -1,26 +1,6 @@
 #!/usr/bin/env python
 
-from paranoia.meta import array
-from paranoia.meta import declaration
-from paranoia.meta import list
-from paranoia.meta import mapping
-from paranoia.meta import region
-from paranoia.meta import pointer
-from paranoia.meta import size_hint
+from paranoia.lazy import lazy_module
 
-from paranoia.meta.array import *
-from paranoia.meta.declaration import *
-from paranoia.meta.list import *
-from paranoia.meta.mapping import *
-from paranoia.meta.region import *
-from paranoia.meta.pointer import *
-from paranoia.meta.size_hint import *
-
-__all__ = ['array', 'declaration', 'list', 'pointer', 'mapping', 'region', 'size_hint'] + \
-          array.__all__ + \
-          declaration.__all__ + \
-          list.__all__ + \
-          mapping.__all__ + \
-          pointer.__all__ + \
-          region.__all__ + \
-          size_hint.__all__ 
+lazy_module(__name__, ['array', 'bitfield_plan', 'declaration', 'list', 'pointer', 'mapping', 'record_stream'
+                       ,'region', 'size_hint', 'walk'])
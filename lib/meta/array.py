@@ -5,8 +5,8 @@ import inspect
 from paranoia.fundamentals import align, alignment_delta
 from paranoia.base.size import Size
 from paranoia.base.event import *
-from paranoia.meta.declaration import ensure_declaration
-from paranoia.meta.region import Region, RegionError, RegionDeclaration, RegionDeclarationError
+from paranoia.meta.declaration import DeclarationArg, ensure_declaration
+from paranoia.meta.region import Region, RegionError, RegionDeclaration, RegionDeclarationError, layout_declaration
 
 __all__ = ['ArrayDeclarationError', 'ArrayDeclaration', 'ArrayError', 'Array']
 
@@ -14,6 +14,8 @@ class ArrayDeclarationError(RegionDeclarationError):
     pass
 
 class ArrayDeclaration(RegionDeclaration):
+    __slots__ = ('declaration_index',)
+
     def __init__(self, **kwargs):
         args = kwargs.get('args')
 
@@ -83,14 +85,14 @@ class ArrayDeclaration(RegionDeclaration):
             new_size -= alignment_delta(int(base_size), alignment)
         
         if elements < elem_arg and not self.current_offsets.is_empty():
-            filter_key = self.aligned_offset(index)
+            filter_key = self.aligned_offset(elements)
             kill_set = set()
             nodes = [self.current_offsets.root]
 
             while len(nodes) > 0:
                 node = nodes.pop(0)
 
-                if filter_key >= node.label:
+                if node.label >= filter_key:
                     kill_set.add(node.label)
                     
                     if not node.left is None:
@@ -99,11 +101,20 @@ class ArrayDeclaration(RegionDeclaration):
                 if not node.right is None:
                     nodes.append(node.right)
 
+            kill_ids = dict()
+
             for kill in kill_set:
-                decl_id = self.reverse_offsets[kill].keys()[0]
-                kill_decl = self.subregions[decl_id]
-                del self.declaration_index[kill]
-                self.remove_subregion(kill_decl)
+                for decl_id in list(self.reverse_offsets[kill].keys()):
+                    kill_ids[decl_id] = None
+
+            for index in list(self.declaration_index.keys()):
+                decl_id = self.declaration_index[index]
+
+                if not decl_id in kill_ids:
+                    continue
+
+                del self.declaration_index[index]
+                self.remove_subregion(self.subregions[decl_id])
 
         size_obj = Size(bits=new_size)
         self.set_size(size_obj)
@@ -152,6 +163,9 @@ class Array(Region):
     BASE_DECLARATION = None
     ELEMENTS = 0
 
+    base_declaration = DeclarationArg('base_declaration')
+    elements = DeclarationArg('elements')
+
     def __init__(self, **kwargs):
         self.base_declaration = kwargs.setdefault('base_declaration', self.BASE_DECLARATION)
         self.elements = kwargs.setdefault('elements', self.ELEMENTS)
@@ -167,6 +181,9 @@ class Array(Region):
     def get_elements(self):
         return self.declaration.get_elements()
 
+    def get_value(self, force=False):
+        return tuple(map(lambda x: self.instantiate(x).get_value(), range(self.elements)))
+
     def instantiate(self, index, **kwargs):
         decl = self.declaration.declare_index(index)
 
@@ -201,7 +218,7 @@ class Array(Region):
         if base_decl is None:
             raise ArrayError('no base declaration to get base size from')
 
-        base_decl = ensure_declaration(base_decl)
+        base_decl = layout_declaration(base_decl)
         base_size = base_decl.size()
         elements = kwargs.setdefault('elements', cls.ELEMENTS)
         shift = kwargs.setdefault('shift', cls.SHIFT)
@@ -213,6 +230,12 @@ class Array(Region):
 
         return size
         
+    @classmethod
+    def fixed_layout(cls, declaration):
+        base_decl = declaration.get_arg('base_declaration')
+
+        return base_decl.base_class.fixed_layout(base_decl)
+
     @classmethod
     def subclass(cls, **kwargs):
         kwargs.setdefault('declaration_class', cls.DECLARATION_CLASS)
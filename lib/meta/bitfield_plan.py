@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import binascii
+
+from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.fundamentals import align
+
+__all__ = ['BitfieldPlanError', 'BitfieldPlan', 'bytes_to_int', 'int_to_bytes', 'stock_accessors']
+
+class BitfieldPlanError(ParanoiaError):
+    pass
+
+def bytes_to_int(data):
+    if len(data) == 0:
+        return 0
+
+    from_bytes = getattr(int, 'from_bytes', None)
+
+    if not from_bytes is None: # python 3
+        return from_bytes(bytes(data), 'big')
+
+    return int(binascii.hexlify(data), 16)
+
+def int_to_bytes(value, byte_length):
+    if byte_length == 0:
+        return bytearray()
+
+    return bytearray(binascii.unhexlify('%0*x' % (byte_length * 2, value)))
+
+def stock_accessors(cls, base_class):
+    # true when get_value and set_value both come from base_class itself
+    for name in ('get_value', 'set_value'):
+        for klass in cls.__mro__:
+            if name in klass.__dict__:
+                if not klass is base_class:
+                    return False
+
+                break
+
+    return True
+
+class BitfieldPlan(ParanoiaAgent):
+    # a mapping made up of nothing but numeric fields, compiled down to one
+    # integer covering all of their bytes and a (shift, mask) pair per field.
+    # reading every field is then one read and a mask each, writing is a
+    # read-modify-write of that one integer.
+    __slots__ = ('byte_length', 'fields', 'field_index')
+
+    BYTE_LENGTH = 0
+    FIELDS = None
+
+    def __init__(self, **kwargs):
+        self.byte_length = kwargs.setdefault('byte_length', self.BYTE_LENGTH)
+        self.fields = kwargs.setdefault('fields', self.FIELDS)
+
+        if self.fields is None:
+            self.fields = list()
+
+        self.field_index = dict()
+
+        for entry in self.fields:
+            self.field_index[entry[0]] = entry
+
+    @classmethod
+    def compile(cls, declaration):
+        # None when any field can't be pulled out of the integer with a mask
+        from paranoia.meta.region import NumericRegion
+        from paranoia.meta.size_hint import SizeHintDeclaration
+
+        if len(declaration.get_arg('anon_map')) > 0:
+            return None
+
+        shift = declaration.get_arg('shift')
+
+        if shift is None:
+            shift = 0
+
+        byte_length = int(align(int(declaration.size()) + shift, 8) / 8)
+        total_bits = byte_length * 8
+        field_map = declaration.get_arg('field_map')
+        fields = list()
+
+        for name, decl in declaration.get_arg('fields'):
+            # size hints resize their siblings when written, they need the long way around
+            if isinstance(decl, SizeHintDeclaration):
+                return None
+
+            if not issubclass(decl.base_class, NumericRegion):
+                return None
+
+            # a field class with its own accessors gets to decide what it reads
+            # and writes, masking its bits directly would go around it
+            if not stock_accessors(decl.base_class, NumericRegion):
+                return None
+
+            size = int(decl.size())
+
+            if size == 0:
+                return None
+
+            endianness = decl.get_arg('endianness')
+            swap = size > 8 and endianness == NumericRegion.LITTLE_ENDIAN
+
+            # little endian values that end partway through a byte don't come
+            # out of a single contiguous run of bits
+            if swap and not size % 8 == 0:
+                return None
+
+            offset = shift + int(declaration.subregion_offsets[field_map[name]])
+            fields.append((name
+                           ,total_bits - offset - size
+                           ,(1 << size) - 1
+                           ,size
+                           ,decl.get_arg('signage') == NumericRegion.SIGNED
+                           ,swap))
+
+        return cls(byte_length=byte_length, fields=fields)
+
+    def extract(self, value, entry):
+        name, shift, mask, size, signed, swap = entry
+        field = (value >> shift) & mask
+
+        if swap:
+            field = bytes_to_int(int_to_bytes(field, size >> 3)[::-1])
+
+        if signed and field >> (size - 1):
+            field -= 1 << size
+
+        return field
+
+    def insert(self, value, entry, field):
+        name, shift, mask, size, signed, swap = entry
+
+        if field < 0:
+            field += 1 << size
+
+        if not 0 <= field <= mask:
+            raise BitfieldPlanError('value for field %s overflows %d bits' % (name, size))
+
+        if swap:
+            field = bytes_to_int(int_to_bytes(field, size >> 3)[::-1])
+
+        return (value & ~(mask << shift)) | (field << shift)
+
+    def unpack(self, data, fields=None):
+        value = bytes_to_int(data)
+
+        if fields is None:
+            return dict([(entry[0], self.extract(value, entry)) for entry in self.fields])
+
+        return dict([(field, self.extract(value, self.field_index[field])) for field in fields])
+
+    def pack(self, data, values):
+        value = bytes_to_int(data)
+
+        for field in values:
+            if not field in self.field_index:
+                raise BitfieldPlanError('no such field %s in plan' % field)
+
+            value = self.insert(value, self.field_index[field], values[field])
+
+        return int_to_bytes(value, self.byte_length)
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 
-import copy
+import contextlib
 import inspect
 
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
 from paranoia.base.event import *
 from paranoia.fundamentals import dict_merge, align
 
-__all__ = ['DeclarationError', 'Declaration', 'ensure_declaration']
+__all__ = ['DeclarationError', 'DeclarationArg', 'DeclarationArgs', 'EventBatch'
+           ,'Declaration', 'ensure_declaration']
 
 class DeclarationError(ParanoiaError):
     pass
@@ -18,11 +19,236 @@ def ensure_declaration(obj):
     if isinstance(obj, Declaration):
         return obj
     elif is_region(obj):
-        return obj.declare()
+        # copy the class's prototype rather than declaring from scratch
+        return obj.layout().declaration.copy()
     else:
         raise DeclarationError('declaration must be either a Declaration object or a Region class')
 
+class DeclarationArgs(dict):
+    # args layered over a shared, read-only template. writes only ever land in
+    # the local layer, so copies of a declaration share everything they haven't
+    # changed.
+    __slots__ = ('template',)
+
+    def __init__(self, *args, **kwargs):
+        super(DeclarationArgs, self).__init__(*args, **kwargs)
+
+        self.template = None
+
+    def __missing__(self, key):
+        if self.template is None:
+            raise KeyError(key)
+
+        return self.template[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or not self.template is None and key in self.template
+
+    def __delitem__(self, key):
+        if not self.template is None and key in self.template:
+            self.detach()
+
+        dict.__delitem__(self, key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __reduce__(self):
+        return (self.__class__, (self.flatten(),))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            dict.__setitem__(self, key, default)
+            return default
+
+    def keys(self):
+        keys = list(dict.keys(self))
+
+        if not self.template is None:
+            keys += [key for key in self.template if not dict.__contains__(self, key)]
+
+        return keys
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def copy(self):
+        return self.flatten()
+
+    def flatten(self):
+        if self.template is None:
+            return dict(dict.items(self))
+
+        flattened = dict(self.template)
+        flattened.update(dict.items(self))
+
+        return flattened
+
+    def detach(self):
+        template = self.template
+        self.template = None
+
+        for key in template:
+            if not dict.__contains__(self, key):
+                dict.__setitem__(self, key, template[key])
+
+    def derive(self, private):
+        # move everything but the private args into a template shared with the
+        # new layer. a template is reused as long as only private args were
+        # written on top of it.
+        local_keys = list(dict.keys(self))
+
+        if self.template is None or len([key for key in local_keys if not key in private]) > 0:
+            template = self.flatten()
+            local = dict()
+
+            for key in private:
+                if key in template:
+                    local[key] = template.pop(key)
+
+            dict.clear(self)
+            dict.update(self, local)
+            self.template = template
+
+        derived = DeclarationArgs()
+        derived.template = self.template
+
+        return derived
+
+class DeclarationArg(object):
+    # data descriptor backing a region attribute with its declaration's args,
+    # so the instance and the declaration share one copy of the value
+    def __init__(self, name):
+        self.name = name
+
+    def storage(self, instance):
+        declaration = instance.__dict__.get('declaration')
+
+        if declaration is None:
+            return instance.__dict__
+
+        return declaration.args
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        try:
+            return self.storage(instance)[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, instance, value):
+        self.storage(instance)[self.name] = value
+
+    def __delete__(self, instance):
+        storage = self.storage(instance)
+
+        if not self.name in storage:
+            raise AttributeError(self.name)
+
+        del storage[self.name]
+
+class EventBatch(ParanoiaAgent):
+    DROP_PROPERTIES = False
+    # only the last of these per declaration survives a batch
+    COALESCED = (SetPropertyEvent, NewAddressEvent, NewShiftEvent, NewSizeEvent, SetValueEvent)
+
+    def __init__(self, **kwargs):
+        self.drop_properties = kwargs.setdefault('drop_properties', self.DROP_PROPERTIES)
+        self.queue = list()
+        self.members = dict()
+
+    def join(self, decl):
+        if id(decl) in self.members:
+            return
+
+        self.members[id(decl)] = decl
+        decl.event_batch = self
+
+        for subregion in list(getattr(decl, 'subregions', dict()).values()):
+            self.join(subregion)
+
+    def queue_event(self, decl, event_class, args, handlers):
+        if self.drop_properties and event_class == SetPropertyEvent:
+            return
+
+        # handlers are captured now so a handler attached later in the batch
+        # never sees an event that happened before it existed
+        self.queue.append((decl, event_class, args, handlers))
+
+    def coalesce(self):
+        first_sizes = dict()
+
+        for decl, event_class, args, handlers in self.queue:
+            if not event_class == NewSizeEvent:
+                continue
+
+            key = (id(decl), tuple(map(id, handlers)))
+
+            if not key in first_sizes:
+                first_sizes[key] = args[0]
+
+        seen = set()
+        events = list()
+
+        for decl, event_class, args, handlers in reversed(self.queue):
+            if event_class in self.COALESCED:
+                key = (id(decl), event_class, tuple(map(id, handlers)))
+
+                if event_class == SetPropertyEvent:
+                    key += (args[0],)
+
+                if key in seen:
+                    continue
+
+                seen.add(key)
+
+                if event_class == NewSizeEvent:
+                    old_size = first_sizes[(id(decl), tuple(map(id, handlers)))]
+                    args = (old_size, args[1])
+
+                    if int(old_size) == int(args[1]):
+                        continue
+
+            events.append((decl, event_class, args, handlers))
+
+        events.reverse()
+
+        return events
+
+    def dispatch(self):
+        for decl in self.members.values():
+            decl.event_batch = None
+
+        self.members = dict()
+        events = self.coalesce()
+        self.queue = list()
+
+        for decl, event_class, args, handlers in events:
+            for event in handlers:
+                event(decl, *args)
+
 class Declaration(ParanoiaAgent):
+    __slots__ = ('base_class', 'args', 'events', 'instance', 'event_batch')
+
+    # args tied to where a declaration sits, copies start without them
+    PRIVATE_ARGS = ('address', 'shift', 'parent_declaration', 'declaration', 'init_finished')
+
     BASE_CLASS = None
     ARGS = None
     EVENTS = None
@@ -44,6 +270,16 @@ class Declaration(ParanoiaAgent):
         if not isinstance(self.args, dict):
             raise DeclarationError('args must be a dictionary object')
 
+        if not isinstance(self.args, DeclarationArgs):
+            args = DeclarationArgs()
+
+            # filled one key at a time, copying the dict wholesale presizes
+            # the table far past what a declaration ever holds
+            for key in self.args:
+                args[key] = self.args[key]
+
+            self.args = args
+
         self.events = kwargs.setdefault('events', self.EVENTS)
 
         if self.events is None:
@@ -56,6 +292,8 @@ class Declaration(ParanoiaAgent):
             for event in self.events:
                 self.add_event(event)
 
+        self.event_batch = None
+
         instance = kwargs.setdefault('instance', None)
         self.set_instance(instance)
 
@@ -101,9 +339,28 @@ class Declaration(ParanoiaAgent):
 
         if events_available is None:
             return
+
+        if not self.event_batch is None:
+            self.event_batch.queue_event(self, event_class, args, list(events_available))
+            return
         
         for event in events_available:
             event(self, *args)
+
+    @contextlib.contextmanager
+    def batch_events(self, drop_properties=False):
+        if not self.event_batch is None:
+            # already part of an enclosing batch, that one dispatches
+            yield self.event_batch
+            return
+
+        batch = EventBatch(drop_properties=drop_properties)
+        batch.join(self)
+
+        try:
+            yield batch
+        finally:
+            batch.dispatch()
             
     def instantiate(self, **kwargs):
         dict_merge(kwargs, self.args)
@@ -121,29 +378,32 @@ class Declaration(ParanoiaAgent):
             return
 
         self.set_arg('declaration', self)
-        
-        for arg in self.args:
-            setattr(self.instance, arg, self.args[arg])
+
+        # attributes assigned before the instance had its declaration. the
+        # declaration's copy wins, same as when args were mirrored onto the instance
+        for arg in list(instance.__dict__.keys()):
+            if isinstance(getattr(instance.__class__, arg, None), DeclarationArg):
+                self.args.setdefault(arg, instance.__dict__.pop(arg))
 
     def get_arg(self, arg):
-        if not arg in self.args:
+        try:
+            return self.args[arg]
+        except KeyError:
             return getattr(self.base_class, arg.upper(), None)
-        
-        return self.args[arg]
 
-    def set_arg(self, arg, value, from_instance=False):
+    def set_arg(self, arg, value):
+        # declared region attributes read straight from self.args, nothing to
+        # mirror onto the instance
         self.args[arg] = value
 
-        if not self.instance is None and not from_instance:
-            setattr(self.instance, arg, value)
-
         self.trigger_event(SetPropertyEvent, arg, value)
 
     def copy(self):
-        copied = self.__class__(base_class=self.base_class
-                                ,args=copy.deepcopy(self.args))
+        return self.__class__(base_class=self.base_class
+                              ,args=self.copy_args())
 
-        return copied
+    def copy_args(self):
+        return self.args.derive(self.PRIVATE_ARGS)
 
     def __repr__(self):
         return '<Declaration:%s/%X>' % (self.base_class.__name__, id(self))
@@ -1,14 +1,14 @@
 #!/usr/bin/env python
 
-import copy
 import inspect
 
 from paranoia.fundamentals import *
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.base.bit_view import BitView, bit_view
 from paranoia.base.event import *
 from paranoia.base.size import Size
-from paranoia.meta.declaration import Declaration, ensure_declaration
-from paranoia.meta.region import Region, RegionDeclaration, RegionError, RegionDeclarationError
+from paranoia.meta.declaration import Declaration, DeclarationArg, ensure_declaration
+from paranoia.meta.region import Region, RegionDeclaration, RegionError, RegionDeclarationError, layout_declaration
 from paranoia.meta.size_hint import SizeHint, SizeHintDeclaration
 
 try:
@@ -16,13 +16,20 @@ try:
 except ImportError: # python3
     import builtins as __builtin__
 
-__all__ = ['ListDeclarationError', 'ListDeclaration', 'ListError', 'List']
+__all__ = ['ListDeclarationError', 'ListDeclaration', 'ListError', 'ListRecordIterator', 'List']
 
 class ListDeclarationError(RegionDeclarationError):
     pass
 
 class ListDeclaration(RegionDeclaration):
+    __slots__ = ('declaration_index', 'size_cache')
+
+    # args the declarative size is computed from
+    LAYOUT_ARGS = ('declarations', 'shift')
+
     def __init__(self, **kwargs):
+        self.size_cache = None
+
         super(ListDeclaration, self).__init__(**kwargs)
 
         if self.get_arg('declarations') is None:
@@ -31,9 +38,25 @@ class ListDeclaration(RegionDeclaration):
         self.declaration_index = dict()
         self.map_declarations()
 
+    def set_arg(self, arg, value):
+        if arg in self.LAYOUT_ARGS:
+            self.invalidate_layout()
+
+        super(ListDeclaration, self).set_arg(arg, value)
+
+    def invalidate_layout(self):
+        self.size_cache = None
+
+    def copy_args(self):
+        args = super(ListDeclaration, self).copy_args()
+        args['declarations'] = map(Declaration.copy, self.get_arg('declarations'))
+
+        return args
+
     def map_declarations(self):
         declarations = self.get_arg('declarations')
 
+        self.invalidate_layout()
         self.set_size(self.declarative_size())
         
         for i in xrange(len(declarations)):
@@ -42,6 +65,27 @@ class ListDeclaration(RegionDeclaration):
             self.declaration_index[id(decl)] = i
 
     def declarative_size(self, **kwargs):
+        # only the size of the declaration as it stands is memoized, kwargs
+        # can describe any other layout
+        if len(kwargs) > 0:
+            return self.layout_size(**kwargs)
+
+        if self.size_cache is None:
+            self.size_cache = self.layout_size()
+
+        return self.size_cache
+
+    def resize_declaration(self, decl, delta):
+        # a child changed size. growing or shrinking the last child can't move
+        # any alignment padding, so the memoized size just follows it
+        declarations = self.get_arg('declarations')
+
+        if self.size_cache is None or len(declarations) == 0 or not declarations[-1] is decl:
+            self.invalidate_layout()
+        else:
+            self.size_cache = self.size_cache + delta
+
+    def layout_size(self, **kwargs):
         dict_merge(kwargs, self.args)
 
         declarations = kwargs.get('declarations')
@@ -73,6 +117,7 @@ class ListDeclaration(RegionDeclaration):
         declarations = self.get_arg('declarations')
         decl = ensure_declaration(decl)
         declarations.insert(index, decl)
+        self.invalidate_layout()
 
         for decl_index in range(index, len(declarations)):
             target_decl = declarations[decl_index]
@@ -101,6 +146,7 @@ class ListDeclaration(RegionDeclaration):
 
         declarations = self.get_arg('declarations')
         removed_decl = declarations.pop(index)
+        self.invalidate_layout()
 
         try:
             self.remove_subregion(removed_decl)
@@ -119,6 +165,19 @@ class ListDeclaration(RegionDeclaration):
 
         self.set_size(self.declarative_size())
 
+    def resolve_hints(self):
+        # hints read their value straight from memory, so nothing needs an
+        # instance to get resolved
+        declarations = self.get_arg('declarations')
+
+        for i in xrange(len(declarations)):
+            decl = declarations[i]
+
+            if isinstance(decl, SizeHintDeclaration):
+                decl.resolve()
+            elif isinstance(decl, ListDeclaration):
+                decl.resolve_hints()
+
     def append_declaration(self, decl):
         declarations = self.get_arg('declarations')
 
@@ -138,6 +197,7 @@ class ListResizeEvent(NewSizeEvent):
             return
 
         parent_decl = decl.get_arg('parent_declaration')
+        parent_decl.resize_declaration(decl, delta)
 
         if delta > 0:
             parent_decl.set_size(parent_decl.declarative_size())
@@ -146,12 +206,102 @@ class ListResizeEvent(NewSizeEvent):
             parent_decl.push_subregions(decl, delta)
             parent_decl.set_size(parent_decl.declarative_size())
             
+class ListRecordIterator(ParanoiaAgent):
+    # appends and instantiates one record at a time on an executor, reading
+    # each record's bytes there before handing it over. this is a plain
+    # iterator, iterating blocks on each record in turn. callers that don't
+    # want to block use fetch(), which hands back a concurrent.futures Future
+    # for the next record that comes out as None once the data runs out.
+    LIST = None
+    DECLARATION = None
+    UNTIL = None
+    EXECUTOR = None
+
+    def __init__(self, **kwargs):
+        from paranoia.base.disk import disk_executor
+
+        self.list = kwargs.setdefault('list', self.LIST)
+
+        if self.list is None:
+            raise ListError('list cannot be None')
+
+        self.declaration = kwargs.setdefault('declaration', self.DECLARATION)
+
+        if self.declaration is None:
+            raise ListError('declaration cannot be None')
+
+        # until is called with each new record, iteration stops after the first
+        # record it returns True for. without it, iteration runs to the end of the data.
+        self.until = kwargs.setdefault('until', self.UNTIL)
+        self.executor = kwargs.setdefault('executor', self.EXECUTOR)
+
+        if self.executor is None:
+            self.executor = disk_executor()
+
+        self.finished = False
+
+    def next_record(self):
+        from paranoia.base.disk import DiskError
+
+        if self.finished:
+            return None
+
+        decl = self.declaration
+
+        if isinstance(decl, Declaration):
+            decl = decl.copy()
+
+        list_decl = self.list.declaration
+        count = len(list_decl.get_arg('declarations'))
+
+        try:
+            list_decl.append_declaration(decl)
+            record = self.list.instantiate(count)
+
+            # pull the record in here, off the caller's thread. this is also
+            # where running off the end of the data shows up.
+            record.address.read_bytestring(size=record.blockspan())
+        except (EOFError, DiskError):
+            # there was no record there, don't leave its declaration behind
+            declarations = list_decl.get_arg('declarations')
+
+            if len(declarations) > count:
+                # nothing was read, so there's nothing for removal to zero out
+                declarations[count].instance = None
+                list_decl.remove_declaration(count)
+
+            self.finished = True
+            return None
+
+        if not self.until is None and self.until(record):
+            self.finished = True
+
+        return record
+
+    def fetch(self):
+        return self.executor.submit(self.next_record)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        record = self.fetch().result()
+
+        if record is None:
+            raise StopIteration
+
+        return record
+
+    __next__ = next
+
 class List(Region):
     SHRINK = True
     RESIZE_EVENT = ListResizeEvent
     DECLARATIONS = None
     DECLARATION_CLASS = ListDeclaration
 
+    declarations = DeclarationArg('declarations')
+
     def __init__(self, **kwargs):
         self.declarations = kwargs.setdefault('declarations', self.DECLARATIONS)
 
@@ -164,16 +314,11 @@ class List(Region):
         self.resolve_hints()
 
     def resolve_hints(self):
-        for i in xrange(len(self.declarations)):
-            decl = self.declarations[i]
-
-            if isinstance(decl, SizeHintDeclaration):
-                hint_instance = self.instantiate(i)
-                hint_instance.resolve()
-            elif isinstance(decl, ListDeclaration):
-                list_instance = self.instantiate(i)
+        self.declaration.resolve_hints()
 
     def parse_bit_data(self, bit_data):
+        # children get views into the same data rather than copies of the rest of it
+        bit_data = bit_view(bit_data)
         total_parsed = 0
 
         for decl in self.declarations:
@@ -210,10 +355,11 @@ class List(Region):
         return total_parsed
 
     def read_memory(self):
-        # initialize all the arguments to get the most accurate read-out of
-        # what should be in the object
-        for i in range(len(self.declarations)):
-            self.instantiate(i)
+        # only children with a declared value have anything to write into
+        # memory before it gets read, the rest stay uninstantiated
+        for i in xrange(len(self.declarations)):
+            if not self.declarations[i].get_arg('value') is None:
+                self.instantiate(i)
 
         return super(List, self).read_memory()
 
@@ -225,6 +371,15 @@ class List(Region):
 
         return decl.instance
 
+    def get_value(self, force=False):
+        return tuple(map(lambda x: self.instantiate(x).get_value(), range(len(self.declarations))))
+
+    def prefetch_records(self, declaration, until=None, executor=None):
+        return ListRecordIterator(list=self
+                                  ,declaration=declaration
+                                  ,until=until
+                                  ,executor=executor)
+
     def __getitem__(self, index):
         return self.instantiate(index)
 
@@ -247,7 +402,7 @@ class List(Region):
         declarations = kwargs.setdefault('declarations', cls.DECLARATIONS)
 
         for decl in declarations:
-            decl = ensure_declaration(decl)
+            decl = layout_declaration(decl)
             
             if overlap:
                 if decl.size() > size:
@@ -260,6 +415,28 @@ class List(Region):
 
         return size
 
+    @classmethod
+    def build_layout(cls, declaration):
+        layout = super(List, cls).build_layout(declaration)
+        declarations = declaration.get_arg('declarations')
+
+        for index in xrange(len(declarations)):
+            layout.offsets[index] = declaration.subregion_offsets[id(declarations[index])]
+
+        return layout
+
+    @classmethod
+    def fixed_layout(cls, declaration):
+        for decl in declaration.get_arg('declarations'):
+            # a size hint resizes its siblings from whatever it parses
+            if isinstance(decl, SizeHintDeclaration):
+                return False
+
+            if not decl.base_class.fixed_layout(decl):
+                return False
+
+        return True
+
     @classmethod
     def bit_parser(cls, **kwargs):
         size = 0
@@ -275,13 +452,13 @@ class List(Region):
             raise ListError('declarations cannot be None')
 
         if 'block_data' in kwargs:
-            bit_data = bytelist_to_bitlist(kwargs['block_data'])[shift:]
+            bit_data = BitView(buffer=kwargs['block_data'], offset=shift)
         elif 'byte_data' in kwargs:
-            bit_data = bytelist_to_bitlist(kwargs['byte_data'])
+            bit_data = BitView(buffer=kwargs['byte_data'])
         elif 'bit_data' in kwargs:
-            bit_data = kwargs['bit_data']
+            bit_data = bit_view(kwargs['bit_data'])
         else:
-            bit_data = list()
+            bit_data = BitView(buffer=list())
 
         offset = 0
 
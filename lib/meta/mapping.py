@@ -1,11 +1,11 @@
 #!/usr/bin/env python
 
-import copy
 import inspect
 
-from paranoia.meta.declaration import Declaration, ensure_declaration
+from paranoia.meta.bitfield_plan import BitfieldPlan
+from paranoia.meta.declaration import Declaration, DeclarationArg, ensure_declaration
 from paranoia.meta.list import ListDeclaration, ListDeclarationError, List, ListError
-from paranoia.meta.region import Region
+from paranoia.meta.region import Region, layout_declaration
 
 __all__ = ['MappingDeclarationError', 'MappingDeclaration', 'MappingError', 'Mapping']
 
@@ -13,7 +13,11 @@ class MappingDeclarationError(ListError):
     pass
 
 class MappingDeclaration(ListDeclaration):
+    __slots__ = ('plan_cache',)
+
     def __init__(self, **kwargs):
+        self.plan_cache = None
+
         super(MappingDeclaration, self).__init__(**kwargs)
 
         fields = self.get_arg('fields')
@@ -26,6 +30,41 @@ class MappingDeclaration(ListDeclaration):
 
         self.parse_fields(fields)
 
+    def copy_args(self):
+        args = super(MappingDeclaration, self).copy_args()
+
+        # the copied declarations are remapped by parse_fields, so they
+        # must not be mapped once already by the list
+        declarations = args['declarations']
+        args['fields'] = [[field[0], declarations[i]] for i, field in enumerate(self.get_arg('fields'))]
+        args['declarations'] = list()
+
+        return args
+
+    def invalidate_layout(self):
+        super(MappingDeclaration, self).invalidate_layout()
+
+        self.plan_cache = None
+
+    def resize_declaration(self, decl, delta):
+        # even when the size can follow along, every field after decl moved
+        self.plan_cache = None
+
+        super(MappingDeclaration, self).resize_declaration(decl, delta)
+
+    def bitfield_plan(self):
+        # False marks a mapping that was tried and can't be compiled
+        if self.plan_cache is None:
+            self.plan_cache = BitfieldPlan.compile(self)
+
+            if self.plan_cache is None:
+                self.plan_cache = False
+
+        if self.plan_cache is False:
+            return None
+
+        return self.plan_cache
+
     def get_field_offset(self, field):
         field_map = self.get_arg('field_map')
 
@@ -81,7 +120,7 @@ class MappingDeclaration(ListDeclaration):
             raise MappingDeclarationError('fields must be a list/tuple containing field names and declarations')
 
         if fields == self.base_class.FIELDS:
-            fields = map(lambda x: [x[0], copy.deepcopy(x[1])], fields)
+            fields = map(lambda x: [x[0], x[1].copy() if isinstance(x[1], Declaration) else x[1]], fields)
 
         # we need to modify the fields, change this
         if isinstance(fields, tuple):
@@ -170,6 +209,10 @@ class Mapping(List):
     DECLARATION_CLASS = MappingDeclaration
     FIELDS = None
 
+    fields = DeclarationArg('fields')
+    field_map = DeclarationArg('field_map')
+    anon_map = DeclarationArg('anon_map')
+
     def __init__(self, **kwargs):
         self.fields = kwargs.setdefault('fields', self.FIELDS)
         
@@ -202,6 +245,69 @@ class Mapping(List):
         offset = mapping.declaration.get_field_offset(key)
         return mapping.instantiate(offset)
 
+    def bitfield_plan(self):
+        return self.declaration.bitfield_plan()
+
+    def read_fields(self, fields=None, force=False):
+        plan = self.bitfield_plan()
+
+        if plan is None:
+            raise MappingError('mapping has fields that cannot be compiled into a bitfield plan')
+
+        if force:
+            data = self.address.read_bytestring(size=plan.byte_length, force=True)
+        else:
+            data = self.address.read_buffered(size=plan.byte_length)
+
+        return plan.unpack(bytearray(data), fields)
+
+    def write_fields(self, values, force=False):
+        plan = self.bitfield_plan()
+
+        if plan is None:
+            raise MappingError('mapping has fields that cannot be compiled into a bitfield plan')
+
+        if self.is_static():
+            raise MappingError('cannot write to static mapping')
+
+        old_data = self.address.read_buffered(size=plan.byte_length)
+        new_data = plan.pack(old_data, values)
+
+        # only the bytes that actually changed get written back
+        for i in xrange(plan.byte_length):
+            if not old_data[i] == new_data[i]:
+                self.address.get_block(i).set_value(new_data[i], force)
+
+        if not force and not self.buffer:
+            self.flush()
+
+    def get_value(self, force=False):
+        if not self.bitfield_plan() is None:
+            return self.read_fields(force=force)
+
+        result = dict()
+
+        for field in self.field_map:
+            if field.startswith('__anon_field_'):
+                continue
+
+            result[field] = self.get_field(field).get_value()
+
+        for field in self.anon_map:
+            result[field] = self.get_field(field).get_value()
+
+        return result
+
+    def set_value(self, value, force=False):
+        if not isinstance(value, dict):
+            raise MappingError('value must be a dictionary of field values')
+
+        if not self.bitfield_plan() is None:
+            return self.write_fields(value, force)
+
+        for field in value:
+            self.get_field(field).set_value(value[field], force)
+
     def __getitem__(self, key):
         return self.get_field(key)
 
@@ -221,9 +327,20 @@ class Mapping(List):
     @classmethod
     def static_size(cls, **kwargs):
         fields = kwargs.setdefault('fields', cls.FIELDS)
-        kwargs['declarations'] = map(lambda x: ensure_declaration(x[1]), fields)
+        kwargs['declarations'] = map(lambda x: layout_declaration(x[1]), fields)
         return super(Mapping, cls).static_size(**kwargs)
 
+    @classmethod
+    def build_layout(cls, declaration):
+        layout = super(Mapping, cls).build_layout(declaration)
+        field_map = declaration.get_arg('field_map')
+        layout.offsets = dict()
+
+        for field in field_map:
+            layout.offsets[field] = declaration.subregion_offsets[field_map[field]]
+
+        return layout
+
     @classmethod
     def bit_parser(cls, **kwargs):
         fields = kwargs.setdefault('fields', cls.FIELDS)
@@ -1,33 +1,178 @@
 #!/usr/bin/env python
 
+import collections
+
 from paranoia.base import Address, Size
+from paranoia.base.paranoia_agent import ParanoiaAgent
 from paranoia.base.event import *
 from paranoia.fundamentals import arch
-from paranoia.meta.declaration import ensure_declaration
+from paranoia.meta.declaration import DeclarationArg, ensure_declaration
 from paranoia.meta.region import RegionDeclarationError, RegionDeclaration, RegionError, NumericRegion
+from paranoia.meta.region import layout_declaration
 
-__all__ = ['PointerError', 'Pointer', 'LivePointerDeclarationError'
-           ,'LivePointerDeclaration', 'LivePointer', 'OffsetError', 'Offset'
-           ,'LiveOffset']
+__all__ = ['PointerError', 'DerefCache', 'PointerCursor', 'Pointer'
+           ,'LivePointerDeclarationError', 'LivePointerDeclaration', 'LivePointer'
+           ,'OffsetError', 'Offset', 'LiveOffset']
 
 class PointerError(RegionError):
     pass
 
+class DerefCache(ParanoiaAgent):
+    # targets that have already been dereferenced, keyed by the address pointed
+    # at and the declaration cast to. regions read their memory live, so a
+    # cached target only goes stale when its declaration changes size.
+    #
+    # every pointer has a cache of its own, shared only with the cursors made
+    # from it. a target handed out is a mutable region, so two unrelated
+    # pointers never get the same one.
+    MAXIMUM = 256
+
+    def __init__(self, **kwargs):
+        self.maximum = kwargs.setdefault('maximum', self.MAXIMUM)
+        self.entries = collections.OrderedDict()
+
+    def deref(self, address_value, casting_decl):
+        # classes, and declarations that are unchanged copies of a class's
+        # prototype, are keyed by that prototype. the entry holds onto the
+        # declaration, so its id can't be reused while cached
+        casting_decl = layout_declaration(casting_decl)
+        layout = casting_decl.base_class.layout()
+
+        if layout.describes(casting_decl):
+            casting_decl = layout.declaration
+
+        key = (address_value, id(casting_decl))
+        entry = self.entries.pop(key, None)
+
+        if entry is None or not entry[1] == casting_decl.size():
+            target_decl = casting_decl.copy()
+            target_decl.set_arg('address', Address(offset=address_value))
+            entry = (casting_decl, casting_decl.size(), target_decl.instantiate())
+
+        self.entries[key] = entry
+
+        while len(self.entries) > self.maximum:
+            self.entries.popitem(False)
+
+        return entry[2]
+
+    def invalidate(self, address_value):
+        for key in list(self.entries.keys()):
+            if key[0] == address_value:
+                del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+class PointerCursor(ParanoiaAgent):
+    # pointer arithmetic on a plain int. stepping a cursor allocates nothing,
+    # the target region only gets instantiated when it's dereferenced.
+    __slots__ = ('value', 'casting_declaration', 'stride', 'targets')
+
+    VALUE = 0
+    CASTING_DECLARATION = None
+    TARGETS = None
+
+    def __init__(self, **kwargs):
+        self.value = kwargs.setdefault('value', self.VALUE)
+        self.casting_declaration = kwargs.setdefault('casting_declaration', self.CASTING_DECLARATION)
+
+        if self.casting_declaration is None:
+            raise PointerError('pointer arithmetic not possible without cast')
+
+        self.casting_declaration = layout_declaration(self.casting_declaration)
+        self.stride = self.casting_declaration.size().byte_length()
+        self.targets = kwargs.setdefault('targets', self.TARGETS)
+
+        if self.targets is None:
+            self.targets = DerefCache()
+
+    def index_value(self, index):
+        return self.value + self.stride * int(index)
+
+    def deref(self, casting_decl=None):
+        if casting_decl is None:
+            casting_decl = self.casting_declaration
+
+        return self.targets.deref(self.value, casting_decl)
+
+    def read_pointed_bytes(self, byte_length, byte_offset=0):
+        memory_base = Address(offset=self.value + byte_offset)
+        return memory_base.read_bytes(size=byte_length)
+
+    def __add__(self, addend):
+        return self.__class__(value=self.index_value(addend)
+                              ,casting_declaration=self.casting_declaration
+                              ,targets=self.targets)
+
+    def __radd__(self, addend):
+        return self + addend
+
+    def __iadd__(self, addend):
+        self.value = self.index_value(addend)
+        return self
+
+    def __sub__(self, other):
+        if isinstance(other, PointerCursor):
+            return int((self.value - other.value) / self.stride)
+
+        return self + -int(other)
+
+    def __isub__(self, addend):
+        self.value = self.index_value(-int(addend))
+        return self
+
+    def __getitem__(self, index):
+        return self.targets.deref(self.index_value(index), self.casting_declaration)
+
+    def __int__(self):
+        return self.value
+
+    def __eq__(self, other):
+        if isinstance(other, PointerCursor):
+            return self.value == other.value and self.stride == other.stride
+
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<PointerCursor:0x%X>' % self.value
+
 class Pointer(NumericRegion):
     CASTING_DECLARATION = None
     SIZE = Size(bits=arch)
 
+    casting_declaration = DeclarationArg('casting_declaration')
+
     def __init__(self, **kwargs):
-        self.casting_declaration = kwargs.setdefault('casting_declaration', self.CASTING_DECLARATION)
+        casting_decl = kwargs.setdefault('casting_declaration', self.CASTING_DECLARATION)
 
-        if not self.casting_declaration is None:
-            self.casting_declaration = ensure_declaration(self.casting_declaration)
+        if not casting_decl is None:
+            # the declaration's args win over the instance once it exists, so
+            # the class has to be turned into a declaration in there too
+            kwargs['casting_declaration'] = ensure_declaration(casting_decl)
+
+        self.casting_declaration = kwargs['casting_declaration']
+        self.targets = None
         
         super(Pointer, self).__init__(**kwargs)
 
     def memory_value(self):
         return self.get_value()
 
+    def target_cache(self):
+        if self.targets is None:
+            self.targets = DerefCache()
+
+        return self.targets
+
+    def cursor(self):
+        return PointerCursor(value=self.memory_value()
+                             ,casting_declaration=self.casting_declaration
+                             ,targets=self.target_cache())
+
     def deref(self, casting_decl=None):
         address_value = self.memory_value()
         
@@ -37,8 +182,7 @@ class Pointer(NumericRegion):
         if casting_decl is None:
             raise PointerError('no casting declaration given for dereference')
 
-        casting_decl.set_arg('address', Address(offset=address_value))
-        return casting_decl.instantiate()
+        return self.target_cache().deref(address_value, casting_decl)
 
     def read_pointed_bytes(self, byte_length, byte_offset=0):
         memory_base = Address(offset=self.memory_value() + byte_offset)
@@ -97,7 +241,10 @@ class Pointer(NumericRegion):
         return self.__class__(value=value, casting_declaration=self.casting_declaration)
 
     def __getitem__(self, index):
-        return (self + index).deref()
+        if self.casting_declaration is None:
+            raise PointerError('pointer arithmetic not possible without cast')
+
+        return self.cursor()[index]
     
     @classmethod
     def cast(cls, casting_decl):
@@ -110,6 +257,8 @@ class LivePointerDeclarationError(RegionDeclarationError):
     pass
 
 class LivePointerDeclaration(RegionDeclaration):
+    __slots__ = ('event_object',)
+
     def __init__(self, **kwargs):
         super(LivePointerDeclaration, self).__init__(**kwargs)
 
@@ -153,6 +302,8 @@ class LivePointer(Pointer):
     DECLARATION_CLASS = LivePointerDeclaration
     TARGET_DECLARATION = None
 
+    target_declaration = DeclarationArg('target_declaration')
+
     def __init__(self, **kwargs):
         self.target_declaration = kwargs.setdefault('target_declaration', self.TARGET_DECLARATION)
 
@@ -170,10 +321,13 @@ class Offset(NumericRegion):
     CASTING_DECLARATION = None
 
     def __init__(self, **kwargs):
-        self.casting_declaration = kwargs.setdefault('casting_declaration', self.CASTING_DECLARATION)
+        casting_decl = kwargs.setdefault('casting_declaration', self.CASTING_DECLARATION)
 
-        if not self.casting_declaration is None:
-            self.casting_declaration = ensure_declaration(self.casting_declaration)
+        if not casting_decl is None:
+            kwargs['casting_declaration'] = ensure_declaration(casting_decl)
+
+        self.casting_declaration = kwargs['casting_declaration']
+        self.targets = None
         
         super(Offset, self).__init__(**kwargs)
 
@@ -189,8 +343,10 @@ class Offset(NumericRegion):
         if casting_decl is None:
             raise OffsetError('no casting declaration given for dereference')
 
-        casting_decl.set_arg('address', Address(offset=address_value))
-        return casting_decl.instantiate()
+        if self.targets is None:
+            self.targets = DerefCache()
+
+        return self.targets.deref(address_value, casting_decl)
 
     def read_pointed_bytes(self, byte_length, byte_offset=0):
         memory_base = Address(offset=self.memory_value() + byte_offset)
@@ -201,6 +357,8 @@ class Offset(NumericRegion):
         memory_base.write_bytes(byte_list)
 
 class LiveOffsetDeclaration(LivePointerDeclaration):
+    __slots__ = tuple()
+
     def write_target_address(self, address):
         self.set_value(int(address) - address.allocation.id, True)
 
@@ -208,6 +366,8 @@ class LiveOffset(Offset):
     DECLARATION_CLASS = LiveOffsetDeclaration
     TARGET_DECLARATION = None
 
+    target_declaration = DeclarationArg('target_declaration')
+
     def __init__(self, **kwargs):
         self.target_declaration = kwargs.setdefault('target_declaration', self.TARGET_DECLARATION)
 
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.meta.declaration import ensure_declaration
+
+__all__ = ['RecordStreamError', 'ByteSource', 'RecordStream', 'stream_reader']
+
+class RecordStreamError(ParanoiaError):
+    pass
+
+class ByteSource(ParanoiaAgent):
+    DATA = None
+
+    def __init__(self, **kwargs):
+        data = kwargs.setdefault('data', self.DATA)
+
+        if data is None:
+            raise RecordStreamError('data cannot be None')
+
+        self.data = memoryview(data)
+        self.position = 0
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position+size]
+        self.position += len(chunk)
+
+        return chunk.tobytes()
+
+def stream_reader(source):
+    from paranoia.base.disk import DiskHandle
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return ByteSource(data=source).read
+    elif isinstance(source, DiskHandle):
+        # read the file object directly, going through the disk allocator would
+        # keep every record resident
+        source.manager.sync(source.fileno)
+        return source.manager.files[source.fileno].read
+    elif hasattr(source, 'recv'):
+        return source.recv
+    elif hasattr(source, 'read'):
+        return source.read
+    elif callable(source):
+        return source
+    else:
+        raise RecordStreamError('source must be bytes, a DiskHandle, a file object, a socket or a callable')
+
+class RecordStream(ParanoiaAgent):
+    DECLARATION = None
+    SOURCE = None
+    CHUNK_SIZE = 4096
+    ALLOCATOR = None
+    UNTIL = None
+
+    def __init__(self, **kwargs):
+        from paranoia.base.allocator import heap
+
+        declaration = kwargs.setdefault('declaration', self.DECLARATION)
+
+        if declaration is None:
+            raise RecordStreamError('declaration cannot be None')
+
+        self.declaration = ensure_declaration(declaration)
+
+        source = kwargs.setdefault('source', self.SOURCE)
+
+        if source is None:
+            raise RecordStreamError('source cannot be None')
+
+        self.reader = stream_reader(source)
+        self.chunk_size = kwargs.setdefault('chunk_size', self.CHUNK_SIZE)
+        self.until = kwargs.setdefault('until', self.UNTIL)
+        self.allocator = kwargs.setdefault('allocator', self.ALLOCATOR)
+
+        if self.allocator is None:
+            self.allocator = heap
+
+        # one buffer for the whole stream. it only grows to fit the largest
+        # record seen, never with the number of records.
+        self.allocation = self.allocator.allocate(self.chunk_size)
+        self.minimum = max(1, self.declaration.size().byte_length())
+
+        # the unconsumed bytes sit at start in the buffer. consuming a record
+        # just moves start along, the bytes only get moved back to the front
+        # when a refill needs the room.
+        self.start = 0
+        self.buffered = 0
+        self.exhausted = False
+        self.finished = False
+        self.position = 0
+        self.instance = None
+
+    def fill(self, size):
+        while self.buffered < size and not self.exhausted:
+            wanted = max(size - self.buffered, self.chunk_size)
+
+            if self.start + self.buffered + wanted > self.allocation.size:
+                self.compact()
+
+            if self.buffered + wanted > self.allocation.size:
+                self.allocation.reallocate(self.buffered + wanted)
+
+            data = self.reader(wanted)
+
+            if data is None or len(data) == 0:
+                self.exhausted = True
+                break
+
+            self.allocation.write_bytestring(self.allocation.id+self.start+self.buffered, bytearray(data))
+            self.buffered += len(data)
+
+        return self.buffered >= size
+
+    def compact(self):
+        if self.start == 0:
+            return
+
+        if self.buffered > 0:
+            tail = self.allocation.read_bytestring(self.allocation.id+self.start, self.buffered)
+            self.allocation.write_bytestring(self.allocation.id, bytearray(tail))
+
+        self.start = 0
+
+    def consume(self, size):
+        self.start += size
+        self.buffered -= size
+        self.position += size
+
+        if self.buffered == 0:
+            self.start = 0
+
+    def release(self, decl):
+        # child regions get rebuilt on access. dropping them keeps a shrinking
+        # record from zeroing bytes that now belong to the next one.
+        for sub_decl in list(decl.subregions.values()):
+            self.release(sub_decl)
+            sub_decl.instance = None
+
+    def parse(self):
+        if self.instance is None:
+            self.instance = self.declaration.instantiate(address=self.allocation.address(self.start))
+            return self.instance
+
+        if not self.instance.address.offset == self.start:
+            # the record still has the last one's size until its hints are
+            # re-read, so make sure moving it can't run off the end of the buffer
+            if self.start + self.instance.blockspan() > self.allocation.size:
+                self.compact()
+
+            if not self.instance.address.offset == self.start:
+                self.instance.set_address(self.allocation.address(self.start))
+
+        if not getattr(self.instance, 'resolve_hints', None) is None:
+            # same declaration tree, new bytes underneath it: re-read the hints
+            self.release(self.declaration)
+            self.instance.resolve_hints()
+
+        return self.instance
+
+    def next_record(self):
+        if self.finished:
+            return
+
+        self.fill(self.minimum)
+
+        if self.buffered == 0:
+            self.finished = True
+            return
+
+        record = self.parse()
+        size = record.blockspan()
+
+        if self.buffered < size:
+            # make room up front, a refill that compacts the buffer would pull
+            # the bytes out from under the record just parsed
+            self.compact()
+
+            if not self.fill(size):
+                raise RecordStreamError('truncated record at offset %d' % self.position)
+
+            record = self.parse()
+
+        return record
+
+    def records(self):
+        # the yielded record is reused, it is only valid until the next one is requested
+        while not self.finished:
+            record = self.next_record()
+
+            if record is None:
+                break
+
+            yield record
+
+            if not self.until is None and self.until(record):
+                self.finished = True
+
+            self.consume(record.blockspan())
+
+    def close(self):
+        self.finished = True
+
+        if not self.allocation is None:
+            self.allocation.free()
+            self.allocation = None
+
+    def __iter__(self):
+        return self.records()
@@ -7,10 +7,11 @@ import sys
 from yggdrasil import AVLNode, AVLTree
 
 from paranoia.base.address import Address
+from paranoia.base.bit_view import BitView, bit_view
 from paranoia.base.block import Block, BlockChain
 from paranoia.base.event import *
 from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
-from paranoia.meta.declaration import Declaration, DeclarationError
+from paranoia.meta.declaration import Declaration, DeclarationArg, DeclarationError, ensure_declaration
 from paranoia.fundamentals import *
 
 try:
@@ -18,15 +19,15 @@ try:
 except ImportError: #python3
     import builtins as __builtin__
 
-__all__ = ['RegionError', 'is_region', 'sizeof', 'RegionDeclarationError'
-           ,'RegionDeclaration', 'Region', 'NumericRegion']
+__all__ = ['RegionError', 'is_region', 'sizeof', 'layout_declaration', 'RegionDeclarationError'
+           ,'RegionDeclaration', 'Layout', 'Region', 'NumericRegion']
 
 def is_region(obj):
     return inspect.isclass(obj) and issubclass(obj, Region)
 
 def sizeof(memory_region):
     if is_region(memory_region):
-        return memory_region.static_size().byte_length()
+        return memory_region.layout().size.byte_length()
     elif isinstance(memory_region, Region):
         return memory_region.size.byte_length()
     elif isinstance(memory_region, RegionDeclaration):
@@ -34,6 +35,14 @@ def sizeof(memory_region):
     else:
         raise RegionError('given argument must be a RegionDeclaration object or an instance or class deriving Region')
 
+def layout_declaration(obj):
+    # a declaration to read sizes and alignment from. classes hand out their
+    # shared prototype, so it must never be placed or modified
+    if is_region(obj):
+        return obj.layout().declaration
+
+    return ensure_declaration(obj)
+
 class OffsetNode(AVLNode):
     VALUE_CLASS = dict
 
@@ -134,6 +143,8 @@ class RegionDeclarationError(DeclarationError):
     pass
  
 class RegionDeclaration(Declaration): # BASE_CLASS set to Region after Region definition
+    __slots__ = ('subregions', 'subregion_offsets', 'current_offsets', 'reverse_offsets')
+
     def __init__(self, **kwargs):
         super(RegionDeclaration, self).__init__(**kwargs)
 
@@ -238,11 +249,28 @@ class RegionDeclaration(Declaration): # BASE_CLASS set to Region after Region de
         value = self.get_arg('value')
 
         if value is None:
+            if not 'bit_data' in kwargs and not 'link_data' in kwargs and not 'block_data' in kwargs:
+                # no instance and no data, read it from where we're declared
+                kwargs['block_data'] = self.read_block_data(kwargs.get('force', False))
+
             dict_merge(kwargs, self.args)
             value = self.base_class.static_value(**kwargs)
 
         return value
 
+    def read_block_data(self, force=False):
+        address = self.get_arg('address')
+
+        if address is None:
+            raise RegionDeclarationError('declaration has no address to read from')
+
+        shift = self.get_arg('shift')
+
+        if shift is None:
+            shift = 0
+
+        return address.read_bytes(size=int(align(int(self.size()) + shift, 8)/8), force=force)
+
     def set_value(self, value, force=False):
         if not self.instance is None:
             return self.instance.set_value(value, force)
@@ -385,6 +413,9 @@ class RegionDeclaration(Declaration): # BASE_CLASS set to Region after Region de
 
         decl.add_event(resize_event)
 
+        if not self.event_batch is None:
+            self.event_batch.join(decl)
+
         self.trigger_event(DeclareSubregionEvent, decl)
 
         return decl
@@ -581,6 +612,52 @@ class RegionDeclaration(Declaration): # BASE_CLASS set to Region after Region de
 class RegionError(ParanoiaError):
     pass
 
+class Layout(ParanoiaAgent):
+    # everything instances of one region class have in common, worked out once
+    # from a prototype declaration of the class
+    __slots__ = ('declaration', 'size', 'alignment', 'offsets', 'fixed')
+
+    DECLARATION = None
+    OFFSETS = None
+    FIXED = True
+
+    def __init__(self, **kwargs):
+        self.declaration = kwargs.setdefault('declaration', self.DECLARATION)
+
+        if self.declaration is None:
+            raise RegionError('declaration cannot be None')
+
+        self.size = self.declaration.size()
+        self.alignment = self.declaration.get_arg('alignment')
+        self.offsets = kwargs.setdefault('offsets', self.OFFSETS)
+
+        if self.offsets is None:
+            self.offsets = dict()
+
+        # a fixed layout comes out the same size no matter what data is parsed
+        self.fixed = kwargs.setdefault('fixed', self.FIXED)
+
+    def describes(self, declaration):
+        # true for the prototype and for copies of it that only differ in where
+        # they sit. containers copy their children, so their copies never
+        # match and get worked out from the declaration instead
+        if declaration is self.declaration:
+            return True
+
+        template = declaration.args.template
+
+        if template is None or not template is self.declaration.args.template:
+            return False
+
+        for key in dict.keys(declaration.args):
+            if key in declaration.PRIVATE_ARGS:
+                continue
+
+            if not key in template or not template[key] is dict.__getitem__(declaration.args, key):
+                return False
+
+        return True
+
 class RegionResizeEvent(NewSizeEvent):
     def __call__(self, decl, old_size, new_size):
         delta = int(new_size) - int(old_size)
@@ -604,6 +681,18 @@ class Region(BlockChain):
     ALIGN_BYTE = 8
     ALIGN_BLOCK = 0
 
+    address = DeclarationArg('address')
+    shift = DeclarationArg('shift')
+    size = DeclarationArg('size')
+    bind = DeclarationArg('bind')
+    static = DeclarationArg('static')
+    alignment = DeclarationArg('alignment')
+    overlaps = DeclarationArg('overlaps')
+    parent_declaration = DeclarationArg('parent_declaration')
+    shrink = DeclarationArg('shrink')
+    resize_event = DeclarationArg('resize_event')
+    init_finished = DeclarationArg('init_finished')
+
     def __init__(self, **kwargs):
         self.declaration_class = kwargs.setdefault('declaration_class', self.DECLARATION_CLASS)
         self.declaration = kwargs.setdefault('declaration', self.DECLARATION)
@@ -717,6 +806,7 @@ class Region(BlockChain):
         self.address.write_bits(data, bit_offset=self.shift, force=True)
 
     def parse_bit_data(self, bit_data):
+        bit_data = bit_view(bit_data)
         parsed = self.declaration.bit_parser(bit_data=bit_data)
         
         if parsed > self.size:
@@ -728,28 +818,13 @@ class Region(BlockChain):
         return parsed
 
     def parse_link_data(self, link_data):
-        if isinstance(link_data, str):
-            link_data = map(ord, link_data)
-
-        bit_list = bytelist_to_bitlist(link_data)
-
-        return self.parse_bit_data(bit_list)
+        return self.parse_bit_data(BitView(buffer=link_data))
 
     def parse_block_data(self, block_data):
-        if isinstance(block_data, str):
-            block_data = map(ord, block_data)
-
-        block_bits = bytelist_to_bitlist(block_data)
-
-        return self.parse_bit_data(block_bits[self.shift:])
+        return self.parse_bit_data(BitView(buffer=block_data, offset=self.shift))
 
     def parse_memory(self):
-        block_bytes = list()
-
-        for block in self.block_iterator():
-            block_bytes.append(block.get_value(force=True))
-
-        return self.parse_block_data(block_bytes)
+        return self.parse_block_data(self.read_blocks(force=True))
 
     def set_value(self, value, force=False):
         raise RegionError('set_value not implemented')
@@ -758,22 +833,79 @@ class Region(BlockChain):
         raise RegionError('get_value not implemented')
 
     def read_memory(self):
-        return map(int, self.block_iterator())
+        return self.read_blocks()
+
+    def transaction(self):
+        # a batch of edits to this region that lands all at once on commit.
+        # the transaction covers the region's whole allocation, so writes to
+        # its neighbours made in the meantime are part of it too.
+        return self.address.allocation.transaction()
+
+    def clone(self):
+        # a copy of this region that shares its bytes until one of them is
+        # written to. cloning the same unchanged region again reuses the
+        # snapshot taken the first time.
+        from paranoia.base.copy_on_write import clones
+
+        self.flush()
 
-    def __setattr__(self, attr, value):
-        if 'declaration' in self.__dict__ and not self.__dict__['declaration'] is None:
-            self.__dict__['declaration'].set_arg(attr, value, True)
+        allocation = clones.clone(self.address, self.blockspan())
+        clone_decl = self.declaration.copy()
+        clone_decl.set_arg('address', allocation.address())
+        clone_decl.set_arg('shift', self.shift)
+        clone_decl.set_arg('value', None)
 
-        super(Region, self).__setattr__(attr, value)
+        if clone_decl.base_class.has_fixed_layout(clone_decl):
+            instance = clone_decl.instantiate()
+        else:
+            instance = clone_decl.instantiate(parse_memory=True)
+
+        # the clone's memory goes with it
+        instance.allocation = allocation
+
+        return instance
 
     def __del__(self):
-        self.declaration.instance = None
+        # the declaration may already have moved on to a newer instance
+        if self.declaration.instance is self:
+            self.declaration.instance = None
+            
         super(Region, self).__del__()
 
     @classmethod
     def static_size(cls, **kwargs):
         return cls.SIZE
 
+    @classmethod
+    def layout(cls):
+        # kept in the class's own dict so subclasses build their own. the
+        # prototype points back at the class, so the two go away together
+        layout = cls.__dict__.get('_layout')
+
+        if layout is None:
+            layout = cls.build_layout(cls.declare())
+            cls._layout = layout
+
+        return layout
+
+    @classmethod
+    def build_layout(cls, declaration):
+        return Layout(declaration=declaration, fixed=cls.fixed_layout(declaration))
+
+    @classmethod
+    def fixed_layout(cls, declaration):
+        return True
+
+    @classmethod
+    def has_fixed_layout(cls, declaration):
+        # the class's layout already knows for declarations it describes
+        layout = cls.layout()
+
+        if layout.describes(declaration):
+            return layout.fixed
+
+        return cls.fixed_layout(declaration)
+
     @classmethod
     def static_value(cls, **kwargs):
         raise RegionError('static_value not implemented')
@@ -808,6 +940,27 @@ class Region(BlockChain):
         
         return declaration_class(base_class=cls, args=kwargs)
 
+    @classmethod
+    def parse_handle(cls, handle, offset=0, **kwargs):
+        kwargs['address'] = handle.address(offset)
+        instance = cls(**kwargs)
+
+        # pull the whole region in now so later reads are served from memory
+        instance.address.read_bytestring(size=instance.blockspan())
+
+        return instance
+
+    @classmethod
+    def aparse(cls, handle, offset=0, **kwargs):
+        from paranoia.base.disk import AsyncDiskHandle, DiskHandle
+
+        if isinstance(handle, DiskHandle):
+            handle = AsyncDiskHandle(handle=handle)
+        elif not isinstance(handle, AsyncDiskHandle):
+            raise RegionError('handle must be a DiskHandle or AsyncDiskHandle object')
+
+        return handle.run(cls.parse_handle, handle.handle, offset, **kwargs)
+
     @classmethod
     def bit_parser(cls, **kwargs):
         size = kwargs.setdefault('size', cls.SIZE)
@@ -874,6 +1027,9 @@ class NumericRegion(Region):
     UNSIGNED = 0
     SIGNED = 1
 
+    endianness = DeclarationArg('endianness')
+    signage = DeclarationArg('signage')
+
     def __init__(self, **kwargs):
         self.endianness = kwargs.setdefault('endianness', self.ENDIANNESS)
 
@@ -1123,40 +1279,34 @@ class NumericRegion(Region):
     @classmethod
     def static_value(cls, **kwargs):
         if 'bit_data' in kwargs:
-            bit_data = kwargs['bit_data']
-            bit_data += [0] * (8 - len(bit_data))
-            links = map(lambda x: Block(value=x), bitlist_to_bytelist(bit_data))
+            links = bit_view(kwargs['bit_data']).byte_list()
         elif 'link_data' in kwargs:
-            links = map(lambda x: Block(value=x), kwargs['link_data'])
+            links = list(kwargs['link_data'])
         elif 'block_data' in kwargs:
-            bit_data = bytelist_to_bitlist(kwargs['block_data'])
             shift = kwargs.setdefault('shift', cls.SHIFT)
-            bit_data = bit_data[shift:]
-            links = map(lambda x: Block(value=x), bitlist_to_bytelist(bit_data))
+            links = BitView(buffer=kwargs['block_data'], offset=shift).byte_list()
         else:
             raise RegionError('no data to parse')
 
-        value = 0
         endianness = kwargs.setdefault('endianness', cls.ENDIANNESS)
-        size = kwargs.setdefault('size', cls.SIZE)
+        size = int(kwargs.setdefault('size', cls.SIZE))
         signage = kwargs.setdefault('signage', cls.SIGNAGE)
 
         if endianness == cls.LITTLE_ENDIAN:
             links.reverse()
 
-        signed_bit = 0
-        
-        for i in xrange(int(size)):
-            bit = links[int(i/8)].get_bit(i%8)
-            
-            if i == 0 and signage:
-                signed_bit = bit
-            
-            value <<= 1
-            value |= bit
+        # short data reads as if it were padded out with zeros
+        byte_length = align(size, 8) >> 3
+        links = links[:byte_length]
+        links += [0] * (byte_length - len(links))
+        value = 0
+
+        for link in links:
+            value = (value << 8) | link
+
+        value >>= byte_length * 8 - size
 
-        if signed_bit == 1:
-            int_max = 2 ** int(size)
-            value -= int_max
+        if signage and size > 0 and value >> (size - 1):
+            value -= 1 << size
 
         return value
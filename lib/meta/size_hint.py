@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 from paranoia.base.size import Size
-from paranoia.meta.declaration import Declaration
+from paranoia.meta.declaration import Declaration, DeclarationArg
 from paranoia.meta.region import NumericRegion, RegionError, RegionDeclaration, RegionDeclarationError
 from paranoia.fundamentals import dict_merge
 
@@ -14,6 +14,8 @@ class SizeHintDeclarationError(RegionDeclarationError):
     pass
 
 class SizeHintDeclaration(RegionDeclaration):
+    __slots__ = tuple()
+
     def __init__(self, **kwargs):
         super(SizeHintDeclaration, self).__init__(**kwargs)
 
@@ -77,6 +79,10 @@ class SizeHint(NumericRegion):
     FIELD_NAME = None
     ACTION = None
 
+    declaration_offset = DeclarationArg('declaration_offset')
+    field_name = DeclarationArg('field_name')
+    action = DeclarationArg('action')
+
     def __init__(self, **kwargs):
         self.declaration_offset = kwargs.setdefault('declaration_offset', self.DECLARATION_OFFSET)
         self.field_name = kwargs.setdefault('field_name', self.FIELD_NAME)
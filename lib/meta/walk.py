@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+
+import collections
+
+from paranoia.base.address import Address
+from paranoia.base.paranoia_agent import ParanoiaAgent, ParanoiaError
+from paranoia.fundamentals import align
+from paranoia.meta.region import NumericRegion, is_region, layout_declaration
+
+__all__ = ['WalkError', 'NodeLayout', 'Walker', 'walk']
+
+class WalkError(ParanoiaError):
+    pass
+
+class NodeLayout(ParanoiaAgent):
+    # where the pointers and plain values of one node declaration sit, worked
+    # out once so every node of that type decodes straight out of its bytes
+    __slots__ = ('declaration', 'byte_length', 'pointers', 'values', 'plan')
+
+    DECLARATION = None
+    PATHS = None
+
+    def __init__(self, **kwargs):
+        from paranoia.meta.mapping import MappingDeclaration
+
+        self.declaration = kwargs.setdefault('declaration', self.DECLARATION)
+
+        if self.declaration is None:
+            raise WalkError('declaration cannot be None')
+
+        paths = kwargs.setdefault('paths', self.PATHS)
+
+        if paths is None:
+            raise WalkError('paths cannot be None')
+
+        self.byte_length = int(align(int(self.declaration.size()), 8) / 8)
+        self.pointers = [self.resolve_path(path) for path in paths]
+        self.values = list()
+        self.plan = None
+
+        if isinstance(self.declaration, MappingDeclaration):
+            self.plan = self.declaration.bitfield_plan()
+
+            if self.plan is None:
+                for name, decl in self.declaration.get_arg('fields'):
+                    if not name is None and issubclass(decl.base_class, NumericRegion):
+                        self.values.append((name, int(self.declaration.subregion_offsets[id(decl)]), decl))
+
+    def resolve_path(self, path):
+        from paranoia.meta.mapping import MappingDeclaration
+        from paranoia.meta.pointer import Pointer, Offset
+
+        if isinstance(path, str):
+            path = [int(step) if step.isdigit() else step for step in path.split('.')]
+        elif not isinstance(path, (list, tuple)):
+            path = [path]
+
+        decl = self.declaration
+        offset = 0
+
+        for step in path:
+            if isinstance(step, int):
+                child = decl.get_arg('declarations')[step]
+            elif isinstance(decl, MappingDeclaration):
+                child = decl.get_arg('declarations')[decl.get_field_offset(step)]
+            else:
+                raise WalkError('cannot look up field %s in a non-mapping declaration' % step)
+
+            offset += int(decl.subregion_offsets[id(child)])
+            decl = child
+
+        if not issubclass(decl.base_class, (Pointer, Offset)):
+            raise WalkError('field path %s does not lead to a Pointer or Offset' % '.'.join(map(str, path)))
+
+        target = decl.get_arg('casting_declaration')
+
+        if target is None:
+            # a node can't name its own class while it's being declared, so an
+            # uncast pointer links to another node of the same type
+            target = self.declaration
+        else:
+            target = layout_declaration(target)
+
+        return (offset, decl, issubclass(decl.base_class, Offset), target)
+
+    def read_value(self, data, bit_offset, decl):
+        start = bit_offset >> 3
+        shift = bit_offset & 7
+        size = int(decl.size())
+
+        return decl.base_class.static_value(block_data=data[start:start+int(align(shift+size, 8)/8)]
+                                            ,shift=shift
+                                            ,size=size
+                                            ,endianness=decl.get_arg('endianness')
+                                            ,signage=decl.get_arg('signage'))
+
+    def links(self, data, allocation_id):
+        for offset, decl, relative, target in self.pointers:
+            value = self.read_value(data, offset, decl)
+
+            if value == 0:
+                continue
+
+            if relative:
+                value += allocation_id
+
+            yield value, target
+
+    def decode(self, data):
+        if not self.plan is None:
+            return self.plan.unpack(data[:self.plan.byte_length])
+
+        return dict([(name, self.read_value(data, offset, decl)) for name, offset, decl in self.values])
+
+class Walker(ParanoiaAgent):
+    # breadth first over the graph hanging off the root's pointer fields. every
+    # node is visited once by address, and the nodes waiting in the same
+    # allocation are read together in as few spans as possible. each read also
+    # takes in up to READ_AHEAD bytes of an allocation whose bounds are known,
+    # so a list laid out in one buffer gets walked a window at a time. given an
+    # allocator, nodes are looked up in it instead of in local memory.
+    ROOT = None
+    PATHS = None
+    DECLARATION = None
+    ALLOCATOR = None
+    AS_DICT = False
+    BATCH_SIZE = 256
+    MAXIMUM_GAP = 4096
+    READ_AHEAD = 65536
+
+    def __init__(self, **kwargs):
+        from paranoia.meta.pointer import Pointer, PointerCursor
+
+        root = kwargs.setdefault('root', self.ROOT)
+
+        if root is None:
+            raise WalkError('root cannot be None')
+
+        self.paths = kwargs.setdefault('paths', self.PATHS)
+
+        if self.paths is None:
+            raise WalkError('paths cannot be None')
+
+        declaration = kwargs.setdefault('declaration', self.DECLARATION)
+
+        if isinstance(root, Pointer):
+            root = root.cursor()
+
+        if isinstance(root, PointerCursor):
+            root_address = root.value
+
+            if declaration is None:
+                declaration = root.casting_declaration
+        elif is_region(root.__class__) and not root.address is None:
+            root_address = int(root.address)
+
+            if declaration is None:
+                declaration = root.declaration
+        else:
+            root_address = int(root)
+
+        if declaration is None:
+            raise WalkError('no declaration to read nodes with')
+
+        self.declaration = layout_declaration(declaration)
+        self.root_address = root_address
+        self.allocator = kwargs.setdefault('allocator', self.ALLOCATOR)
+        self.as_dict = kwargs.setdefault('as_dict', self.AS_DICT)
+        self.batch_size = kwargs.setdefault('batch_size', self.BATCH_SIZE)
+        self.maximum_gap = kwargs.setdefault('maximum_gap', self.MAXIMUM_GAP)
+        self.read_ahead = kwargs.setdefault('read_ahead', self.READ_AHEAD)
+        self.layouts = dict()
+        self.windows = dict()
+
+        from paranoia.meta.pointer import DerefCache
+        self.targets = DerefCache()
+
+    def layout(self, declaration):
+        layout = self.layouts.get(id(declaration))
+
+        if layout is None:
+            layout = NodeLayout(declaration=declaration, paths=self.paths)
+            self.layouts[id(declaration)] = layout
+
+        return layout
+
+    def find_allocation(self, address):
+        from paranoia.base.allocator import Allocator
+
+        if not self.allocator is None:
+            return self.allocator.address(address).allocation
+
+        allocation = Allocator.find_all(address)
+
+        if allocation is None:
+            # not something we allocated, reach into raw memory for it
+            allocation = Address(offset=address).allocation
+
+        return allocation
+
+    def read_window(self, allocation, address, byte_length):
+        window = self.windows.get(id(allocation))
+
+        if window is None:
+            return None
+
+        start, data = window[1:]
+        offset = address - start
+
+        if offset < 0 or offset + byte_length > len(data):
+            return None
+
+        return data[offset:offset+byte_length]
+
+    def read_batch(self, batch):
+        # group the batch by allocation and read each group in runs of nodes
+        # that sit close enough together to share a read
+        groups = dict()
+        results = dict()
+
+        for address, declaration in batch:
+            allocation = self.find_allocation(address)
+            data = self.read_window(allocation, address, self.layout(declaration).byte_length)
+
+            if not data is None:
+                results[address] = (allocation, data)
+                continue
+
+            groups.setdefault(id(allocation), (allocation, list()))[1].append((address, declaration))
+
+        for allocation, nodes in groups.values():
+            nodes.sort(key=lambda node: node[0])
+            run = list()
+            run_end = None
+
+            for address, declaration in nodes:
+                end = address + self.layout(declaration).byte_length
+
+                if len(run) > 0 and address - run_end > self.maximum_gap:
+                    self.read_run(allocation, run, run_end, results)
+                    run = list()
+                    run_end = None
+
+                run.append((address, declaration))
+
+                if run_end is None or end > run_end:
+                    run_end = end
+
+            if len(run) > 0:
+                self.read_run(allocation, run, run_end, results)
+
+        return results
+
+    def read_run(self, allocation, run, run_end, results):
+        from paranoia.base.allocator import MemoryAllocation
+
+        start = run[0][0]
+        size = run_end - start
+
+        # raw memory has no end we know of, reading ahead into it could fault
+        if not isinstance(allocation, MemoryAllocation):
+            size = max(size, min(self.read_ahead, allocation.id + allocation.size - start))
+
+        data = allocation.read_buffered(start, size)
+        self.windows[id(allocation)] = (allocation, start, data)
+
+        for address, declaration in run:
+            offset = address - start
+            results[address] = (allocation, data[offset:offset+self.layout(declaration).byte_length])
+
+    def node(self, address, declaration, data):
+        if self.as_dict:
+            return self.layout(declaration).decode(data)
+
+        if not self.allocator is None:
+            target_decl = declaration.copy()
+            target_decl.set_arg('address', self.allocator.address(address))
+
+            return target_decl.instantiate()
+
+        return self.targets.deref(address, declaration)
+
+    def __iter__(self):
+        visited = set([self.root_address])
+        queue = collections.deque([(self.root_address, self.declaration)])
+
+        while len(queue) > 0:
+            batch = [queue.popleft() for i in xrange(min(self.batch_size, len(queue)))]
+            results = self.read_batch(batch)
+
+            for address, declaration in batch:
+                allocation, data = results[address]
+
+                for link, target in self.layout(declaration).links(data, allocation.id):
+                    if link in visited:
+                        continue
+
+                    visited.add(link)
+                    queue.append((link, target))
+
+                yield self.node(address, declaration, data)
+
+def walk(root, paths, **kwargs):
+    kwargs['root'] = root
+    kwargs['paths'] = paths
+
+    return iter(Walker(**kwargs))
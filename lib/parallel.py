@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+import multiprocessing
+import os
+
+from paranoia.base.paranoia_agent import ParanoiaError
+from paranoia.meta.declaration import ensure_declaration
+
+__all__ = ['ParallelError', 'bulk_value', 'parse_file', 'parse_files', 'parse_shard', 'parse_shards']
+
+# set in the parent before the pool starts so forked workers inherit it, and
+# again through the pool initializer for start methods that don't fork
+worker_state = None
+
+class ParallelError(ParanoiaError):
+    pass
+
+def bulk_value(instance):
+    return instance.get_value()
+
+def parse_file(declaration, path, offset=0, converter=None):
+    from paranoia.base.disk import DiskManager
+
+    if converter is None:
+        converter = bulk_value
+
+    # every file gets its own manager and its own copy of the declaration, so
+    # nothing is shared between parses. a reused declaration would carry the
+    # last record's sizes over to the next one.
+    manager = DiskManager()
+    handle = manager.open(path, 'rb')
+
+    try:
+        instance = declaration.copy().instantiate(address=handle.address(offset))
+        return converter(instance)
+    finally:
+        handle.close()
+
+def init_worker(state):
+    global worker_state
+
+    worker_state = state
+
+def parse_chunk(chunk):
+    declaration, offset, converter, return_exceptions = worker_state
+    results = list()
+
+    for index, path in chunk:
+        try:
+            results.append((index, path, parse_file(declaration, path, offset, converter)))
+        except Exception as e:
+            if not return_exceptions:
+                raise
+
+            results.append((index, path, e))
+
+    return results
+
+def parse_shard(shard):
+    from paranoia.base.disk import DiskManager
+
+    declaration, path, record_size, converter = worker_state
+
+    if converter is None:
+        converter = bulk_value
+
+    if isinstance(shard, tuple):
+        offsets = range(*shard)
+    else:
+        offsets = shard
+
+    results = list()
+
+    if len(offsets) == 0:
+        return results
+
+    # each shard gets its own manager and allocator, and with a known record
+    # size the whole byte range comes in with a single read
+    manager = DiskManager()
+    handle = manager.open(path, 'rb')
+
+    try:
+        if not record_size is None:
+            first = min(offsets)
+            last = max(offsets)
+            handle.address(first).read_bytestring(size=last + record_size - first)
+
+        for offset in offsets:
+            instance = declaration.copy().instantiate(address=handle.address(offset))
+            results.append(converter(instance))
+    finally:
+        handle.close()
+
+    return results
+
+def make_pool(workers, state):
+    global worker_state
+
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        raise ParallelError('parallel parsing requires concurrent.futures')
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if workers < 1:
+        raise ParallelError('workers must be at least 1')
+
+    worker_state = state
+
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(state,))
+    except TypeError: # no initializer support, rely on fork
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    return pool, workers
+
+def stream_chunks(pool, function, chunks, in_flight, ordered=True):
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    # keep a bounded number of chunks in flight so a huge workload doesn't get
+    # submitted (and its results held) all at once
+    pending = list()
+
+    def finished():
+        if ordered:
+            return [pending.pop(0)]
+
+        done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            pending.remove(future)
+
+        return done
+
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+
+            if len(pending) < in_flight:
+                continue
+
+            for future in finished():
+                yield future.result()
+
+        while len(pending):
+            for future in finished():
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+        pool.shutdown()
+
+def parse_files(declaration, paths, workers=None, chunksize=16, ordered=True
+                ,offset=0, converter=None, return_exceptions=False):
+    declaration = ensure_declaration(declaration)
+
+    if chunksize < 1:
+        raise ParallelError('chunksize must be at least 1')
+
+    pool, workers = make_pool(workers, (declaration, offset, converter, return_exceptions))
+
+    def chunk_iterator():
+        chunk = list()
+
+        for index, path in enumerate(paths):
+            chunk.append((index, path))
+
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = list()
+
+        if len(chunk):
+            yield chunk
+
+    for results in stream_chunks(pool, parse_chunk, chunk_iterator(), workers * 2, ordered):
+        for index, path, result in results:
+            yield (path, result)
+
+def parse_shards(declaration, path, workers=None, record_size=None, offsets=None
+                 ,start=0, end=None, shard_records=None, converter=None):
+    declaration = ensure_declaration(declaration)
+
+    if not offsets is None:
+        # index-locatable records, the offsets are taken as given
+        offsets = list(offsets)
+        count = len(offsets)
+    else:
+        if record_size is None:
+            # a record that sizes itself from its data has no size to shard by
+            if not declaration.base_class.has_fixed_layout(declaration):
+                raise ParallelError('variable-size records need record_size or offsets')
+
+            record_size = declaration.size().byte_length()
+
+        if record_size < 1:
+            raise ParallelError('records must have a fixed, nonzero size')
+
+        if end is None:
+            end = os.path.getsize(path)
+
+        count = int((end - start) / record_size)
+
+    pool, workers = make_pool(workers, (declaration, path, record_size, converter))
+
+    if shard_records is None:
+        # a few shards per worker keeps everyone busy without making shards tiny
+        shard_records = max(1, int((count + workers * 4 - 1) / (workers * 4)))
+
+    def shard_iterator():
+        for index in range(0, count, shard_records):
+            stop = min(index + shard_records, count)
+
+            if offsets is None:
+                yield (start + index * record_size, start + stop * record_size, record_size)
+            else:
+                yield offsets[index:stop]
+
+    for results in stream_chunks(pool, parse_shard, shard_iterator(), workers * 2):
+        for result in results:
+            yield result
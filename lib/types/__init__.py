@@ -1,42 +1,6 @@
 #!/usr/bin/env python
 
-from paranoia.types import bitfield
-from paranoia.types import byte
-from paranoia.types import char
-from paranoia.types import dword
-from paranoia.types import float
-from paranoia.types import oword
-from paranoia.types import qword
-from paranoia.types import string
-from paranoia.types import structure
-from paranoia.types import union
-from paranoia.types import wchar
-from paranoia.types import word
+from paranoia.lazy import lazy_module
 
-from paranoia.types.bitfield import *
-from paranoia.types.byte import *
-from paranoia.types.char import *
-from paranoia.types.dword import *
-from paranoia.types.float import *
-from paranoia.types.oword import *
-from paranoia.types.qword import *
-from paranoia.types.string import *
-from paranoia.types.structure import *
-from paranoia.types.union import *
-from paranoia.types.wchar import *
-from paranoia.types.word import *
-
-__all__ = ['bitfield', 'byte', 'char', 'dword', 'float', 'oword', 'qword'
-           ,'string', 'structure', 'union', 'wchar', 'word'] + \
-           bitfield.__all__ + \
-           byte.__all__ + \
-           char.__all__ + \
-           dword.__all__ + \
-           float.__all__ + \
-           oword.__all__ + \
-           qword.__all__ + \
-           string.__all__ + \
-           structure.__all__ + \
-           union.__all__ + \
-           wchar.__all__ + \
-           word.__all__
+lazy_module(__name__, ['bitfield', 'byte', 'char', 'dword', 'float', 'oword', 'qword'
+                       ,'string', 'structure', 'union', 'wchar', 'word'])
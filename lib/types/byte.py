@@ -13,11 +13,4 @@ class ByteArray(Array):
     BASE_DECLARATION = Byte
 
     def __str__(self):
-        result = list()
-
-        for i in range(self.elements):
-            result.append(chr(self[i].get_value()))
-
-        return ''.join(result)
-
-            
+        return bytes(self.read_bytestring())
@@ -6,12 +6,25 @@ from paranoia.base import paranoia_agent
 from paranoia.types.bitfield import Bitfield
 from paranoia.types.structure import Structure
 
-__all__ = ['FloatError', 'FloatStub', 'FloatStruct', 'Float', 'DoubleStruct', 'Double'
+__all__ = ['FloatError', 'DeferredFields', 'FloatStub', 'FloatStruct', 'Float', 'DoubleStruct', 'Double'
            ,'LongDoubleStruct', 'LongDouble', 'DoubleDoubleStruct', 'DoubleDouble']
 
 class FloatError(paranoia_agent.ParanoiaError):
     pass
 
+class DeferredFields(object):
+    # stands in for FIELDS on the float structures so their bitfield
+    # declarations are only made once a class is actually used
+    def __init__(self, *bitspans):
+        self.bitspans = bitspans
+        self.fields = None
+
+    def __get__(self, instance, owner):
+        if self.fields is None:
+            self.fields = [(name, Bitfield.declare(bitspan=bitspan)) for name, bitspan in self.bitspans]
+
+        return self.fields
+
 class FloatStub(object):
     VALUE = None
     
@@ -138,40 +151,32 @@ class FloatStub(object):
     def __float__(self):
         return self.get_value()    
 
-FloatStruct = Structure.subclass(fields=[
-        ('sign', Bitfield.declare(bitspan=1))
-        ,('exponent', Bitfield.declare(bitspan=8))
-        ,('fraction', Bitfield.declare(bitspan=23))])
+class FloatStruct(Structure):
+    FIELDS = DeferredFields(('sign', 1), ('exponent', 8), ('fraction', 23))
 
 class Float(FloatStruct, FloatStub):
     def __init__(self, **kwargs):
         FloatStruct.__init__(self, **kwargs)
         FloatStub.__init__(self, **kwargs)
 
-DoubleStruct = Structure.subclass(fields=[
-        ('sign', Bitfield.declare(bitspan=1))
-        ,('exponent', Bitfield.declare(bitspan=11))
-        ,('fraction', Bitfield.declare(bitspan=52))])
+class DoubleStruct(Structure):
+    FIELDS = DeferredFields(('sign', 1), ('exponent', 11), ('fraction', 52))
 
 class Double(DoubleStruct, FloatStub):
     def __init__(self, **kwargs):
         DoubleStruct.__init__(self, **kwargs)
         FloatStub.__init__(self, **kwargs)
 
-LongDoubleStruct = Structure.subclass(fields=[
-        ('sign', Bitfield.declare(bitspan=1))
-        ,('exponent', Bitfield.declare(bitspan=15))
-        ,('fraction', Bitfield.declare(bitspan=63))])
+class LongDoubleStruct(Structure):
+    FIELDS = DeferredFields(('sign', 1), ('exponent', 15), ('fraction', 63))
 
 class LongDouble(LongDoubleStruct, FloatStub):
     def __init__(self, **kwargs):
         LongDoubleStruct.__init__(self, **kwargs)
         FloatStub.__init__(self, **kwargs)
 
-DoubleDoubleStruct = Structure.subclass(fields=[
-        ('sign', Bitfield.declare(bitspan=1))
-        ,('exponent', Bitfield.declare(bitspan=15))
-        ,('fraction', Bitfield.declare(bitspan=112))])
+class DoubleDoubleStruct(Structure):
+    FIELDS = DeferredFields(('sign', 1), ('exponent', 15), ('fraction', 112))
 
 class DoubleDouble(DoubleDoubleStruct, FloatStub):
     def __init__(self, **kwargs):
@@ -2,9 +2,11 @@
 
 import ctypes
 
-from paranoia.fundamentals import align, bitlist_to_bytelist
+from paranoia.base.bit_view import BitView, bit_view
+from paranoia.fundamentals import align, terminator_index
 from paranoia.meta.array import Array, ArrayError
-from paranoia.meta.declaration import ensure_declaration
+from paranoia.meta.declaration import DeclarationArg
+from paranoia.meta.region import layout_declaration
 from paranoia.types.char import Char
 from paranoia.types.wchar import Wchar
 
@@ -18,6 +20,12 @@ class String(Array):
     BASE_DECLARATION = Char
     ELEMENTS = 0
 
+    # how many characters a terminator scan looks through when no maximum_size
+    # bounds it, raw memory doesn't say where it ends
+    MAXIMUM_SCAN = 1024 * 1024
+
+    zero_terminated = DeclarationArg('zero_terminated')
+
     def __init__(self, **kwargs):
         self.zero_terminated = kwargs.setdefault('zero_terminated', self.ZERO_TERMINATED)
 
@@ -30,6 +38,7 @@ class String(Array):
         Array.__init__(self, **kwargs)
 
     def parse_bit_data(self, data):
+        data = bit_view(data)
         parsed = self.bit_parser(bit_data=data)
 
         if not self.is_bound():
@@ -47,27 +56,50 @@ class String(Array):
         return parsed
         
     def parse_memory(self):
-        if not self.zero_terminated:
-            maximum = self.elements
+        if self.zero_terminated and not self.is_bound():
+            self.set_elements(self.scan_elements())
+
+        # the data is already where it belongs, one read refreshes whatever
+        # blocks are buffered over it instead of writing it back bit by bit
+        self.address.read_bytestring(size=self.blockspan(), force=True)
+
+        return self.size
+
+    def scan_elements(self):
+        # count the characters up to and including the terminator straight out
+        # of memory, so the array only gets sized once
+        char_size = self.base_declaration.size()
+        stride = char_size.byte_length()
+        maximum = self.MAXIMUM_SCAN
+
+        if not self.maximum_size is None:
+            maximum = int(self.maximum_size.byte_length() / stride)
+
+        if self.shift == 0 and int(char_size) == stride * 8:
+            index = self.address.find_terminator(stride=stride, maximum=maximum)
         else:
-            self.set_elements(1)
-            maximum = None
-            
-        index = 0
+            index = None
+            offset = 0
+
+            while maximum is None or offset < maximum:
+                bit_offset = self.shift + offset * int(char_size)
+                links = self.address.read_bytes(bit_offset/8, align(bit_offset % 8 + int(char_size), 8)/8)
+                char = BitView(buffer=links, offset=bit_offset % 8, length=int(char_size))
 
-        while maximum is None or index < maximum:
-            char_obj = self[index]
-            peek = char_obj.get_char_value()
+                if not 1 in char:
+                    index = offset
+                    break
 
-            if self.zero_terminated and ord(peek) == 0:
-                break
+                offset += 1
 
-            index += 1
+        if not index is None:
+            return index+1
 
-            if not self.is_bound():
-                self.set_elements(index)
+        # only an explicit maximum_size cuts a string short
+        if self.maximum_size is None:
+            raise StringError('no terminator found in memory')
 
-        return self.parse_block_data(self.read_blocks())
+        return maximum
         
     def get_value(self):
         if issubclass(self.base_declaration.base_class, Char):
@@ -80,79 +112,104 @@ class String(Array):
     def set_value(self, string):
         self.parse_link_data(string)
 
-    def __str__(self):
-        result = list()
+    def get_encoding(self):
+        base_class = self.base_declaration.base_class
 
-        for i in xrange(self.elements):
-            c = self[i].get_char_value()
+        if issubclass(base_class, Char):
+            return 'ascii'
+        elif issubclass(base_class, Wchar):
+            if self.base_declaration.get_arg('endianness') == Wchar.BIG_ENDIAN:
+                return 'utf-16-be'
 
-            if ord(c) == 0:
-                break
-            
-            result.append(c)
+            return 'utf-16-le'
+        else:
+            raise StringError('unknown base character type')
 
-        return ''.join(result)
+    def get_bytes(self, view=False):
+        # the undecoded characters up to the terminator, read in one go
+        data = self.read_bytestring()
+        stride = self.base_declaration.size().byte_length()
+        index = terminator_index(data, stride)
 
-    def __unicode__(self):
-        result = list()
+        if index is None:
+            end = len(data)
+        else:
+            end = index * stride
 
-        for i in xrange(self.elements):
-            c = self[i].get_char_value()
+        if view:
+            return memoryview(data)[:end]
 
-            if ord(c) == 0:
-                break
-            
-            result.append(c)
+        return bytes(data[:end])
+
+    def decode(self, encoding=None):
+        if encoding is None:
+            encoding = self.get_encoding()
+
+        return self.get_bytes().decode(encoding)
+
+    def __str__(self):
+        if issubclass(self.base_declaration.base_class, Char):
+            return self.get_bytes()
+
+        # wide text can hold anything, so hand it back encoded rather than
+        # letting str() choke on it as ascii
+        text = self.decode()
+
+        if str is bytes: # python 2
+            return text.encode('utf-8')
 
-        return u''.join(result)
+        return text
+
+    def __unicode__(self):
+        return self.decode()
 
     @classmethod
     def bit_parser(cls, **kwargs):
         if 'bit_data' in kwargs:
-            bit_data = kwargs['bit_data']
-            bit_data += [0] * (8 - len(bit_data))
-            links = bitlist_to_bytelist(bit_data)
+            links = bit_view(kwargs['bit_data']).byte_list()
+            links += [0] * (1 - len(links))
         elif 'link_data' in kwargs:
             if isinstance(kwargs['link_data'], str):
                 links = map(ord, kwargs['link_data'])
             else:
                 links = kwargs['link_data']
         elif 'block_data' in kwargs:
-            bit_data = bytelist_to_bitlist(kwargs['block_data'])
             shift = kwargs.setdefault('shift', cls.SHIFT)
-            bit_data = bit_data[shift:]
-            links = bitlist_to_bytelist(bit_data)
+            links = BitView(buffer=kwargs['block_data'], offset=shift).byte_list()
         else:
             raise RegionError('no data to parse')
 
         zero_terminated = kwargs.setdefault('zero_terminated', cls.ZERO_TERMINATED)
         elements = kwargs.setdefault('elements', cls.ELEMENTS)
         base_declaration = kwargs.setdefault('base_declaration', cls.BASE_DECLARATION)
-        base_declaration = ensure_declaration(base_declaration)
+        base_declaration = layout_declaration(base_declaration)
 
         if not zero_terminated:
             maximum = elements
         
-        chars = list()
+        # walk the data by offset instead of re-slicing what's left of it
+        char_size = base_declaration.size()
+        stride = char_size.byte_length()
+        char_count = int(align(len(links), stride) / stride)
 
-        while len(links):
-            value = base_declaration.base_class.static_value(link_data=links)
-            chars.append(value)
-            links = links[base_declaration.size().byte_length():]
-    
         if not zero_terminated:
-            return len(chars[:maximum])*base_declaration.size()
+            return min(char_count, maximum)*char_size
 
-        zero_index = 0
+        for i in xrange(char_count):
+            offset = i * stride
+            char = base_declaration.base_class.static_value(link_data=links[offset:offset+stride])
 
-        for i in xrange(len(chars)):
-            char = chars[i]
-            
             if char == 0:
-                zero_index = i
-                break
-            
-        return len(chars[:zero_index+1])*base_declaration.size()
+                return (i+1)*char_size
+
+        return char_size
+
+    @classmethod
+    def fixed_layout(cls, declaration):
+        if declaration.get_arg('zero_terminated'):
+            return False
+
+        return super(String, cls).fixed_layout(declaration)
 
     @classmethod
     def subclass(cls, **kwargs):
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import subprocess
+import sys
+
+# each statement runs in a fresh interpreter, so nothing is already imported
+statements = ['import paranoia'
+              ,'from paranoia.types import Dword'
+              ,'from paranoia.types import Float'
+              ,'from paranoia import *']
+
+runs = 10
+
+if len(sys.argv) > 1:
+    runs = int(sys.argv[1])
+
+timer = '''
+import sys
+import time
+
+start = time.time()
+%s
+sys.stdout.write('%%f' %% (time.time() - start))
+'''
+
+for statement in statements:
+    timings = list()
+
+    for run in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', timer % statement])
+        timings.append(float(output))
+
+    print('%-36s best %.2fms, mean %.2fms' % (statement
+                                              ,min(timings) * 1000
+                                              ,sum(timings) / len(timings) * 1000))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import gc
+import sys
+import time
+
+from paranoia.meta.array import Array
+from paranoia.types import Byte, Dword, Structure, Word
+
+try:
+    import tracemalloc
+except ImportError: # python 2
+    tracemalloc = None
+
+def memory_usage():
+    if not tracemalloc is None:
+        return tracemalloc.get_traced_memory()[0]
+
+    # no tracemalloc, add up every object the collector tracks instead
+    return sum(map(sys.getsizeof, gc.get_objects()))
+
+elements = 10000
+
+if len(sys.argv) > 1:
+    elements = int(sys.argv[1])
+
+Record = Structure.subclass(fields=[('tag', Byte)
+                                    ,('length', Word)
+                                    ,('value', Dword)])
+fields = elements * len(Record.FIELDS)
+
+if not tracemalloc is None:
+    tracemalloc.start()
+
+gc.collect()
+before = memory_usage()
+start = time.time()
+
+records = Array(base_declaration=Record, elements=elements)
+
+for index in range(elements):
+    for field, declaration in Record.FIELDS:
+        records[index][field].get_value()
+
+gc.collect()
+after = memory_usage()
+
+print('elements:        %d' % elements)
+print('fields:          %d' % fields)
+print('seconds:         %.2f' % (time.time() - start))
+print('bytes total:     %d' % (after - before))
+print('bytes per field: %.1f' % (float(after - before) / fields))
@@ -1,10 +1,19 @@
 #!/usr/bin/env python
 
+import ctypes
+import gc
+import os
+import tempfile
 import unittest
 
 from paranoia.fundamentals import *
 from paranoia.base.address import Address, AddressError
 from paranoia.base.allocator import AllocationError, heap
+from paranoia.base.bit_view import BitView, bit_view
+from paranoia.base.disk import DiskManager
+from paranoia.base.process_memory import ProcessMemoryAllocator, ProcessMemoryError, process_vm_readv
+from paranoia.base.size import Size, SizeError
+from paranoia.base.transaction import TransactionError
 
 class AddressModuleTest(unittest.TestCase):
     def test_constructor(self):
@@ -32,4 +41,343 @@ class AddressModuleTest(unittest.TestCase):
         address_object = Address(offset=string_addr) # allocates in memory
 
         self.assertEqual(int(address_object), string_addr)
-        self.assertEqual(address_object.read_string(len(string_object)), string_object)
+        self.assertEqual(address_object.read_string(size=len(string_object)), string_object)
+
+class AllocatorModuleTest(unittest.TestCase):
+    def test_address_cache(self):
+        allocation = heap.allocate(8)
+        address = allocation.address(4)
+
+        self.assertTrue(allocation.address(4) is address)
+
+        del address
+        gc.collect()
+
+        self.assertFalse(4 in allocation.addresses)
+
+    def test_lazy_blocks(self):
+        from paranoia.types import Dword
+
+        allocation = heap.allocate(4)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x01\x02\x03\x04'))
+        dword = Dword(address=allocation.address())
+
+        self.assertEqual(dword.get_value(), 0x04030201)
+        self.assertEqual(len(allocation.blocks), 0)
+
+    def test_memory_overlap(self):
+        import ctypes
+        from paranoia.base.allocator import memory
+
+        data = ctypes.create_string_buffer(b'abcdefghijklmnop')
+        base = ctypes.addressof(data)
+
+        middle = Address(offset=base+8)
+        tail = Address(offset=base+12)
+        tail.read_bytestring(size=4)
+        middle.read_bytestring(size=6) # grows into the front of the tail
+
+        self.assertEqual(memory.find_range(base, base+16), [base+8, base+14])
+        self.assertEqual(int(tail), base+12)
+        self.assertTrue(tail.allocation is middle.allocation)
+
+        # growing a byte at a time from the front swallows the rest
+        head = Address(offset=base)
+
+        for i in xrange(16):
+            head.read_byte(i)
+
+        self.assertEqual(memory.find_range(base, base+16), [base])
+        self.assertEqual(int(middle), base+8)
+        self.assertEqual(middle.read_bytestring(size=4), b'ijkl')
+        self.assertTrue(head.allocation.reserved >= 16)
+
+    def test_virtual_pages(self):
+        from paranoia.base.allocator import VirtualAllocator
+
+        allocator = VirtualAllocator(maximum_offset=1 << 32)
+        front = allocator.allocate(0, 16)
+        front.write_bytestring(front.id, bytearray(b'0123456789abcdef'))
+        far = allocator.allocate(1 << 30, 8)
+        far.write_bytestring(far.id, bytearray(b'PARANOiA'))
+
+        # only the pages written to exist
+        self.assertEqual(len(allocator.pages), 2)
+
+        address = front.address(10)
+        allocator.allocate(8, 32)
+        front.reallocate(64) # swallows the allocation at 8
+
+        self.assertEqual(allocator.find_range(front.id, front.id+64), [front.id])
+        self.assertEqual(int(address), front.id+10)
+        self.assertEqual(front.read_bytestring(front.id+12, 8), b'cdef\x00\x00\x00\x00')
+
+        allocator.free(far.id)
+        self.assertEqual(len(allocator.pages), 1)
+
+class BitViewModuleTest(unittest.TestCase):
+    def test_view(self):
+        data = [0xA5, 0x3C, 0xF0]
+        bits = bytelist_to_bitlist(data)
+        view = BitView(buffer=data, offset=3)
+
+        self.assertEqual(len(view), 21)
+        self.assertEqual(view, bits[3:])
+        self.assertEqual(view[5:13], bits[8:16])
+        self.assertTrue(view[5:13].buffer is data)
+        self.assertEqual(view[2:11].byte_list(), bitlist_to_bytelist(bits[5:14] + [0] * 7))
+        self.assertEqual(bit_view([1, 0, 1]).byte_list(), [0xA0])
+        self.assertTrue(bit_view(view) is view)
+
+class DiskModuleTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.write(fd, b'abcdefghijklmnop')
+        os.close(fd)
+
+        self.manager = DiskManager()
+        self.handle = self.manager.open(self.filename, 'r+', write_back=True)
+
+    def tearDown(self):
+        if not self.handle.closed():
+            self.handle.close()
+
+        os.remove(self.filename)
+
+    def read_file(self):
+        with open(self.filename, 'rb') as fp:
+            return fp.read()
+
+    def test_write_back(self):
+        self.handle.read()
+        self.handle.address(4).write_bytestring(bytearray(b'WX'))
+        self.handle.address(6).write_bytestring(bytearray(b'YZ'))
+        self.handle.address(1).write_bytestring(bytearray(b'1'))
+
+        queue = self.handle.allocator().write_queue
+
+        self.assertEqual(queue.offsets, [1, 4])
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(self.read_file(), b'abcdefghijklmnop')
+
+        self.handle.flush()
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(self.read_file(), b'a1cdWXYZijklmnop')
+
+    def test_slots(self):
+        self.handle.read()
+        address = self.handle.address(4)
+
+        self.assertFalse(hasattr(address, '__dict__'))
+        self.assertFalse(hasattr(address.allocation, '__dict__'))
+
+    def test_write_through(self):
+        # write-back is opt-in, by default writes land in the file right away
+        self.handle.close()
+        self.handle = self.manager.open(self.filename, 'r+')
+        self.handle.read()
+        self.handle.address(4).write_bytestring(bytearray(b'WX'))
+
+        self.assertEqual(self.read_file(), b'abcdWXghijklmnop')
+
+    def test_async_handle(self):
+        from paranoia.base.disk import AsyncDiskHandle
+        from paranoia.types import Dword
+
+        handle = AsyncDiskHandle(handle=self.handle)
+
+        self.assertEqual(handle.read_bytestring(4, 4).result(), b'efgh')
+        self.assertEqual(Dword.aparse(self.handle, 8).result().get_value(), 0x6C6B6A69)
+
+    def test_record_iterator(self):
+        from paranoia.meta.list import List
+        from paranoia.types import Dword
+
+        handle = self.manager.open(self.filename, 'rb')
+        records = List(address=handle.address(0), declarations=[])
+
+        values = [record.get_value() for record in records.prefetch_records(Dword)]
+
+        # running off the end leaves no half-made record behind
+        self.assertEqual(values, [0x64636261, 0x68676665, 0x6C6B6A69, 0x706F6E6D])
+        self.assertEqual(len(records.declarations), 4)
+
+        records = List(address=handle.address(0), declarations=[])
+        iterator = records.prefetch_records(Dword, until=lambda record: record.get_value() == 0x68676665)
+
+        self.assertEqual(iterator.fetch().result().get_value(), 0x64636261)
+        self.assertEqual(len(list(iterator)), 1)
+        self.assertTrue(iterator.fetch().result() is None)
+
+        handle.close()
+
+    def test_set_write_back(self):
+        allocator = self.handle.allocator()
+        threshold = allocator.write_queue.threshold
+
+        allocator.set_write_back(False)
+        allocator.set_write_back(True)
+        self.assertEqual(allocator.write_queue.threshold, threshold)
+
+        allocator.set_write_back(True, interval=5)
+        self.assertEqual(allocator.write_queue.threshold, threshold)
+        self.assertEqual(allocator.write_queue.interval, 5)
+
+        allocator.set_write_back(True, interval=None)
+        self.assertEqual(allocator.write_queue.threshold, threshold)
+        self.assertTrue(allocator.write_queue.interval is None)
+
+    def test_transaction(self):
+        self.handle.read()
+        queue = self.handle.allocator().write_queue
+
+        with self.handle.address(2).allocation.transaction():
+            self.handle.address(2).write_bytestring(bytearray(b'CD'))
+            self.handle.address(4).write_byte(ord('E'))
+            self.handle.address(8).write_bytestring(bytearray(b'I'))
+
+            self.assertEqual(self.handle.address(0).read_bytestring(size=6), b'abCDEf')
+            self.assertEqual(len(queue), 0)
+
+        # one queued run per run of edits
+        self.assertEqual(queue.offsets, [2, 8])
+        self.handle.flush()
+        self.assertEqual(self.read_file(), b'abCDEfghIjklmnop')
+
+    def test_write_back_merge(self):
+        queue = self.handle.allocator().write_queue
+
+        queue.queue(8, b'IJ')
+        queue.queue(4, b'EF')
+        self.assertEqual(queue.offsets, [4, 8])
+
+        queue.queue(6, b'GH')
+        self.assertEqual(queue.offsets, [4])
+        self.assertEqual(queue.runs[4], bytearray(b'EFGHIJ'))
+
+        queue.queue(5, b'xy')
+        queue.queue(2, b'CDE')
+        self.assertEqual(queue.offsets, [2])
+        self.assertEqual(queue.runs[2], bytearray(b'CDExyHIJ'))
+
+        queue.flush()
+        self.assertEqual(self.read_file(), b'abCDExyHIJklmnop')
+
+class TransactionModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.allocation = heap.allocate(16)
+        self.allocation.write_bytestring(self.allocation.id, bytearray(b'abcdefghijklmnop'))
+
+    def read(self):
+        return self.allocation.read_bytestring(self.allocation.id)
+
+    def test_commit(self):
+        version = self.allocation.version
+
+        with self.allocation.transaction() as transaction:
+            self.allocation.write_bytestring(self.allocation.id+1, bytearray(b'BC'))
+            self.allocation.write_byte(self.allocation.id+3, ord('D'))
+            self.allocation.write_bytestring(self.allocation.id+10, bytearray(b'K'))
+
+            self.assertEqual(self.read(), b'aBCDefghijKlmnop')
+            self.assertEqual(ctypes.string_at(self.allocation.id, 4), b'abcd')
+
+        # the touching writes landed as one run
+        self.assertEqual(self.allocation.version, version+2)
+        self.assertEqual(ctypes.string_at(self.allocation.id, 16), b'aBCDefghijKlmnop')
+
+        transaction.undo()
+        self.assertEqual(self.read(), b'abcdefghijklmnop')
+
+    def test_rollback(self):
+        def edit():
+            with self.allocation.transaction():
+                self.allocation.write_bytestring(self.allocation.id, bytearray(b'AB'))
+
+                with self.allocation.transaction() as inner:
+                    self.allocation.write_byte(self.allocation.id+2, 0)
+
+                self.assertEqual(self.allocation.find_terminator(self.allocation.id), 2)
+                raise ValueError
+
+        self.assertRaises(ValueError, edit)
+        self.assertEqual(self.read(), b'abcdefghijklmnop')
+        self.assertTrue(self.allocation.open_transaction is None)
+
+        transaction = self.allocation.transaction()
+        self.allocation.write_byte(self.allocation.id, ord('A'))
+        transaction.rollback()
+
+        self.assertRaises(TransactionError, transaction.commit)
+        self.assertRaises(TransactionError, transaction.undo)
+        self.assertEqual(self.read(), b'abcdefghijklmnop')
+
+    def test_nested_error(self):
+        def edit():
+            with self.allocation.transaction():
+                self.allocation.write_bytestring(self.allocation.id, bytearray(b'AB'))
+
+                self.allocation.transaction()
+                self.allocation.write_byte(self.allocation.id+2, ord('C'))
+                raise ValueError
+
+        # the error gets through, not a complaint about the inner transaction
+        self.assertRaises(ValueError, edit)
+        self.assertEqual(self.read(), b'abcdefghijklmnop')
+        self.assertTrue(self.allocation.open_transaction is None)
+
+@unittest.skipIf(process_vm_readv is None, 'process_vm_readv not available')
+class ProcessMemoryModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.allocation = heap.allocate(16)
+        self.allocation.write_bytestring(self.allocation.id, b'PARANOiA\x00')
+
+        # the child is a copy of us that sits still until it gets told to exit
+        self.read_fd, self.write_fd = os.pipe()
+        self.pid = os.fork()
+
+        if self.pid == 0:
+            os.close(self.write_fd)
+            os.read(self.read_fd, 1)
+            os._exit(0)
+
+        os.close(self.read_fd)
+
+    def tearDown(self):
+        os.write(self.write_fd, b'x')
+        os.close(self.write_fd)
+        os.waitpid(self.pid, 0)
+
+    def test_child(self):
+        self.allocation.write_bytestring(self.allocation.id, b'paranoia')
+
+        allocator = ProcessMemoryAllocator(pid=self.pid)
+        address = allocator.address(self.allocation.id)
+
+        self.assertEqual(address.read_bytestring(size=8), b'PARANOiA')
+        self.assertEqual(address.find_terminator(), 8)
+
+        address.write_bytestring(bytearray(b'X'))
+        self.assertEqual(address.read_bytestring(size=2), b'XA')
+        self.assertEqual(self.allocation.read_bytestring(self.allocation.id, 2), b'pa')
+
+        self.assertRaises(ProcessMemoryError, allocator.read, 8, 1)
+
+class SizeModuleTest(unittest.TestCase):
+    def test_immutable(self):
+        size = Size(bytes=4)
+
+        self.assertTrue(size is Size(bits=32))
+        self.assertRaises(SizeError, setattr, size, 'bits', 8)
+
+        size += 8
+
+        self.assertEqual(size, 40)
+        self.assertEqual(Size(bits=32), 32)
+
+    def test_int_like(self):
+        self.assertEqual([0, 1, 2, 3][Size(bits=2)], 2)
+        self.assertTrue(Size(bits=8) < Size(bits=16) <= 16)
+        self.assertEqual(len(set([Size(bits=8), Size(bytes=1), 8])), 1)
+        self.assertEqual(Size(bits=64) / 2, Size(bits=32))
@@ -11,6 +11,8 @@ class FundamentalsModuleTest(unittest.TestCase):
         self.assertNotEqual(free, None)
         self.assertNotEqual(memset, None)
         self.assertNotEqual(memmove, None)
+        self.assertNotEqual(memchr, None)
+        self.assertNotEqual(strlen, None)
 
     def test_alignment(self):
         self.assertFalse(aligned(4, 8))
@@ -25,6 +27,43 @@ class FundamentalsModuleTest(unittest.TestCase):
         self.assertEqual(align(12, 8), 16)
         self.assertEqual(align(16, 8), 16)
 
+    def test_find_terminator(self):
+        import ctypes
+
+        narrow = ctypes.create_string_buffer(b'abc\x00def')
+        address = ctypes.addressof(narrow)
+
+        self.assertEqual(find_terminator(address), 3)
+        self.assertEqual(find_terminator(address, maximum=3), None)
+
+        # the zero straddling the first two characters isn't a terminator
+        wide = ctypes.create_string_buffer(b'a\x00\x00b' + b'c\x00' * 200 + b'\x00\x00')
+        address = ctypes.addressof(wide)
+
+        self.assertEqual(find_terminator(address, 2), 202)
+        self.assertEqual(find_terminator(address, 2, maximum=202), None)
+
+    def test_find_terminator_page(self):
+        import ctypes
+        import mmap
+
+        # a wide string ending at the last character of a page, with nothing
+        # readable after it
+        page_size = mmap.PAGESIZE
+        pages = mmap.mmap(-1, page_size * 2)
+        pages[:page_size] = b'a\x00' * (page_size / 2 - 1) + b'\x00\x00'
+        address = ctypes.addressof(ctypes.c_char.from_buffer(pages))
+
+        mprotect = crt_module.mprotect
+        mprotect.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int)
+        # PROT_NONE, which the mmap module only exports on newer pythons
+        self.assertEqual(mprotect(address + page_size, page_size, 0), 0)
+
+        try:
+            self.assertEqual(find_terminator(address, 2), page_size / 2 - 1)
+        finally:
+            mprotect(address + page_size, page_size, mmap.PROT_READ | mmap.PROT_WRITE)
+
     def test_list_conversions(self):
         self.assertEqual(bitlist_to_bytelist([1, 1, 0, 0, 1, 1, 0, 0]), [0b11001100])
         self.assertEqual(bitlist_to_bytelist([1, 1, 0, 0]), [0b1100])
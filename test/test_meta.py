@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+import unittest
+
+from paranoia.base.allocator import heap
+from paranoia.base.event import NewSizeEvent, SetPropertyEvent
+from paranoia.base.size import Size
+from paranoia.meta.array import Array
+from paranoia.meta.declaration import ensure_declaration
+from paranoia.meta.pointer import Offset, Pointer
+from paranoia.meta.record_stream import RecordStream
+from paranoia.meta.region import sizeof
+from paranoia.meta.size_hint import SizeHint
+from paranoia.meta.walk import walk
+from paranoia.types import Bitfield, Byte, ByteArray, Dword, Structure, Word
+
+class PointerModuleTest(unittest.TestCase):
+    def test_cursor(self):
+        allocation = heap.allocate(12)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x01\x00\x00\x00\x02\x00\x00\x00\x03\x00\x00\x00'))
+
+        pointer = Pointer.cast(Dword)(value=allocation.id)
+        self.assertEqual(pointer.get_value(), allocation.id)
+        self.assertEqual(pointer.deref().get_value(), 1)
+        self.assertTrue(pointer[1] is pointer[1])
+
+        cursor = pointer.cursor()
+        self.assertEqual([cursor[i].get_value() for i in range(3)], [1, 2, 3])
+
+        cursor += 2
+        self.assertEqual(cursor.deref().get_value(), 3)
+        self.assertEqual(cursor - pointer.cursor(), 2)
+        self.assertTrue((cursor - 1).deref() is pointer[1])
+
+        # separately cast pointers to the same place get targets of their own
+        other = Pointer.cast(Dword)(value=allocation.id)
+        self.assertFalse(other.deref() is pointer.deref())
+        self.assertTrue(other.deref() is other.deref())
+
+        other.deref().set_value(7)
+        self.assertEqual(pointer.deref().get_value(), 7)
+
+class WalkModuleTest(unittest.TestCase):
+    def test_cycles(self):
+        import struct
+
+        Node = Structure.subclass(fields=[('value', Dword), ('next', Offset.subclass(size=Dword.SIZE))])
+
+        # 0 -> 16 -> 8 -> back to 16
+        allocation = heap.allocate(24)
+        allocation.write_bytestring(allocation.id, struct.pack('<IIIIII', 10, 16, 30, 16, 20, 8))
+
+        root = Node(address=allocation.address())
+        self.assertEqual([node['value'] for node in walk(root, ['next'], as_dict=True)], [10, 20, 30])
+        self.assertEqual([node['value'].get_value() for node in walk(root, ['next'])], [10, 20, 30])
+
+class RecordStreamModuleTest(unittest.TestCase):
+    def test_fixed_records(self):
+        data = b'\x01\x00\x00\x00\x02\x00\x00\x00\x03\x00\x00\x00'
+        stream = RecordStream(declaration=Dword, source=data, chunk_size=3)
+
+        self.assertEqual([record.get_value() for record in stream], [1, 2, 3])
+
+    def test_variable_records(self):
+        Record = Structure.subclass(fields=[
+            ('length', SizeHint.declare(size=Size(bits=8)
+                                        ,field_name='body'
+                                        ,action='set_elements'))
+            ,('body', ByteArray)])
+
+        data = b'\x02ab\x03cde\x01f\x00\x02gh'
+        stream = RecordStream(declaration=Record, source=data)
+        bodies = list()
+        offsets = list()
+
+        starts = list()
+
+        for record in stream:
+            bodies.append(str(record['body']))
+            offsets.append(stream.position)
+            starts.append(stream.start)
+
+        self.assertEqual(bodies, ['ab', 'cde', 'f', '', 'gh'])
+        self.assertEqual(offsets, [0, 3, 7, 9, 10])
+
+        # the whole input fit in one chunk, so nothing was moved to make room
+        self.assertEqual(starts, offsets)
+
+        # records straddling chunk boundaries get moved to the front of the
+        # buffer while they're being read
+        data += b'\x0aABCDEFGHIJ\x01z'
+
+        for chunk_size in range(1, 12):
+            stream = RecordStream(declaration=Record, source=data, chunk_size=chunk_size)
+
+            self.assertEqual([str(record['body']) for record in stream]
+                             ,['ab', 'cde', 'f', '', 'gh', 'ABCDEFGHIJ', 'z'])
+
+    def test_until(self):
+        data = b'\x01\x00\x00\x00\x02\x00\x00\x00\x03\x00\x00\x00'
+        stream = RecordStream(declaration=Dword
+                              ,source=data
+                              ,until=lambda record: record.get_value() == 2)
+
+        self.assertEqual([record.get_value() for record in stream], [1, 2])
+
+class DeclarationModuleTest(unittest.TestCase):
+    def test_batch_events(self):
+        calls = list()
+
+        class SizeEvent(NewSizeEvent):
+            def __call__(self, decl, old_size, new_size):
+                calls.append((int(old_size), int(new_size)))
+
+        class PropertyEvent(SetPropertyEvent):
+            def __call__(self, decl, name, value):
+                calls.append((name, value))
+
+        decl = Dword.declare()
+        decl.add_event(SizeEvent())
+        decl.add_event(PropertyEvent())
+
+        with decl.batch_events():
+            decl.set_size(Size(bits=8))
+            decl.set_size(Size(bits=64))
+            decl.set_arg('name', 1)
+            decl.set_arg('name', 2)
+
+            self.assertEqual(calls, list())
+
+        self.assertEqual(calls, [('size', Size(bits=64)), (32, 64), ('name', 2)])
+
+        del calls[:]
+
+        with decl.batch_events(drop_properties=True):
+            decl.set_arg('name', 3)
+            decl.set_size(Size(bits=32))
+
+        self.assertEqual(calls, [(64, 32)])
+        self.assertTrue(decl.event_batch is None)
+
+    def test_declaration_args(self):
+        allocation = heap.allocate(4)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x05\x00\x00\x00'))
+
+        dword = Dword(address=allocation.address(), parse_memory=True)
+
+        self.assertEqual(dword.get_value(), 5)
+        self.assertTrue(callable(dword.parse_memory))
+        self.assertTrue(dword.size is dword.declaration.args['size'])
+
+        properties = list()
+
+        class PropertyEvent(SetPropertyEvent):
+            def __call__(self, decl, name, value):
+                properties.append(name)
+
+        dword.declaration.add_event(PropertyEvent())
+        dword.init_finished = True
+        dword.declaration.set_arg('endianness', Dword.BIG_ENDIAN)
+
+        self.assertEqual(dword.endianness, Dword.BIG_ENDIAN)
+        self.assertEqual(properties, ['endianness'])
+
+    def test_copy_on_write(self):
+        Record = Structure.subclass(fields=[('tag', Dword), ('value', Dword)])
+
+        decl = Record.declare()
+        first = decl.copy()
+        second = decl.copy()
+
+        self.assertTrue(first.args.template is second.args.template)
+        self.assertFalse(first.get_arg('declarations')[0] is decl.get_arg('declarations')[0])
+        self.assertEqual(len(first.subregions), 2)
+
+        first.set_arg('name', 1)
+
+        self.assertEqual(first.get_arg('name'), 1)
+        self.assertEqual(second.get_arg('name'), None)
+
+        array = Array(base_declaration=Record, elements=3)
+
+        self.assertEqual(int(array.size), 3 * 64)
+        self.assertFalse(array[0]['value'].address == array[1]['value'].address)
+
+    def test_size_cache(self):
+        decl = Structure.declare(fields=[('tag', Dword), ('value', Dword)])
+
+        self.assertEqual(decl.declarative_size(), Size(bits=64))
+        self.assertTrue(decl.declarative_size() is decl.size_cache)
+
+        decl.append_declaration(Dword)
+
+        self.assertEqual(decl.declarative_size(), Size(bits=96))
+
+        last = decl.get_arg('declarations')[-1]
+        decl.resize_declaration(last, 32)
+
+        self.assertEqual(decl.declarative_size(), Size(bits=128))
+
+        decl.resize_declaration(decl.get_arg('declarations')[0], 32)
+
+        self.assertTrue(decl.size_cache is None)
+        self.assertEqual(decl.declarative_size(), Size(bits=96))
+
+class LayoutModuleTest(unittest.TestCase):
+    def test_class_layout(self):
+        Record = Structure.subclass(fields=[('tag', Byte), ('length', Word), ('value', Dword)])
+        layout = Record.layout()
+
+        self.assertTrue(Record.layout() is layout)
+        self.assertEqual(layout.size, Size(bits=56))
+        self.assertEqual(layout.offsets, {'tag': 0, 'length': 8, 'value': 24})
+        self.assertTrue(layout.fixed)
+        self.assertEqual(sizeof(Record), 7)
+
+        first = ensure_declaration(Record)
+        second = ensure_declaration(Record)
+
+        self.assertFalse(first is second)
+        self.assertFalse(first is layout.declaration)
+        self.assertEqual(first.size(), Size(bits=56))
+
+        # copies of the prototype share its layout until they're changed
+        word = ensure_declaration(Word)
+        self.assertTrue(Word.layout().describes(word))
+        word.set_arg('alignment', 1)
+        self.assertFalse(Word.layout().describes(word))
+
+        Hinted = Structure.subclass(fields=[('length', SizeHint.declare(field_name='data'))
+                                            ,('data', ByteArray)])
+
+        self.assertFalse(Hinted.layout().fixed)
+
+        # the layout lives and dies with its class
+        import gc
+        import weakref
+
+        ref = weakref.ref(Record)
+        del Record, layout, first, second
+        gc.collect()
+
+        self.assertTrue(ref() is None)
+
+class MappingModuleTest(unittest.TestCase):
+    def test_lazy_fields(self):
+        Record = Structure.subclass(fields=[
+            ('length', SizeHint.declare(size=Size(bits=8)
+                                        ,field_name='body'
+                                        ,action='set_elements'))
+            ,('body', ByteArray)])
+
+        allocation = heap.allocate(4)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x03abc'))
+
+        record = Record(address=allocation.address())
+
+        self.assertEqual([decl.instance for decl in record.declarations], [None, None])
+        self.assertEqual(record.declaration.get_field('length').get_value(), 3)
+        self.assertEqual(record['body'].elements, 3)
+        self.assertTrue(record.declarations[0].instance is None)
+
+    def test_bitfield_plan(self):
+        Flag = Bitfield.subclass(size=Size(bits=1))
+        Flags = Structure.subclass(alignment=Flag.ALIGN_BIT, fields=[
+            ('kind', Bitfield.declare(size=Size(bits=3), signage=Bitfield.SIGNED))
+            ,('ack', Flag)
+            ,('syn', Flag)
+            ,('port', Word.declare(alignment=Flag.ALIGN_BIT))])
+
+        allocation = heap.allocate(3)
+        allocation.write_bytestring(allocation.id, bytearray(b'\xB5\x67\x40'))
+
+        flags = Flags(address=allocation.address())
+        fields = dict([(field, flags[field].get_value()) for field in flags])
+
+        self.assertFalse(flags.bitfield_plan() is None)
+        self.assertEqual(flags.get_value(), fields)
+        self.assertEqual(fields['kind'], -3)
+
+        flags.set_value({'syn': 0, 'port': 0x1234})
+        self.assertEqual(flags['syn'].get_value(), 0)
+        self.assertEqual(flags['port'].get_value(), 0x1234)
+        self.assertEqual(flags['kind'].get_value(), -3)
+
+        # so does one with a field that reads its value its own way
+        class Doubled(Byte):
+            def get_value(self, force=False):
+                return super(Doubled, self).get_value(force) * 2
+
+        allocation = heap.allocate(2)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x01\x21'))
+
+        doubled = Structure.declare(fields=[('tag', Byte), ('count', Doubled)]).instantiate(address=allocation.address())
+        self.assertTrue(doubled.bitfield_plan() is None)
+        self.assertEqual(doubled.get_value(), {'tag': 1, 'count': 0x42})
+
+        # a structure with a non-numeric field takes the long way around
+        self.assertTrue(Structure.declare(fields=[('tag', Byte), ('body', ByteArray)]).bitfield_plan() is None)
+
+class RegionModuleTest(unittest.TestCase):
+    def test_clone(self):
+        from paranoia.base.copy_on_write import clones
+
+        Record = Structure.subclass(fields=[('tag', Byte), ('length', Word), ('value', Dword)])
+
+        allocation = heap.allocate(7)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x01\x02\x00\x04\x03\x02\x01'))
+
+        source = Record(address=allocation.address())
+        first = source.clone()
+        second = source.clone()
+        pages = len(clones.pages)
+
+        # both clones read the one snapshot, nothing is copied until a write
+        self.assertEqual(first.get_value(), source.get_value())
+        self.assertEqual(second['value'].get_value(), 0x01020304)
+        self.assertEqual(len(clones.pages), pages)
+
+        first['length'].set_value(0x1234)
+        first.flush()
+
+        self.assertEqual(first['length'].get_value(), 0x1234)
+        self.assertEqual(second['length'].get_value(), 2)
+        self.assertEqual(source['length'].get_value(), 2)
+        self.assertEqual(len(clones.pages), pages+1)
+
+        # the source changed, so the next clone takes a new snapshot
+        source['tag'].set_value(9)
+        source.flush()
+
+        self.assertEqual(source.clone()['tag'].get_value(), 9)
+        self.assertEqual(second['tag'].get_value(), 1)
+
+        # snapshots don't keep their source alive
+        scratch = heap.allocate(4)
+        clones.clone(scratch.address(), 4)
+        snapshots = len(clones.snapshots)
+
+        heap.free(scratch.id)
+        del scratch
+
+        self.assertEqual(len(clones.snapshots), snapshots-1)
+
+    def test_transaction(self):
+        Record = Structure.subclass(fields=[('tag', Byte), ('length', Word), ('value', Dword)])
+
+        allocation = heap.allocate(7)
+        allocation.write_bytestring(allocation.id, bytearray(b'\x01\x02\x00\x04\x03\x02\x01'))
+        record = Record(address=allocation.address())
+
+        with record.transaction() as transaction:
+            record['tag'].set_value(7)
+            record['value'].set_value(0x11223344)
+
+            self.assertEqual(record['value'].get_value(), 0x11223344)
+            self.assertEqual(allocation.version, 1)
+
+        self.assertEqual(allocation.read_bytestring(allocation.id), b'\x07\x02\x00\x44\x33\x22\x11')
+
+        transaction.undo()
+        self.assertEqual(record['tag'].get_value(), 1)
+        self.assertEqual(record['value'].get_value(), 0x01020304)
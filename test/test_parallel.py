@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from paranoia.base.disk import DiskManager
+from paranoia.base.size import Size
+from paranoia.meta.size_hint import SizeHint
+from paranoia.parallel import ParallelError, parse_files, parse_shards
+from paranoia.types import ByteArray, Dword, Structure
+
+Record = Structure.subclass(fields=[
+    ('length', SizeHint.declare(size=Size(bits=8)
+                                ,field_name='body'
+                                ,action='set_elements'))
+    ,('body', ByteArray)])
+
+class ParallelModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.directory, name)
+
+        with open(path, 'wb') as fp:
+            fp.write(data)
+
+        return path
+
+    def serial_parse(self, declaration, path, offsets):
+        handle = DiskManager().open(path, 'rb')
+
+        try:
+            return [declaration.declare(address=handle.address(offset)).instantiate().get_value() for offset in offsets]
+        finally:
+            handle.close()
+
+    def test_parse_files(self):
+        paths = [self.write_file('%d.bin' % i, struct.pack('<I', i * 3)) for i in range(7)]
+        expected = [(path, i * 3) for i, path in enumerate(paths)]
+
+        # however the files are chunked, ordered results come back in input order
+        for chunksize in (1, 3, 16):
+            self.assertEqual(list(parse_files(Dword, paths, workers=2, chunksize=chunksize)), expected)
+
+        self.assertEqual(sorted(parse_files(Dword, paths, workers=2, ordered=False)), sorted(expected))
+        self.assertRaises(ParallelError, list, parse_files(Dword, paths, chunksize=0))
+
+    def test_variable_files(self):
+        # one worker parses every file, each with its own record length
+        paths = [self.write_file('%d.bin' % i, bytes(bytearray([i]) + b'x' * i)) for i in (3, 1, 2)]
+        results = [value for path, value in parse_files(Record, paths, workers=1, chunksize=3)]
+
+        self.assertEqual([value['length'] for value in results], [3, 1, 2])
+        self.assertEqual([len(value['body']) for value in results], [3, 1, 2])
+
+    def test_parse_files_errors(self):
+        paths = [self.write_file('good.bin', struct.pack('<I', 1)), os.path.join(self.directory, 'missing.bin')]
+
+        self.assertRaises(IOError, list, parse_files(Dword, paths, workers=2, chunksize=1))
+
+        results = list(parse_files(Dword, paths, workers=2, chunksize=1, return_exceptions=True))
+
+        self.assertEqual(results[0], (paths[0], 1))
+        self.assertEqual(results[1][0], paths[1])
+        self.assertTrue(isinstance(results[1][1], IOError))
+
+    def test_fixed_shards(self):
+        path = self.write_file('fixed.bin', struct.pack('<50I', *range(50)))
+        expected = self.serial_parse(Dword, path, range(0, 200, 4))
+
+        self.assertEqual(list(parse_shards(Dword, path, workers=2, shard_records=7)), expected)
+        self.assertEqual(list(parse_shards(Dword, path, workers=3)), expected)
+
+    def test_variable_shards(self):
+        data = bytearray()
+        offsets = list()
+
+        for i in range(20):
+            offsets.append(len(data))
+            data += bytearray([i % 5]) + bytearray(b'x' * (i % 5))
+
+        path = self.write_file('variable.bin', bytes(data))
+        expected = self.serial_parse(Record, path, offsets)
+
+        self.assertEqual(list(parse_shards(Record, path, workers=2, offsets=offsets, shard_records=3)), expected)
+
+        # without offsets there's no telling where the records start
+        self.assertRaises(ParallelError, list, parse_shards(Record, path, workers=2))
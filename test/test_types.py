@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import unittest
+
+from paranoia.base.allocator import heap
+from paranoia.base.size import Size
+from paranoia.types import ByteArray, String, StringError, Wchar, WideString
+
+class StringModuleTest(unittest.TestCase):
+    def test_parse_memory(self):
+        allocation = heap.allocate(16)
+        allocation.write_bytestring(allocation.id, b'hello\x00world')
+
+        string = String(address=allocation.address(), parse_memory=True)
+        self.assertEqual(string.elements, 6)
+        self.assertEqual(str(string), 'hello')
+
+        bounded = String(address=allocation.address(), parse_memory=True, maximum_size=Size(bytes=4))
+        self.assertEqual(bounded.elements, 4)
+
+        allocation.write_bytestring(allocation.id, b'h\x00i\x00\x00\x00')
+        wide = WideString(address=allocation.address(), parse_memory=True)
+        self.assertEqual(wide.elements, 3)
+
+    def test_scan_limits(self):
+        allocation = heap.allocate(16)
+        allocation.write_bytestring(allocation.id, b'x' * 15 + b'\x00')
+
+        # without maximum_size the scan still stops, and says it found nothing
+        Capped = type('Capped', (String,), {'MAXIMUM_SCAN': 8})
+        self.assertRaises(StringError, Capped, address=allocation.address(), parse_memory=True)
+
+        bounded = Capped(address=allocation.address(), parse_memory=True, maximum_size=Size(bytes=8))
+        self.assertEqual(bounded.elements, 8)
+        self.assertEqual(String(address=allocation.address(), parse_memory=True).elements, 16)
+
+    def test_disk_string(self):
+        import os
+        import tempfile
+
+        from paranoia.base.disk import DiskManager
+
+        # longer than a page, so the scan has to read more of the file as it goes
+        text = b'p' * 5000
+        fd, path = tempfile.mkstemp()
+        os.write(fd, text + b'\x00hi\x00')
+        os.close(fd)
+
+        handle = DiskManager().open(path, 'rb')
+
+        try:
+            self.assertEqual(str(String(address=handle.address(0), parse_memory=True)), text)
+            self.assertEqual(str(String(address=handle.address(5001), parse_memory=True)), b'hi')
+        finally:
+            handle.close()
+            os.unlink(path)
+
+    def test_decode(self):
+        allocation = heap.allocate(16)
+        allocation.write_bytestring(allocation.id, b'hi\x00\x00\x00jk')
+
+        string = String(address=allocation.address(), elements=7, zero_terminated=False)
+        self.assertEqual(str(string), 'hi')
+        self.assertEqual(string.get_bytes(view=True).tobytes(), b'hi')
+        self.assertEqual(str(ByteArray(address=allocation.address(), elements=3)), b'hi\x00')
+
+        # the zero between the first two wide characters doesn't end the string
+        allocation.write_bytestring(allocation.id, b'h\x00\x00i\x00\x00')
+        wide = WideString(address=allocation.address(), elements=3, zero_terminated=False)
+        self.assertEqual(wide.decode(), u'h\u6900')
+        self.assertEqual(str(wide), u'h\u6900'.encode('utf-8'))
+        self.assertEqual(wide.get_value(), u'h\u6900')
+
+        big_endian = Wchar.declare(endianness=Wchar.BIG_ENDIAN)
+        wide = WideString(address=allocation.address(), elements=3, zero_terminated=False, base_declaration=big_endian)
+        self.assertEqual(wide.get_encoding(), 'utf-16-be')
+        self.assertEqual(wide.decode(), u'\u6800i')